@@ -0,0 +1,153 @@
+import asyncio
+import logging
+from typing import Dict, List, Set
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+
+from repository.repository import RepositorySystem
+from utils.rate_limit import TokenBucket
+from metrics.metrics import ALERT_QUEUE_DEPTH, TELEGRAM_SEND_LATENCY
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_LIMIT = 4096
+
+
+def split_message(text: str, limit: int = MESSAGE_LIMIT) -> List[str]:
+    """Split text at line boundaries into parts of at most `limit` characters; longer lines are cut"""
+    parts, current = [], None
+    for line in text.split("\n"):
+        for start in range(0, max(len(line), 1), limit):
+            piece = line[start:start + limit]
+            if current is not None and len(current) + 1 + len(piece) <= limit:
+                current = f"{current}\n{piece}"
+            else:
+                if current is not None:
+                    parts.append(current)
+                current = piece
+    if current is not None:
+        parts.append(current)
+    return parts
+
+
+class AlertDispatcher:
+    """
+    Fans alerts out to every subscriber through a queue and a worker pool.
+
+    Events for a chat are collected for `linger` seconds and sent as one
+    message. Sending respects a global and a per-chat token bucket. A 429
+    pauses both for `retry_after` before retrying: Telegram's flood limit
+    also covers the bot as a whole, so other chats must back off too.
+    """
+
+    def __init__(self, bot: Bot, repository: RepositorySystem, workers: int = 8,
+                 global_rate: float = 25, chat_rate: float = 1, linger: float = 1.0,
+                 max_retries: int = 5):
+        self.bot = bot
+        self.repository = repository
+        self.workers = workers
+        self.chat_rate = chat_rate
+        self.linger = linger
+        self.max_retries = max_retries
+
+        self.subscribers: Set[int] = set()
+        self._pending: Dict[int, List[str]] = {}
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._global_bucket = TokenBucket(global_rate)
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        self.subscribers = set(await self.repository.get_subscribers())
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        ALERT_QUEUE_DEPTH.set_function(lambda: self.queue_depth)
+
+    async def subscribe(self, chat_id: int) -> None:
+        if chat_id not in self.subscribers:
+            self.subscribers.add(chat_id)
+            await self.repository.add_subscriber(chat_id)
+
+    async def unsubscribe(self, chat_id: int) -> None:
+        self.subscribers.discard(chat_id)
+        self._chat_buckets.pop(chat_id, None)
+        await self.repository.delete_subscriber(chat_id)
+
+    def publish(self, text: str) -> None:
+        """Queue an event for every subscriber"""
+        for chat_id in self.subscribers:
+            self.send(chat_id, text)
+
+    def send(self, chat_id: int, text: str) -> None:
+        """Queue an event for one chat"""
+        pending = self._pending.get(chat_id)
+        if pending is None:
+            self._pending[chat_id] = [text]
+            self._queue.put_nowait((asyncio.get_running_loop().time() + self.linger, chat_id))
+        else:
+            pending.append(text)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            send_at, chat_id = await self._queue.get()
+            try:
+                delay = send_at - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                events = self._pending.pop(chat_id, [])
+                for text in self._batch(events):
+                    await self._deliver(chat_id, text)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception(f"Failed to deliver alerts to {chat_id}")
+            finally:
+                self._queue.task_done()
+
+    @staticmethod
+    def _batch(events: List[str]) -> List[str]:
+        """Join events into as few messages as fit Telegram's length limit"""
+        messages, current = [], ""
+        for event in (part for event in events for part in split_message(event)):
+            if current and len(current) + 1 + len(event) > MESSAGE_LIMIT:
+                messages.append(current)
+                current = event
+            else:
+                current = f"{current}\n{event}" if current else event
+        if current:
+            messages.append(current)
+        return messages
+
+    async def _deliver(self, chat_id: int, text: str) -> None:
+        chat_bucket = self._chat_buckets.get(chat_id)
+        if chat_bucket is None:
+            chat_bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate)
+
+        for _ in range(self.max_retries):
+            await chat_bucket.acquire()
+            await self._global_bucket.acquire()
+            try:
+                with TELEGRAM_SEND_LATENCY.time():
+                    await self.bot.send_message(chat_id, text)
+                return
+            except TelegramRetryAfter as e:
+                logger.warning(f"Flood limit for {chat_id}, retrying in {e.retry_after}s")
+                chat_bucket.pause(e.retry_after)
+                self._global_bucket.pause(e.retry_after)
+            except TelegramForbiddenError:
+                logger.info(f"Chat {chat_id} blocked the bot, unsubscribing")
+                await self.unsubscribe(chat_id)
+                return
+
+        logger.error(f"Giving up on alert for {chat_id} after {self.max_retries} attempts")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,94 @@
+from enum import Enum
+from typing import Dict, Optional, Tuple
+
+
+class SiteStatus(str, Enum):
+    UP = "up"
+    DEGRADED = "degraded"
+    DOWN = "down"
+
+
+def is_success(result: dict) -> bool:
+    """Whether a provider result counts as a successful check"""
+    return bool(result.get('success')) and result.get('status_code', 0) < 400
+
+
+class SiteState:
+    """
+    Debounced status of one site.
+
+    The site goes DOWN after `down_after` consecutive failures and back UP
+    after `up_after` consecutive successes. Outcome flips over the last
+    `window` checks are counted in a ring buffer; at `flap_threshold` flips
+    the site is DEGRADED (flapping) until they drop to half of that.
+    """
+
+    __slots__ = ("status", "fail_streak", "ok_streak", "last", "flips", "ring", "head",
+                 "down_after", "up_after", "flap_threshold")
+
+    def __init__(self, down_after: int = 3, up_after: int = 2, window: int = 20,
+                 flap_threshold: int = 6):
+        self.status = SiteStatus.UP
+        self.fail_streak = 0
+        self.ok_streak = 0
+        self.last: Optional[bool] = None
+        self.flips = 0
+        self.ring = [False] * window
+        self.head = 0
+        self.down_after = down_after
+        self.up_after = up_after
+        self.flap_threshold = flap_threshold
+
+    def feed(self, success: bool) -> Optional[SiteStatus]:
+        """Account one check result; return the new status on a transition"""
+        flipped = self.last is not None and success != self.last
+        self.last = success
+        self.flips += flipped - self.ring[self.head]
+        self.ring[self.head] = flipped
+        self.head = (self.head + 1) % len(self.ring)
+
+        if success:
+            self.ok_streak += 1
+            self.fail_streak = 0
+        else:
+            self.fail_streak += 1
+            self.ok_streak = 0
+
+        status = self.status
+        if self.flips >= self.flap_threshold:
+            status = SiteStatus.DEGRADED
+        elif status is SiteStatus.DEGRADED and self.flips > self.flap_threshold // 2:
+            pass
+        elif self.fail_streak >= self.down_after:
+            status = SiteStatus.DOWN
+        elif self.ok_streak >= self.up_after:
+            status = SiteStatus.UP
+
+        if status is self.status:
+            return None
+        self.status = status
+        return status
+
+
+class StateTracker:
+    """Per-site state machines; feeding a result is O(1)"""
+
+    def __init__(self, **thresholds):
+        self.thresholds = thresholds
+        self.states: Dict[str, SiteState] = {}
+
+    def feed(self, alias: str, result: dict) -> Optional[Tuple[SiteStatus, SiteStatus]]:
+        """Return (old, new) status when the site changes state"""
+        state = self.states.get(alias)
+        if state is None:
+            state = self.states[alias] = SiteState(**self.thresholds)
+        old = state.status
+        new = state.feed(is_success(result))
+        return (old, new) if new is not None else None
+
+    def status(self, alias: str) -> SiteStatus:
+        state = self.states.get(alias)
+        return state.status if state is not None else SiteStatus.UP
+
+    def remove(self, alias: str) -> None:
+        self.states.pop(alias, None)
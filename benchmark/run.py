@@ -0,0 +1,207 @@
+"""
+Benchmark the real scheduler, providers and repository against a local target farm.
+
+    python -m benchmark.run --sites 100 1000 10000 --duration 30 --output bench.json
+
+Each site count runs in a fresh process so peak RSS is measured per run.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, fields
+from typing import List, Optional
+
+import numpy as np
+
+from alert.state import is_success
+from benchmark.targets import (FarmOptions, client_context, create_certificate, start_farm,
+                               target_url)
+from metrics.metrics import REPOSITORY_BATCH_SIZE, REPOSITORY_WRITE_LATENCY, SCHEDULER_LAG
+from provider.provider import ProviderFactory
+from report.report import build_report
+from repository.repository import RepositoryFactory
+from scheduler.scheduler import CheckScheduler
+
+
+def _percentiles(values: List[float]) -> dict:
+    if not values:
+        return {"p50": None, "p90": None, "p99": None, "max": None}
+    p50, p90, p99 = np.percentile(values, (50, 90, 99))
+    return {"p50": round(float(p50), 2), "p90": round(float(p90), 2),
+            "p99": round(float(p99), 2), "max": round(float(max(values)), 2)}
+
+
+def _db_size(directory: str) -> int:
+    # Every file the repository wrote: SQLite WAL/SHM or the JSON snapshot and log
+    return sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+
+async def _create_provider(options: argparse.Namespace, port: int, cert: Optional[str]):
+    module_path, class_name = ProviderFactory.REGISTRY[options.provider].rsplit('.', 1)
+    provider = getattr(importlib.import_module(module_path), class_name)()
+    if options.provider == "scrapfly":
+        await provider.init(api_key="benchmark", base_url=f"http://127.0.0.1:{port}/scrape")
+    else:
+        await provider.init(ssl_context=client_context(cert) if cert else None)
+
+    factory = ProviderFactory()
+    factory.providers[options.provider] = factory.provider = provider
+    factory.default = options.provider
+    return factory
+
+
+async def run_once(sites: int, options: argparse.Namespace, port: int, cert: Optional[str]) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        repository_factory = RepositoryFactory()
+        await repository_factory.create_repository(os.path.join(directory, f"bench.{options.repository}"))
+        repository = repository_factory.get_repository()
+
+        started = time.perf_counter()
+        for index in range(sites):
+            await repository.add_site(target_url(index, port, cert is not None), f"site{index}")
+        seed_seconds = time.perf_counter() - started
+
+        factory = await _create_provider(options, port, cert)
+        latencies, errors = [], 0
+
+        async def on_result(alias: str, result: dict) -> None:
+            nonlocal errors
+            latencies.append(result.get('response_time_ms') or 0)
+            if not is_success(result):
+                errors += 1
+
+        scheduler = CheckScheduler(repository, factory, interval=options.interval,
+                                   concurrency=options.concurrency, on_result=on_result)
+        await scheduler.load()
+
+        lag_count, lag_sum = sum(SCHEDULER_LAG.counts), SCHEDULER_LAG.sum
+        writes, write_seconds = sum(REPOSITORY_WRITE_LATENCY.counts), REPOSITORY_WRITE_LATENCY.sum
+        batched_rows = REPOSITORY_BATCH_SIZE.sum
+
+        started = time.perf_counter()
+        task = asyncio.create_task(scheduler.run())
+        await asyncio.sleep(options.duration)
+        await scheduler.stop()
+        await task
+        elapsed = time.perf_counter() - started
+        await repository.flush()
+
+        started = time.perf_counter()
+        await build_report(repository, 86400)
+        report_seconds = time.perf_counter() - started
+
+        await factory.close()
+        await repository.close()
+
+        lag_count = sum(SCHEDULER_LAG.counts) - lag_count
+        writes = sum(REPOSITORY_WRITE_LATENCY.counts) - writes
+        return {
+            "sites": sites,
+            "provider": options.provider,
+            "tls": cert is not None,
+            "checks": len(latencies),
+            "errors": errors,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_per_s": round(len(latencies) / elapsed, 1),
+            "latency_ms": _percentiles(latencies),
+            "scheduler_lag_mean_ms": round((SCHEDULER_LAG.sum - lag_sum) / lag_count * 1000, 2)
+            if lag_count else None,
+            "repository": {
+                "backend": options.repository,
+                "seed_s": round(seed_seconds, 3),
+                "batches": writes,
+                "rows": int(REPOSITORY_BATCH_SIZE.sum - batched_rows),
+                "write_mean_ms": round((REPOSITORY_WRITE_LATENCY.sum - write_seconds) / writes * 1000, 2)
+                if writes else None,
+                "db_bytes": _db_size(directory),
+                "report_s": round(report_seconds, 3)
+            },
+            # ru_maxrss is in KiB on Linux
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        }
+
+
+def _run_in_process(sites: int, options: argparse.Namespace, port: int, cert: Optional[str],
+                    results) -> None:
+    results.put(asyncio.run(run_once(sites, options, port, cert)))
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sites", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--provider", choices=("http", "scrapfly"), default="http")
+    parser.add_argument("--repository", choices=tuple(RepositoryFactory.REGISTRY), default="db")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per run")
+    parser.add_argument("--interval", type=float, default=10, help="check interval per site")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--tls", action="store_true", help="serve targets over HTTPS")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    for field in fields(FarmOptions):
+        parser.add_argument(f"--{field.name.replace('_', '-')}", type=type(field.default),
+                            default=field.default)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    options = parse_args(argv)
+    farm_fields = {field.name for field in fields(FarmOptions)}
+    farm_options = FarmOptions(**{name: getattr(options, name) for name in farm_fields})
+
+    with tempfile.TemporaryDirectory() as directory:
+        certificate = create_certificate(directory) if options.tls else None
+        farm, port = start_farm(farm_options, certificate)
+        runs = []
+        try:
+            for sites in options.sites:
+                results = multiprocessing.Queue()
+                worker = multiprocessing.Process(
+                    target=_run_in_process,
+                    args=(sites, options, port, certificate[0] if certificate else None, results)
+                )
+                worker.start()
+                worker.join()
+                if worker.exitcode != 0:
+                    raise RuntimeError(f"Benchmark run for {sites} sites failed")
+                runs.append(results.get())
+                print(f"{sites} sites: {runs[-1]['throughput_per_s']} checks/s", file=sys.stderr)
+        finally:
+            farm.terminate()
+
+    report = {
+        "revision": _git_revision(),
+        "timestamp": int(time.time()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "options": {key: value for key, value in vars(options).items()
+                    if key != "output" and key not in farm_fields},
+        "farm": asdict(farm_options),
+        "runs": runs
+    }
+    text = json.dumps(report, indent=2)
+    if options.output:
+        with open(options.output, "w") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
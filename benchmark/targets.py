@@ -0,0 +1,192 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import ssl
+import subprocess
+from dataclasses import dataclass, asdict
+from typing import Optional, Tuple
+
+from aiohttp import web
+
+
+@dataclass
+class FarmOptions:
+    """
+    Behaviour of the simulated targets. Every target gets a fixed profile
+    derived from `seed`, so two runs with the same options see the same farm.
+    """
+    latency_ms: float = 20
+    jitter_ms: float = 10
+    error_rate: float = 0.05
+    head_unsupported_rate: float = 0.1
+    slow_body_rate: float = 0.05
+    body_size: int = 16 * 1024
+    slow_chunk_delay_ms: float = 50
+    scrapfly_latency_ms: float = 150
+    scrapfly_error_rate: float = 0.01
+    seed: int = 1
+
+
+class _Profile:
+    __slots__ = ("latency", "status", "head_status", "slow")
+
+    def __init__(self, index: int, options: FarmOptions):
+        rnd = random.Random(options.seed * 1_000_003 + index)
+        self.latency = (options.latency_ms + rnd.uniform(0, options.jitter_ms)) / 1000
+        self.status = rnd.choice((500, 502, 503)) if rnd.random() < options.error_rate else 200
+        self.head_status = 405 if rnd.random() < options.head_unsupported_rate else self.status
+        self.slow = rnd.random() < options.slow_body_rate
+
+
+def target_host(index: int) -> str:
+    """
+    Loopback address of a target. Spreading targets over 127.0.0.0/8 keeps
+    the per-host limits of the scheduler and connector from serializing them.
+    """
+    return f"127.{1 + index // 62500}.{index // 250 % 250}.{index % 250 + 1}"
+
+
+def target_url(index: int, port: int, tls: bool = False) -> str:
+    scheme = "https" if tls else "http"
+    return f"{scheme}://{target_host(index)}:{port}/t/{index}"
+
+
+def create_certificate(directory: str) -> Tuple[str, str]:
+    """Self-signed certificate for the farm, made with the openssl CLI"""
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "2",
+         "-keyout", key, "-out", cert, "-subj", "/CN=benchmark.local"],
+        check=True, capture_output=True
+    )
+    return cert, key
+
+
+def client_context(cert: str) -> ssl.SSLContext:
+    """
+    Trusts the farm certificate. Hostnames aren't checked since targets are
+    bare loopback addresses, but the full handshake and chain check still run.
+    """
+    context = ssl.create_default_context(cafile=cert)
+    context.check_hostname = False
+    return context
+
+
+class TargetFarm:
+    """Local aiohttp server standing in for monitored sites and the Scrapfly API"""
+
+    def __init__(self, options: FarmOptions):
+        self.options = options
+        self._profiles = {}
+        self._credit = 10 ** 9
+        self._scrapfly_rnd = random.Random(options.seed)
+        self._body = b"<html><body>" + b"x" * options.body_size + b"</body></html>"
+
+    def _profile(self, index: int) -> _Profile:
+        profile = self._profiles.get(index)
+        if profile is None:
+            profile = self._profiles[index] = _Profile(index, self.options)
+        return profile
+
+    async def handle_target(self, request: web.Request) -> web.StreamResponse:
+        profile = self._profile(int(request.match_info["index"]))
+        await asyncio.sleep(profile.latency)
+
+        if request.method == "HEAD":
+            return web.Response(status=profile.head_status)
+        if profile.status != 200:
+            return web.Response(status=profile.status, text="error")
+        if not profile.slow:
+            return web.Response(body=self._body, content_type="text/html")
+
+        response = web.StreamResponse(headers={"Content-Type": "text/html"})
+        await response.prepare(request)
+        chunk = max(1, len(self._body) // 8)
+        for offset in range(0, len(self._body), chunk):
+            await response.write(self._body[offset:offset + chunk])
+            await asyncio.sleep(self.options.slow_chunk_delay_ms / 1000)
+        await response.write_eof()
+        return response
+
+    async def handle_scrapfly(self, request: web.Request) -> web.Response:
+        """Mimics the parts of the Scrapfly /scrape API the provider reads"""
+        await asyncio.sleep(self.options.scrapfly_latency_ms / 1000)
+        proxified = request.query.get("proxified_response") == "true"
+        if self._scrapfly_rnd.random() < self.options.scrapfly_error_rate:
+            if proxified:
+                return web.Response(status=429, headers={
+                    "X-Scrapfly-Reject-Code": "ERR::THROTTLE::MAX_REQUEST_RATE_EXCEEDED",
+                    "X-Scrapfly-Reject-Description": "Throttled"
+                })
+            return web.json_response({"success": False, "message": "Throttled"}, status=429)
+
+        url = request.query.get("url", "")
+        index = url.rsplit("/", 1)[-1]
+        status = self._profile(int(index)).status if index.isdigit() else 200
+        self._credit -= 1
+        headers = {"X-Scrapfly-Api-Cost": "1",
+                   "X-Scrapfly-Remaining-Api-Credit": str(self._credit)}
+
+        if proxified:
+            headers["X-Scrapfly-Upstream-Http-Code"] = str(status)
+            return web.Response(body=self._body, status=status, content_type="text/html",
+                                headers=headers)
+
+        payload = {
+            "success": True,
+            "result": {
+                "status_code": status,
+                "content": self._body.decode(),
+                "ssl": {"valid": True, "not_after": "2030-01-01T00:00:00Z"}
+            }
+        }
+        return web.Response(text=json.dumps(payload), content_type="application/json",
+                            headers=headers)
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route("*", "/t/{index}", self.handle_target)
+        app.router.add_get("/scrape", self.handle_scrapfly)
+        return app
+
+
+async def _serve(options: FarmOptions, certificate: Optional[Tuple[str, str]], ready) -> None:
+    context = None
+    if certificate is not None:
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(*certificate)
+
+    runner = web.AppRunner(TargetFarm(options).create_app(), access_log=None)
+    await runner.setup()
+    # 127.0.0.0/8 is routed to loopback, so one socket serves every target address
+    site = web.TCPSite(runner, "0.0.0.0", 0, ssl_context=context, backlog=4096)
+    await site.start()
+    ready.send(runner.addresses[0][1])
+    ready.close()
+    await asyncio.Event().wait()
+
+
+def _farm_main(options: dict, certificate: Optional[Tuple[str, str]], ready) -> None:
+    asyncio.run(_serve(FarmOptions(**options), certificate, ready))
+
+
+def start_farm(options: FarmOptions,
+               certificate: Optional[Tuple[str, str]] = None) -> Tuple[multiprocessing.Process, int]:
+    """Run the farm in its own process so it doesn't share a loop with the code under test"""
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(
+        target=_farm_main, args=(asdict(options), certificate, sender), daemon=True
+    )
+    process.start()
+    sender.close()
+    port = receiver.recv()
+    receiver.close()
+    return process, port
+
+
+if __name__ == "__main__":
+    farm, farm_port = start_farm(FarmOptions())
+    print(f"Target farm on port {farm_port}, e.g. {target_url(0, farm_port)}")
+    farm.join()
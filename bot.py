@@ -1,27 +1,57 @@
 from aiogram import Dispatcher, Bot, F
-from aiogram.types import Message
+from aiogram.types import Message, BufferedInputFile, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command, CommandStart
+import asyncio
+import datetime
+import io
 import os
+import shlex
+from typing import Optional
 
 from repository.repository import RepositorySystem
 from config.config import ConfigSystem
-from provider.provider import ProviderSystem
-
-from typing import List
+from provider.provider import ProviderFactory, ProviderSystem
+from scheduler.scheduler import CheckScheduler
+from alert.dispatcher import AlertDispatcher
+from alert.state import StateTracker, SiteStatus
+from report.aggregates import RunningAggregates
+from report.digest import DigestScheduler, parse_digest_time
+from provider.assertions import AssertionSpec
+from provider.probes import CertificateInfo
+from scheduler.certificates import CertificateMonitor
+from utils.site_io import detect_format, export_sites, import_sites, is_valid_url, read_records
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 CONFIG: ConfigSystem = None
 REPOSITORY: RepositorySystem = None
 PROVIDER: ProviderSystem = None
+SCHEDULER: CheckScheduler = None
+DISPATCHER: AlertDispatcher = None
+DIGEST: DigestScheduler = None
+TRACKER = StateTracker()
+AGGREGATES = RunningAggregates()
+
+STATUS_MESSAGES = {
+    SiteStatus.UP: "🟢 {alias} is up",
+    SiteStatus.DEGRADED: "🟡 {alias} is flapping",
+    SiteStatus.DOWN: "🔴 {alias} is down: {reason}",
+}
 
-MSG: List[Message] = list()
+PAGE_SIZE = 20
 
 dp = Dispatcher()
 
 @dp.message(CommandStart())
 async def start(msg: Message):
+    await DISPATCHER.subscribe(msg.chat.id)
+    DIGEST.add_chat(msg.chat.id)
     await msg.answer("Bot started")
-    global MSG
-    MSG.append(msg)
+
+@dp.message(Command("stop"))
+async def stop(msg: Message):
+    await DISPATCHER.unsubscribe(msg.chat.id)
+    await msg.answer("Alerts stopped")
 
 @dp.message(Command("add"))
 async def add(msg: Message):
@@ -33,11 +63,17 @@ async def add(msg: Message):
     
     url = args[0]
     alias = None
-    provider = "scrapfly"
+    provider = None
+    mode = "uptime"
+    critical = False
     
     for arg in args[1:]:
-        if arg.startswith('provider='):
+        if arg == 'critical':
+            critical = True
+        elif arg.startswith('provider='):
             provider = arg.split('=', 1)[1].lower()
+        elif arg.startswith('mode='):
+            mode = arg.split('=', 1)[1].lower()
         elif arg.startswith('alias='):
             alias = arg.split('=', 1)[1]
         else:
@@ -47,12 +83,22 @@ async def add(msg: Message):
         await msg.answer("Incorrect alias")
         return
 
-    if not ProviderSystem.REGISTRY[provider]:
+    if provider is not None and provider not in ProviderFactory.REGISTRY:
         await msg.answer("Incorrect provider")
         return
 
-    await REPOSITORY.add_site(url, alias)
-    await msg.answer(f"Added: {url} (alias: {alias}, provider: {provider})")
+    if mode not in ("uptime", "content"):
+        await msg.answer("Incorrect mode")
+        return
+
+    await REPOSITORY.add_site(url, alias, provider, critical)
+    if mode == "content":
+        await REPOSITORY.watch_content(alias)
+    if SCHEDULER:
+        SCHEDULER.add_site(url, alias, provider=provider, critical=critical)
+        if mode == "content":
+            SCHEDULER.watch_content(alias)
+    await msg.answer(f"Added: {url} (alias: {alias}, provider: {provider or 'default'}, mode: {mode})")
 
 @dp.message(Command("remove"))
 async def remove(msg: Message):
@@ -64,68 +110,319 @@ async def remove(msg: Message):
     
     target = args[0]
 
-    if await is_valid_url(target):
+    if is_valid_url(target):
         await REPOSITORY.delete_site(target)
+        if SCHEDULER:
+            for alias, entry in SCHEDULER.sites.items():
+                if entry.url == target:
+                    SCHEDULER.remove_site(alias)
+                    TRACKER.remove(alias)
+                    AGGREGATES.remove(alias)
+                    break
         await msg.answer(f"Removed url ({target})")
     else:
         await REPOSITORY.delete_site(await REPOSITORY.get_url(target))
+        if SCHEDULER:
+            SCHEDULER.remove_site(target)
+        TRACKER.remove(target)
+        AGGREGATES.remove(target)
         await msg.answer(f"Removed url with alias ({target})")
 
+@dp.message(Command("import"))
+async def import_command(msg: Message):
+    if msg.document is None:
+        await msg.answer("Attach a CSV or JSON file with /import as its caption")
+        return
+
+    buffer = await msg.bot.download(msg.document)
+    lines = io.TextIOWrapper(buffer, encoding="utf-8-sig", errors="replace", newline="")
+    try:
+        result = await import_sites(REPOSITORY, read_records(lines, detect_format(msg.document.file_name or "")))
+    except Exception as e:
+        await msg.answer(f"Import failed: {e}")
+        return
+
+    if SCHEDULER:
+        for url, alias, provider, critical in result.sites.values():
+            if await REPOSITORY.get_url(alias) == url:
+                SCHEDULER.add_site(url, alias, provider=provider, critical=critical)
+    await msg.answer(result.summary()[:4096])
+
+@dp.message(Command("export"))
+async def export_command(msg: Message):
+    args = msg.text.split()[1:]
+    fmt = args[0].lower() if args else "csv"
+    if fmt not in ("csv", "json"):
+        await msg.answer("Expected csv or json")
+        return
+
+    buffer = io.StringIO()
+    async for line in export_sites(REPOSITORY, fmt):
+        buffer.write(line)
+    filename = "sites.csv" if fmt == "csv" else "sites.jsonl"
+    await msg.answer_document(BufferedInputFile(buffer.getvalue().encode(), filename))
+
+@dp.message(Command("assert"))
+async def assertions(msg: Message):
+    try:
+        args = shlex.split(msg.text)[1:]
+    except ValueError:
+        await msg.answer("Incorrect quoting")
+        return
+
+    if not args or not await REPOSITORY.get_url(args[0]):
+        await msg.answer("Incorrect alias")
+        return
+
+    alias = args[0]
+    options = {}
+    for arg in args[1:]:
+        key, _, value = arg.partition('=')
+        if arg == 'clear':
+            options.clear()
+        elif key in ('contains', 'absent', 'selector') and value:
+            options[key] = value
+        elif key == 'max_size' and value.isdigit():
+            options[key] = int(value)
+        else:
+            await msg.answer(f"Incorrect option: {arg}")
+            return
+
+    if 'selector' in options:
+        import soupsieve
+        try:
+            soupsieve.compile(options['selector'])
+        except soupsieve.SelectorSyntaxError:
+            await msg.answer("Incorrect selector")
+            return
+
+    spec = AssertionSpec(**options)
+    await REPOSITORY.set_assertions(alias, *spec)
+    if SCHEDULER:
+        SCHEDULER.set_assertions(alias, spec)
+    await msg.answer(f"Assertions for {alias}: {', '.join(f'{key}={value}' for key, value in options.items()) or 'none'}")
+
+def _window(rows: list, backward: bool, paged: bool) -> tuple:
+    """Trim a PAGE_SIZE + 1 fetch to a page: (rows, more before, more after)"""
+    if backward:
+        return rows[-PAGE_SIZE:], len(rows) > PAGE_SIZE, True
+    return rows[:PAGE_SIZE], paged, len(rows) > PAGE_SIZE
+
+def _pager(prefix: str, buttons: tuple) -> Optional[InlineKeyboardMarkup]:
+    row = [InlineKeyboardButton(text=text, callback_data=f"{prefix}:{data}")
+           for text, data in buttons if data is not None]
+    # Telegram caps callback data at 64 bytes
+    if not row or any(len(button.callback_data.encode()) > 64 for button in row):
+        return None
+    return InlineKeyboardMarkup(inline_keyboard=[row])
+
+def _status(status: Optional[int], error: Optional[str]) -> str:
+    if status is None and error is None:
+        return "⚪"
+    return "🔴" if error or status >= 400 else "🟢"
+
+def _clip(text: str, size: int = 60) -> str:
+    return text if len(text) <= size else text[:size - 1] + "…"
+
+def _ago(ts: int) -> str:
+    seconds = max(0, int(datetime.datetime.now().timestamp()) - ts)
+    for unit, length in (("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds >= length:
+            return f"{seconds // length}{unit} ago"
+    return f"{seconds}s ago"
+
+async def sites_page(after_id: int = 0, before_id: Optional[int] = None) -> tuple:
+    rows = await REPOSITORY.get_sites_page(after_id, PAGE_SIZE + 1, before_id)
+    if not rows and (after_id or before_id is not None):
+        # The neighbouring sites were removed meanwhile
+        return await sites_page()
+    rows, more_before, more_after = _window(rows, before_id is not None, after_id > 0)
+    if not rows:
+        return "No sites", None
+
+    lines = []
+    for _, url, alias, _, critical, status, error, time, ts in rows:
+        line = f"{_status(status, error)} {alias}{' ❗' if critical else ''}: {_clip(url)}"
+        if ts is not None:
+            line += f" — {_clip(error) if error else status}, {time} ms, {_ago(ts)}"
+        lines.append(line)
+    markup = _pager("sites", (
+        ("◀ Prev", f"b:{rows[0][0]}" if more_before else None),
+        ("Next ▶", f"a:{rows[-1][0]}" if more_after else None),
+    ))
+    return "Sites:\n" + "\n".join(lines), markup
+
+async def history_page(alias: str, before: Optional[tuple] = None, after: Optional[tuple] = None) -> tuple:
+    rows = await REPOSITORY.get_checks_page(alias, before, PAGE_SIZE + 1, after)
+    if not rows and (before or after):
+        return await history_page(alias)
+    rows, newer, older = _window(rows, after is not None, before is not None)
+    if not rows:
+        return f"No checks for {alias}", None
+
+    lines = [
+        f"{datetime.datetime.fromtimestamp(ts, datetime.timezone.utc):%Y-%m-%d %H:%M:%S} "
+        f"{_status(status, error)} {_clip(error) if error else status}, {time} ms"
+        for _, status, error, time, _, ts in rows
+    ]
+    markup = _pager(f"history:{alias}", (
+        ("◀ Newer", f"a:{rows[0][5]}:{rows[0][0]}" if newer else None),
+        ("Older ▶", f"b:{rows[-1][5]}:{rows[-1][0]}" if older else None),
+    ))
+    return f"Checks of {alias} (UTC):\n" + "\n".join(lines), markup
+
+async def edit_page(callback: CallbackQuery, text: str, markup: Optional[InlineKeyboardMarkup]):
+    try:
+        await callback.message.edit_text(text, reply_markup=markup)
+    except TelegramBadRequest:
+        # Unchanged page, or the message is too old to edit
+        pass
+    await callback.answer()
+
 @dp.message(Command("list"))
 async def list(msg: Message):
-    sites = await REPOSITORY.get_all_sites()
-    sites_text = "\n * ".join([f"{alias}: {url}" for url, alias in sites])
-    await msg.answer(f"Sites:\n{sites_text}")
+    text, markup = await sites_page()
+    await msg.answer(text, reply_markup=markup)
+
+@dp.callback_query(F.data.startswith("sites:"))
+async def list_page(callback: CallbackQuery):
+    _, direction, site_id = callback.data.split(":")
+    if direction == "b":
+        text, markup = await sites_page(before_id=int(site_id))
+    else:
+        text, markup = await sites_page(after_id=int(site_id))
+    await edit_page(callback, text, markup)
+
+@dp.message(Command("history"))
+async def history(msg: Message):
+    args = msg.text.split()[1:]
+    if not args or not await REPOSITORY.get_url(args[0]):
+        await msg.answer("Incorrect alias")
+        return
+
+    text, markup = await history_page(args[0])
+    await msg.answer(text, reply_markup=markup)
+
+@dp.callback_query(F.data.startswith("history:"))
+async def history_page_callback(callback: CallbackQuery):
+    alias, direction, ts, check_id = callback.data.split(":", 1)[1].rsplit(":", 3)
+    key = (int(ts), int(check_id))
+    if direction == "a":
+        text, markup = await history_page(alias, after=key)
+    else:
+        text, markup = await history_page(alias, before=key)
+    await edit_page(callback, text, markup)
+
+@dp.message(Command("report"))
+async def report(msg: Message):
+    # numpy is only needed here
+    from report.report import build_report, parse_period
+
+    args = msg.text.split()[1:]
+    alias = None
+    period = "24h"
+
+    for arg in args:
+        if arg[:-1].isdigit() and arg[-1:].lower() in "hdw":
+            period = arg
+        else:
+            alias = arg
+
+    try:
+        seconds = parse_period(period)
+    except ValueError:
+        await msg.answer("Incorrect period")
+        return
+
+    text = await build_report(REPOSITORY, seconds, alias)
+    for offset in range(0, len(text), 4096):
+        await msg.answer(text[offset:offset + 4096])
 
 @dp.message(Command("time"))
 async def time(msg: Message):
     args = msg.text.split()[1:]
     
-    if not args:
-        await msg.answer("Incorrect timezone")
+    try:
+        parse_digest_time(args[0])
+    except (IndexError, ValueError):
+        await msg.answer("Incorrect time, expected HH:MM")
         return
 
-    CONFIG.set("DAYDIGEST", args[0])
+    if not await DIGEST.configure(msg.chat.id, digest_time=args[0]):
+        await msg.answer("Send /start first to subscribe")
+        return
+
+    await msg.answer("Digest time updated")
     
 @dp.message(Command("set_timezone"))
 async def set_timezone(msg: Message):
     args = msg.text.split()[1:]
     
-    if not args:
+    try:
+        ZoneInfo(args[0])
+    except (IndexError, ValueError, ZoneInfoNotFoundError):
         await msg.answer("Incorrect timezone")
         return
 
-    CONFIG.set("TZ", args[0])
+    if not await DIGEST.configure(msg.chat.id, tz=args[0]):
+        await msg.answer("Send /start first to subscribe")
+        return
 
     await msg.answer("Timezone updated")
 
-async def notificate():
-    for site in REPOSITORY.get_all_site():
-        pass
+async def notificate(alias: str, result: dict):
+    # The provider failed, not the site: no alert and no downtime
+    if result.get('provider_error'):
+        return
+    AGGREGATES.update(alias, result)
+    transition = TRACKER.feed(alias, result)
+    if transition:
+        _, status = transition
+        reason = result.get('error') or f"HTTP {result.get('status_code')}"
+        DISPATCHER.publish(STATUS_MESSAGES[status].format(alias=alias, reason=reason))
+    if result.get('content_changed'):
+        DISPATCHER.publish(f"📝 {alias} content changed")
 
-    global MSG
-    for msg in MSG:
-        msg.answer()
 
+async def notify_certificate(info: CertificateInfo):
+    if info.valid:
+        DISPATCHER.publish(f"🔒 Certificate of {info.host} expires in {info.days_left} days")
+    else:
+        DISPATCHER.publish(f"🔓 Certificate of {info.host} is invalid: {info.error}")
 
-async def is_valid_url(url: str) -> bool:
-    import re
-    
-    regex = re.compile(
-        r'^(https?|ftp)://'
-        r'([a-zA-Z0-9-]+\.)+[a-zA-Z]{2,}'
-        r'(:[0-9]{1,5})?'
-        r'(/.*)?$'
-    )
-    return bool(regex.match(url))
     
-async def start(config: ConfigSystem, repository: RepositorySystem, provider: ProviderSystem):
-    global CONFIG, REPOSITORY, PROVIDER
+async def start(config: ConfigSystem, repository: RepositorySystem, provider: ProviderSystem,
+                scheduler: CheckScheduler = None, certificates: CertificateMonitor = None):
+    global CONFIG, REPOSITORY, PROVIDER, SCHEDULER, DISPATCHER, DIGEST
 
     bot = Bot(token=os.getenv("TOKEN"))
 
     CONFIG = config
     REPOSITORY = repository
     PROVIDER = provider
+    SCHEDULER = scheduler
+    DISPATCHER = AlertDispatcher(bot, repository)
+
+    DIGEST = DigestScheduler(
+        DISPATCHER, repository, AGGREGATES,
+        default_tz=await config.get("TZ") or "UTC",
+        default_time=await config.get("DAYDIGEST") or "09:00"
+    )
+
+    await DISPATCHER.start()
+    await DIGEST.load()
+    digest_task = asyncio.create_task(DIGEST.run())
+    if SCHEDULER:
+        SCHEDULER.on_result = notificate
+    certificates_task = None
+    if certificates:
+        certificates.on_expiry = notify_certificate
+        certificates_task = asyncio.create_task(certificates.run())
 
-    await dp.start_polling(bot)
\ No newline at end of file
+    try:
+        await dp.start_polling(bot)
+    finally:
+        digest_task.cancel()
+        if certificates_task:
+            certificates_task.cancel()
+        await DISPATCHER.stop()
\ No newline at end of file
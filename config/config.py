@@ -1,4 +1,6 @@
 from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+import asyncio
 import importlib
 
 class ConfigFactory:
@@ -39,4 +41,57 @@ class ConfigSystem(ABC):
     async def set(self, key, value): pass
 
     @abstractmethod
-    async def close(self): pass
\ No newline at end of file
+    async def close(self): pass
+
+
+class CachedConfig(ConfigSystem):
+    """
+    Base for configs that keep every setting in memory.
+
+    get() is served from the cache; set() updates it immediately and
+    schedules one debounced write that carries all changes made meanwhile.
+    """
+
+    def __init__(self, debounce: float = 0.5):
+        self.data: Dict[str, Any] = {}
+        self.debounce = debounce
+        self._dirty: Dict[str, Any] = {}
+        self._save_task: Optional[asyncio.Task] = None
+        self._save_lock = asyncio.Lock()
+
+    async def get(self, key: str) -> Any:
+        return self.data.get(key)
+
+    async def set(self, key: str, value: Any) -> None:
+        self.data[key] = value
+        self._dirty[key] = value
+        if self._save_task is None:
+            self._save_task = asyncio.create_task(self._save_later())
+
+    async def _save_later(self) -> None:
+        await asyncio.sleep(self.debounce)
+        self._save_task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Write all pending changes at once"""
+        async with self._save_lock:
+            if not self._dirty:
+                return
+            changes, self._dirty = self._dirty, {}
+            try:
+                await self._write(changes)
+            except Exception:
+                self._dirty = {**changes, **self._dirty}
+                raise
+
+    async def close(self) -> None:
+        if self._save_task is not None:
+            self._save_task.cancel()
+            self._save_task = None
+        await self.flush()
+
+    @abstractmethod
+    async def _write(self, changes: Dict[str, Any]) -> None:
+        """Persist the changed keys atomically"""
+        pass
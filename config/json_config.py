@@ -1,13 +1,14 @@
 import aiofiles
+import aiofiles.os
 import json
-from typing import override, Any, Optional
+from typing import override, Any, Dict, Optional
 
-from config.config import Config
+from config.config import CachedConfig
 
 
-class JsonConfig(Config):
+class JsonConfig(CachedConfig):
     def __init__(self):
-        self.data = {}
+        super().__init__()
         self.path: Optional[str] = None
 
     @override
@@ -24,23 +25,21 @@ class JsonConfig(Config):
             raise Exception(f"Invalid JSON in {path}")
 
     @override
-    async def get(self, key: str) -> Any:
-        return self.data.get(key)
-
-    @override
-    async def set(self, key: str, value: Any) -> None:
-        self.data[key] = value
+    async def _write(self, changes: Dict[str, Any]) -> None:
         if self.path:
             await self.save(self.path)
 
     @override
     async def close(self) -> None:
-        if self.path:
-            await self.save(self.path)
+        await super().close()
         self.data = {}
         self.path = None
 
     async def save(self, path: str) -> None:
-        async with aiofiles.open(path, 'w', encoding='utf-8') as file:
+        """Write the whole config to a temp file and rename it over the original"""
+        tmp_path = f"{path}.tmp"
+        async with aiofiles.open(tmp_path, 'w', encoding='utf-8') as file:
             content = json.dumps(self.data, ensure_ascii=False, indent=4)
-            await file.write(content)
\ No newline at end of file
+            await file.write(content)
+            await file.flush()
+        await aiofiles.os.replace(tmp_path, path)
@@ -1,9 +1,10 @@
 from aiosqlite import connect, Connection
-from typing import override, Any, Optional
-from .config import ConfigSystem
+from typing import override, Any, Dict, Optional
+from .config import CachedConfig
 
-class SqliteConfig(ConfigSystem):
+class SqliteConfig(CachedConfig):
     def __init__(self):
+        super().__init__()
         self.conn: Connection = None
         self.path: str = None
     
@@ -18,30 +19,32 @@ class SqliteConfig(ConfigSystem):
         )""")
         await self.conn.commit()
 
+        await cursor.execute("SELECT key, value FROM settings")
+        self.data = dict(await cursor.fetchall())
+
     @override
     async def get(self, key: str) -> Optional[Any]:
         if not self.conn:
             raise ConnectionError("Database not connected. Call load() first.")
-        
-        cursor = await self.conn.cursor()
-        await cursor.execute("SELECT value FROM settings WHERE key = ?", (key,))
-        result = await cursor.fetchone()
-        return result[0] if result else None
+        return self.data.get(key)
 
     @override
     async def set(self, key: str, value: Any) -> None:
         if not self.conn:
             raise ConnectionError("Database not connected. Call load() first.")
-        
-        cursor = await self.conn.cursor()
-        await cursor.execute(
+        await super().set(key, str(value))
+
+    @override
+    async def _write(self, changes: Dict[str, Any]) -> None:
+        await self.conn.executemany(
             """INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)""",
-            (key, str(value))
+            list(changes.items())
         )
         await self.conn.commit()
 
     @override
     async def close(self) -> None:
         if self.conn:
+            await super().close()
             await self.conn.close()
-            self.conn = None
\ No newline at end of file
+            self.conn = None
@@ -1,26 +1,92 @@
 import asyncio
+import importlib
+import logging
+import time
+from contextlib import contextmanager
 from dotenv import load_dotenv
 import sys
+from typing import List, Tuple
 from config.config import ConfigFactory
 from repository.repository import RepositoryFactory
 from provider.provider import ProviderFactory
-from bot import start
+from scheduler.scheduler import CheckScheduler
+from scheduler.retention import RetentionJob
+from scheduler.certificates import CertificateMonitor
+from provider.probes import CertificateCache, DnsResolver
+from provider.budget import BudgetManager
+from metrics.metrics import monitor_event_loop
+
+logger = logging.getLogger(__name__)
+
+class StartupTimer:
+    """Wall-clock time of each startup phase; phases run concurrently are timed separately"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+
+    def report(self) -> str:
+        phases = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.phases)
+        return f"Started in {(time.perf_counter() - self.started) * 1000:.0f}ms ({phases})"
+
+async def transfer(repository, command: str, path: str):
+    """Bulk import sites from, or export them to, a CSV/JSON file ('-' for stdin/stdout)"""
+    from utils.site_io import detect_format, export_sites, import_sites, read_records
+
+    fmt = detect_format(path)
+    if command == "import":
+        file = sys.stdin if path == "-" else open(path, encoding="utf-8-sig", newline="")
+        with file:
+            result = await import_sites(repository, read_records(file, fmt))
+        print(result.summary())
+    else:
+        file = sys.stdout if path == "-" else open(path, "w", encoding="utf-8", newline="")
+        with file:
+            async for line in export_sites(repository, fmt):
+                file.write(line)
 
 async def main():
+    timer = StartupTimer()
     load_dotenv()
 
-    if len(sys.argv) < 3:
-        raise ValueError("Usage: python main.py <config_path> <repo_type> [connection_string]")
+    args = sys.argv[1:]
+    if len(args) not in (2, 4) or (len(args) == 4 and args[2] not in ("import", "export")):
+        raise ValueError("Usage: python main.py <config_path> <repo_path> [import|export <file|->]")
     
     config_factory = ConfigFactory()
     repository_factory = RepositoryFactory()
     provider_factory = ProviderFactory()
 
-    repo_path = sys.argv[2]
-    await repository_factory.create_repository(repo_path)
-    await provider_factory.create_provider("")
-    await config_factory.load_config(sys.argv[1])
-    
+    async def load_repository():
+        with timer.phase("repository"):
+            await repository_factory.create_repository(args[1], cached=len(args) == 2)
+
+    if len(args) == 4:
+        await load_repository()
+        repository = repository_factory.get_repository()
+        try:
+            await transfer(repository, args[2], args[3])
+        finally:
+            await repository.close()
+        return
+
+    async def load_config_and_provider():
+        with timer.phase("config"):
+            await config_factory.load_config(args[0])
+        # Only the selected provider's module (and its HTTP stack) gets imported
+        with timer.phase("provider"):
+            await provider_factory.create_provider(await config_factory.get_config().get("PROVIDER") or "http")
+
+    await asyncio.gather(load_config_and_provider(), load_repository())
+
     config = config_factory.get_config()
     repository = repository_factory.get_repository()
     provider = provider_factory.get_provider()
@@ -29,7 +95,58 @@ async def main():
     if repository == None: raise ValueError("Failed to get repository")
     if provider == None: raise ValueError("Failed to get provider")
 
-    await start(config, repository, provider)
+    with timer.phase("budgets"):
+        budgets = BudgetManager(repository)
+        await budgets.load(config, ProviderFactory.REGISTRY)
+    budgets_task = asyncio.create_task(budgets.run())
+
+    with timer.phase("scheduler"):
+        certificates = CertificateCache(DnsResolver())
+        workers = int(await config.get("WORKERS") or 1)
+        if workers > 1:
+            from scheduler.workers import WorkerPool
+            scheduler = WorkerPool(repository, provider_factory.default, workers, budgets=budgets,
+                                   certificates=certificates)
+        else:
+            scheduler = CheckScheduler(repository, provider_factory, budgets=budgets,
+                                       certificates=certificates)
+        await scheduler.load()
+    scheduler_task = asyncio.create_task(scheduler.run())
+
+    retention = RetentionJob(repository, int(await config.get("RETENTION_DAYS") or 30))
+    retention_task = asyncio.create_task(retention.run())
+
+    metrics_runner = metrics_task = None
+    metrics_port = await config.get("METRICS_PORT")
+    if metrics_port:
+        with timer.phase("metrics"):
+            from metrics.server import start_metrics_server
+            metrics_runner = await start_metrics_server(int(metrics_port))
+        metrics_task = asyncio.create_task(monitor_event_loop())
+
+    try:
+        # Checks are already running; the Telegram stack is by far the slowest
+        # import, so it loads in a thread while the loop keeps checking
+        with timer.phase("bot"):
+            bot = await asyncio.to_thread(importlib.import_module, "bot")
+        logger.info(timer.report())
+
+        monitor = CertificateMonitor(scheduler, certificates,
+                                     warn_days=int(await config.get("CERT_WARN_DAYS") or 14))
+        await bot.start(config, repository, provider, scheduler, monitor)
+    finally:
+        retention_task.cancel()
+        budgets_task.cancel()
+        if metrics_runner is not None:
+            metrics_task.cancel()
+            await metrics_runner.cleanup()
+        await scheduler.stop()
+        await scheduler_task
+        await budgets.save()
+        await provider_factory.close()
+        await config.close()
+        await repository.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(main())
@@ -0,0 +1,197 @@
+import asyncio
+import bisect
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class _Metric:
+    """
+    Base of all metrics. Updates are plain attribute arithmetic on the event
+    loop thread, so no locks are taken on the hot path.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional['Registry'] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], '_Metric'] = {}
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *values) -> '_Metric':
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._new_child()
+        return child
+
+    def _new_child(self) -> '_Metric':
+        raise NotImplementedError
+
+    def _samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        raise NotImplementedError
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        children = self._children.items() if self.labelnames else [((), self)]
+        for values, child in children:
+            base = dict(zip(self.labelnames, values))
+            for suffix, labels, value in child._samples():
+                merged = {**base, **labels}
+                label_text = ",".join(f'{key}="{val}"' for key, val in merged.items())
+                lines.append(f"{self.name}{suffix}{{{label_text}}} {value}" if label_text
+                             else f"{self.name}{suffix} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        self.value = 0.0
+        super().__init__(*args, **kwargs)
+
+    def _new_child(self) -> 'Counter':
+        child = Counter.__new__(Counter)
+        child.value = 0.0
+        return child
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def _samples(self):
+        return [("", {}, self.value)]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        self.value = 0.0
+        self.function: Optional[Callable[[], float]] = None
+        super().__init__(*args, **kwargs)
+
+    def _new_child(self) -> 'Gauge':
+        child = Gauge.__new__(Gauge)
+        child.value = 0.0
+        child.function = None
+        return child
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Read the value from `function` at scrape time"""
+        self.function = function
+
+    def _samples(self):
+        return [("", {}, self.function() if self.function is not None else self.value)]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional['Registry'] = None):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self) -> 'Histogram':
+        child = Histogram.__new__(Histogram)
+        child.buckets = self.buckets
+        child.counts = [0] * (len(self.buckets) + 1)
+        child.sum = 0.0
+        return child
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def time(self) -> '_Timer':
+        """Context manager observing the elapsed seconds"""
+        return _Timer(self)
+
+    def _samples(self):
+        samples, cumulative = [], 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            samples.append(("_bucket", {"le": repr(float(bound))}, cumulative))
+        cumulative += self.counts[-1]
+        samples.append(("_bucket", {"le": "+Inf"}, cumulative))
+        samples.append(("_sum", {}, self.sum))
+        samples.append(("_count", {}, cumulative))
+        return samples
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.__exit__(exc_type, exc_val, exc_tb)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> None:
+        self.metrics.append(metric)
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+CHECKS = Counter("monitor_checks_total", "Checks run", ("provider", "outcome"))
+CHECK_LATENCY = Histogram("monitor_check_latency_seconds", "Provider check latency", ("provider",))
+SCHEDULER_LAG = Histogram("monitor_scheduler_lag_seconds", "Delay between a check's due time and its start")
+REPOSITORY_WRITE_LATENCY = Histogram("monitor_repository_write_seconds", "Latency of batched check writes")
+REPOSITORY_BATCH_SIZE = Histogram(
+    "monitor_repository_batch_size", "Checks per batched write",
+    buckets=(1, 10, 50, 100, 250, 500, 1000, 2500, 5000)
+)
+TELEGRAM_SEND_LATENCY = Histogram("monitor_telegram_send_seconds", "Telegram send_message latency")
+ALERT_QUEUE_DEPTH = Gauge("monitor_alert_queue_depth", "Chats waiting for alert delivery")
+EVENT_LOOP_LAG = Histogram(
+    "monitor_event_loop_lag_seconds", "Event loop scheduling delay",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+)
+
+
+async def monitor_event_loop(interval: float = 0.5) -> None:
+    """Measure how late the loop wakes a task that asked to sleep `interval`"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - start - interval))
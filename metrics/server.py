@@ -0,0 +1,23 @@
+import logging
+
+from aiohttp import web
+
+from metrics.metrics import REGISTRY, Registry
+
+logger = logging.getLogger(__name__)
+
+
+async def start_metrics_server(port: int, host: str = "0.0.0.0",
+                               registry: Registry = REGISTRY) -> web.AppRunner:
+    """Serve `registry` at /metrics; returns the runner so the caller can clean it up"""
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Metrics endpoint listening on {host}:{port}")
+    return runner
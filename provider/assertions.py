@@ -0,0 +1,107 @@
+import asyncio
+import multiprocessing
+import re
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, NamedTuple, Optional
+
+# Literal names a simple selector can't match without: #id, .class and [attribute]
+SELECTOR_LITERALS = re.compile(r'[#.]([\w-]+)|\[\s*([\w-]+)')
+
+
+class AssertionSpec(NamedTuple):
+    """Content assertions of a site; a None field is not checked"""
+    contains: Optional[str] = None
+    absent: Optional[str] = None
+    selector: Optional[str] = None
+    max_size: Optional[int] = None
+
+    @property
+    def empty(self) -> bool:
+        return all(value is None for value in self)
+
+
+class _Matcher:
+    __slots__ = ("spec", "literals", "selector")
+
+    def __init__(self, spec: AssertionSpec):
+        self.spec = spec
+        self.literals: List[str] = []
+        self.selector = None
+        if spec.selector:
+            import soupsieve
+            self.selector = soupsieve.compile(spec.selector)
+            # With a union or negation a missing name doesn't rule out a match
+            if ',' not in spec.selector and ':not' not in spec.selector:
+                self.literals = [id_or_class or attribute for id_or_class, attribute
+                                 in SELECTOR_LITERALS.findall(spec.selector)]
+
+    def prefilter(self, content: str) -> Optional[str]:
+        """Cheap checks; returns the failure, or None if only the full parse is left"""
+        spec = self.spec
+        if spec.max_size is not None and len(content.encode()) > spec.max_size:
+            return f"body exceeds {spec.max_size} bytes"
+        if spec.contains is not None and spec.contains not in content:
+            return f"'{spec.contains}' not found"
+        if spec.absent is not None and spec.absent in content:
+            return f"'{spec.absent}' found"
+        for literal in self.literals:
+            if literal not in content:
+                return f"no match for '{spec.selector}'"
+        return None
+
+    def match(self, content: str) -> Optional[str]:
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(content, 'html.parser')
+        if self.selector.select_one(soup) is None:
+            return f"no match for '{self.spec.selector}'"
+        return None
+
+
+@lru_cache(maxsize=4096)
+def _matcher(spec: AssertionSpec) -> _Matcher:
+    # Cached per process, so pool workers compile each site's selector once
+    return _Matcher(spec)
+
+
+def _match(spec: AssertionSpec, content: str) -> Optional[str]:
+    return _matcher(spec).match(content)
+
+
+class AssertionEngine:
+    """
+    Evaluates content assertions. Size, keyword and selector-literal checks
+    run inline since they are substring scans; only a selector that survives
+    them is parsed, in a process pool (or threads with `processes=False`)
+    so big pages never block the event loop.
+    """
+
+    def __init__(self, max_workers: int = 2, processes: bool = True):
+        self.max_workers = max_workers
+        self.processes = processes
+        self._executor: Optional[Executor] = None
+
+    def _pool(self) -> Executor:
+        if self._executor is None:
+            if self.processes:
+                self._executor = ProcessPoolExecutor(
+                    self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._executor = ThreadPoolExecutor(self.max_workers)
+        return self._executor
+
+    async def evaluate(self, spec: AssertionSpec, content: Optional[str]) -> Optional[str]:
+        """The first failed assertion, or None if all hold"""
+        if content is None:
+            return "no body to check"
+        matcher = _matcher(spec)
+        failure = matcher.prefilter(content)
+        if failure is not None or matcher.selector is None:
+            return failure
+        return await asyncio.get_running_loop().run_in_executor(self._pool(), _match, spec, content)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import time as _time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from config.config import ConfigSystem
+from repository.repository import RepositorySystem
+from utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+MAX_SLOWDOWN = 16.0
+
+
+def current_month(now: Optional[float] = None) -> str:
+    return datetime.fromtimestamp(now if now is not None else _time.time(), timezone.utc).strftime("%Y-%m")
+
+
+def month_progress(now: Optional[float] = None) -> float:
+    """Fraction of the current UTC month that has elapsed"""
+    moment = datetime.fromtimestamp(now if now is not None else _time.time(), timezone.utc)
+    start = moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return (moment - start) / (end - start)
+
+
+class ProviderBudget:
+    """Request rate limit and monthly credit accounting for one provider"""
+
+    def __init__(self, provider: str, credit_limit: Optional[int] = None,
+                 rate: Optional[float] = None, month: Optional[str] = None, used: int = 0):
+        self.provider = provider
+        self.credit_limit = credit_limit
+        self.bucket = TokenBucket(rate) if rate else None
+        self.month = month or current_month()
+        self.used = used
+        self.remaining: Optional[int] = None
+        self.dirty = False
+
+    async def acquire(self) -> None:
+        if self.bucket is not None:
+            await self.bucket.acquire()
+
+    def _roll(self, now: Optional[float] = None) -> None:
+        """Start from zero when a new month begins"""
+        month = current_month(now)
+        if month != self.month:
+            self.month, self.used, self.remaining = month, 0, None
+            self.dirty = True
+
+    def charge(self, cost: Optional[int], remaining: Optional[int] = None) -> None:
+        """Account one call; `remaining` is the provider-reported quota, if any"""
+        self._roll()
+        self.used += cost if cost is not None else 1
+        if remaining is not None:
+            self.remaining = remaining
+        self.dirty = True
+
+    def _used_fraction(self, now: Optional[float] = None) -> Optional[float]:
+        if not self.credit_limit:
+            return None
+        # Exhausted budgets get no charge() to roll them over
+        self._roll(now)
+        if self.remaining is not None:
+            return 1 - self.remaining / self.credit_limit
+        return self.used / self.credit_limit
+
+    @property
+    def exhausted(self) -> bool:
+        used = self._used_fraction()
+        return used is not None and used >= 1
+
+    def slowdown(self, now: Optional[float] = None) -> float:
+        """
+        Interval multiplier for non-critical sites: how far the current
+        spend rate would overshoot the monthly budget (1.0 when on track).
+        """
+        used = self._used_fraction(now)
+        if used is None:
+            return 1.0
+        if used >= 1:
+            return MAX_SLOWDOWN
+        progress = max(month_progress(now), 1 / 720)
+        projected = used / progress
+        return min(MAX_SLOWDOWN, max(1.0, projected))
+
+
+class BudgetManager:
+    """Budgets of all providers, persisted through the repository"""
+
+    def __init__(self, repository: RepositorySystem, save_interval: float = 30):
+        self.repository = repository
+        self.save_interval = save_interval
+        self.budgets: Dict[str, ProviderBudget] = {}
+
+    async def load(self, config: ConfigSystem, providers) -> None:
+        """
+        Build budgets for `providers` from <NAME>_MONTHLY_CREDITS and
+        <NAME>_RATE settings; a configured credit limit is stored in the
+        repository, otherwise the stored one is used.
+        """
+        month = current_month()
+        stored = {provider: (used, limit) for provider, stored_month, used, limit
+                  in await self.repository.get_provider_budgets() if stored_month == month}
+
+        for provider in providers:
+            prefix = provider.upper()
+            credit_limit = await config.get(f"{prefix}_MONTHLY_CREDITS")
+            rate = await config.get(f"{prefix}_RATE")
+            used, stored_limit = stored.get(provider, (0, None))
+
+            if credit_limit is not None:
+                credit_limit = int(credit_limit)
+                await self.repository.set_provider_budget(provider, month, used, credit_limit)
+            else:
+                credit_limit = stored_limit
+
+            if credit_limit is None and rate is None:
+                continue
+            self.budgets[provider] = ProviderBudget(
+                provider, credit_limit, float(rate) if rate is not None else None, month, used
+            )
+
+    def get(self, provider: str) -> Optional[ProviderBudget]:
+        return self.budgets.get(provider)
+
+    async def save(self) -> None:
+        for budget in self.budgets.values():
+            if budget.dirty:
+                budget.dirty = False
+                await self.repository.set_provider_budget(
+                    budget.provider, budget.month, budget.used, budget.credit_limit
+                )
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.save_interval)
+            try:
+                await self.save()
+            except Exception:
+                logger.exception("Failed to save provider budgets")
@@ -0,0 +1,41 @@
+import hashlib
+
+
+class ContentHasher:
+    """
+    Incremental SHA-256 over a whitespace-normalized body.
+
+    Runs of whitespace collapse to one space and leading/trailing whitespace
+    is dropped, even when a run spans chunk boundaries, so cosmetic
+    reformatting doesn't register as a change.
+    """
+
+    __slots__ = ('_hash', '_pending_space', '_started', 'size')
+
+    def __init__(self):
+        self._hash = hashlib.sha256()
+        self._pending_space = False
+        self._started = False
+        self.size = 0
+
+    def update(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        self.size += len(chunk)
+
+        tokens = chunk.split()
+        if not tokens:
+            self._pending_space = True
+            return
+
+        if chunk[:1].isspace():
+            self._pending_space = True
+        for index, token in enumerate(tokens):
+            if self._started and (index or self._pending_space):
+                self._hash.update(b' ')
+            self._hash.update(token)
+            self._started = True
+        self._pending_space = chunk[-1:].isspace()
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
@@ -0,0 +1,192 @@
+import aiohttp
+import asyncio
+import logging
+import ssl
+from typing import Dict, Optional, Tuple, override
+
+from provider.provider import ProviderSystem
+from provider.tracing import PhaseTimings, create_trace_config
+from provider.content import ContentHasher
+
+logger = logging.getLogger(__name__)
+
+# Statuses that commonly mean "HEAD not supported" rather than a real failure
+HEAD_FALLBACK_STATUSES = {403, 405, 501}
+
+CHUNK_SIZE = 64 * 1024
+MAX_BODY_BYTES = 2 * 1024 * 1024
+
+
+class HttpProvider(ProviderSystem):
+    """Direct HTTP checks over a shared, pooled connector, opened by the first check"""
+
+    def __init__(self):
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._session_options: Optional[dict] = None
+        self.read_limit = 4096
+        self.max_body_bytes = MAX_BODY_BYTES
+        self.timeout = 10
+
+    @override
+    async def init(self, limit: int = 200, limit_per_host: int = 8, dns_ttl: int = 300,
+                   keepalive: float = 30, timeout: float = 10, read_limit: int = 4096,
+                   ssl_context: Optional[ssl.SSLContext] = None,
+                   max_body_bytes: int = MAX_BODY_BYTES, **kwargs) -> None:
+        self.read_limit = read_limit
+        self.max_body_bytes = max_body_bytes
+        self.timeout = timeout
+        self._session_options = {
+            'limit': limit,
+            'limit_per_host': limit_per_host,
+            'ttl_dns_cache': dns_ttl,
+            'keepalive_timeout': keepalive,
+            'ssl': ssl_context if ssl_context is not None else True,
+        }
+
+        logger.info("HTTP provider initialized successfully")
+
+    def _open_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(use_dns_cache=True, **self._session_options)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout, connect=min(self.timeout, 5)),
+            headers={'User-Agent': 'Monitor/1.0'},
+            trace_configs=[create_trace_config()]
+        )
+        return self.session
+
+    @override
+    async def check(self, url: str, watch_content: bool = False, etag: Optional[str] = None,
+                    last_modified: Optional[str] = None, keep_content: bool = False,
+                    **options) -> Dict:
+        if self._session_options is None:
+            raise RuntimeError("Provider not initialized. Call init() first.")
+        if self.session is None:
+            self._open_session()
+
+        loop = asyncio.get_running_loop()
+        start_time = loop.time()
+        content = None
+        timings = PhaseTimings()
+        content_state = self._empty_content_state()
+
+        try:
+            if watch_content or keep_content:
+                if keep_content:
+                    # A 304 would leave nothing to keep
+                    etag = last_modified = None
+                status, content_state, content = await self._fetch_content(
+                    url, etag, last_modified, timings, keep_content
+                )
+            else:
+                async with self.session.head(url, allow_redirects=True,
+                                             trace_request_ctx=timings) as response:
+                    status = response.status
+                    timings.finish()
+
+            if status in HEAD_FALLBACK_STATUSES and not (watch_content or keep_content):
+                async with self.session.get(url, allow_redirects=True,
+                                            trace_request_ctx=timings) as response:
+                    status = response.status
+                    body = await response.content.read(self.read_limit)
+                    timings.finish()
+                    content = body.decode(response.charset or 'utf-8', errors='replace')
+
+            response_time_ms = int((loop.time() - start_time) * 1000)
+
+            return {
+                'status_code': status,
+                'error': None,
+                'response_time_ms': response_time_ms,
+                'ssl_valid': url.lower().startswith('https://'),
+                'ssl_days_left': None,
+                'content': content,
+                'success': True,
+                **timings.as_dict(),
+                **content_state
+            }
+
+        except aiohttp.ClientConnectorCertificateError as e:
+            return self._create_error_result(
+                f"SSL error: {e.certificate_error}",
+                int((loop.time() - start_time) * 1000)
+            )
+
+        except aiohttp.ClientError as e:
+            return self._create_error_result(
+                f"Network error: {str(e) or type(e).__name__}",
+                int((loop.time() - start_time) * 1000)
+            )
+
+        except asyncio.TimeoutError:
+            return self._create_error_result(
+                f"Request timeout ({self.timeout}s)",
+                int((loop.time() - start_time) * 1000)
+            )
+
+        except Exception as e:
+            logger.exception(f"Unexpected error during HTTP check: {str(e)}")
+            return self._create_error_result(f"Unexpected error: {str(e)}", 0)
+
+    async def _fetch_content(self, url: str, etag: Optional[str], last_modified: Optional[str],
+                             timings: PhaseTimings, keep: bool = False
+                             ) -> Tuple[int, Dict, Optional[str]]:
+        """
+        Conditional GET; the body is hashed as it streams and is only kept,
+        up to `max_body_bytes`, with `keep`
+        """
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        async with self.session.get(url, headers=headers, allow_redirects=True,
+                                    trace_request_ctx=timings) as response:
+            state = {
+                'etag': response.headers.get('ETag', etag),
+                'last_modified': response.headers.get('Last-Modified', last_modified),
+                'content_hash': None,
+                'not_modified': response.status == 304
+            }
+            content = None
+            if response.status != 304:
+                hasher = ContentHasher()
+                kept = bytearray() if keep else None
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    hasher.update(chunk)
+                    if kept is not None:
+                        if len(kept) + len(chunk) > self.max_body_bytes:
+                            kept += chunk[:self.max_body_bytes - len(kept)]
+                            state['truncated'] = True
+                            break
+                        kept += chunk
+                state['content_hash'] = hasher.hexdigest()
+                if kept is not None:
+                    content = kept.decode(response.charset or 'utf-8', errors='replace')
+            timings.finish()
+            return response.status, state, content
+
+    @staticmethod
+    def _empty_content_state() -> Dict:
+        return {'etag': None, 'last_modified': None, 'content_hash': None, 'not_modified': False}
+
+    def _create_error_result(self, error_message: str, response_time_ms: int) -> Dict:
+        return {
+            'status_code': 0,
+            'error': error_message,
+            'response_time_ms': response_time_ms,
+            'ssl_valid': False,
+            'ssl_days_left': None,
+            'content': None,
+            'success': False,
+            **PhaseTimings().as_dict(),
+            **self._empty_content_state()
+        }
+
+    @override
+    async def close(self) -> None:
+        if self.session:
+            await self.session.close()
+            self.session = None
+            logger.info("HTTP provider session closed")
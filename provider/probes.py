@@ -0,0 +1,180 @@
+import asyncio
+import socket
+import ssl
+import time as _time
+from typing import Dict, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+class DnsResult(NamedTuple):
+    host: str
+    addresses: Tuple[str, ...]
+    resolve_ms: int
+    error: Optional[str]
+    resolved_at: float
+
+
+class DnsResolver:
+    """
+    Async resolution through the loop's getaddrinfo with a shared TTL cache.
+    Concurrent lookups of the same host share one query.
+    """
+
+    def __init__(self, ttl: float = 300, timeout: float = 5):
+        self.ttl = ttl
+        self.timeout = timeout
+        self.cache: Dict[str, DnsResult] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def resolve(self, host: str) -> DnsResult:
+        cached = self.cache.get(host)
+        if cached is not None and _time.time() - cached.resolved_at < self.ttl:
+            return cached
+
+        future = self._inflight.get(host)
+        if future is None:
+            future = self._inflight[host] = asyncio.ensure_future(self._query(host))
+            future.add_done_callback(lambda _: self._inflight.pop(host, None))
+        return await asyncio.shield(future)
+
+    async def _query(self, host: str) -> DnsResult:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            infos = await asyncio.wait_for(
+                loop.getaddrinfo(host, None, type=socket.SOCK_STREAM), self.timeout
+            )
+            addresses = tuple(dict.fromkeys(info[4][0] for info in infos))
+            error = None
+        except asyncio.TimeoutError:
+            addresses, error = (), f"DNS timeout ({self.timeout}s)"
+        except OSError as e:
+            addresses, error = (), f"DNS error: {e.strerror or e}"
+
+        result = DnsResult(host, addresses, int((loop.time() - start) * 1000), error, _time.time())
+        self.cache[host] = result
+        return result
+
+
+# OpenSSL verify result for a certificate past its notAfter
+X509_V_ERR_CERT_HAS_EXPIRED = 10
+
+
+class CertificateInfo(NamedTuple):
+    host: str
+    valid: bool
+    expires_at: Optional[float]
+    issuer: Optional[str]
+    san: Tuple[str, ...]
+    error: Optional[str]
+    checked_at: float
+    # False when the host couldn't be reached: nothing is known about the certificate
+    reachable: bool = True
+
+    @property
+    def days_left(self) -> Optional[int]:
+        if self.expires_at is None:
+            return None
+        return max(0, int((self.expires_at - _time.time()) // 86400))
+
+
+def _name(entries) -> Optional[str]:
+    fields = {key: value for entry in entries or () for key, value in entry}
+    return fields.get('organizationName') or fields.get('commonName')
+
+
+class CertificateCache:
+    """
+    Probes a host's certificate with a bare TLS handshake (no HTTP request)
+    and caches the outcome per host for `ttl` seconds. A host that couldn't
+    be reached is retried after `retry_ttl` and never reported invalid.
+    """
+
+    def __init__(self, resolver: Optional[DnsResolver] = None, ttl: float = 86400,
+                 timeout: float = 10, concurrency: int = 20, retry_ttl: float = 300):
+        self.resolver = resolver or DnsResolver()
+        self.ttl = ttl
+        self.retry_ttl = retry_ttl
+        self.timeout = timeout
+        self.certificates: Dict[str, CertificateInfo] = {}
+        self._context = ssl.create_default_context()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._inflight: Dict[Tuple[str, int], asyncio.Future] = {}
+
+    def get(self, host: str) -> Optional[CertificateInfo]:
+        return self.certificates.get(host)
+
+    def stale(self, host: str) -> bool:
+        info = self.certificates.get(host)
+        if info is None:
+            return True
+        return _time.time() - info.checked_at >= (self.ttl if info.reachable else self.retry_ttl)
+
+    def annotate(self, url: str, result: dict) -> None:
+        """Fill ssl_valid / ssl_days_left of an https check from the cached probe"""
+        parts = urlsplit(url)
+        if parts.scheme != 'https':
+            return
+        info = self.certificates.get(parts.hostname or '')
+        if info is not None and info.reachable:
+            result['ssl_valid'] = info.valid and (info.expires_at is None or info.expires_at > _time.time())
+            result['ssl_days_left'] = info.days_left
+
+    async def probe(self, host: str, port: int = 443) -> CertificateInfo:
+        key = (host, port)
+        future = self._inflight.get(key)
+        if future is None:
+            future = self._inflight[key] = asyncio.ensure_future(self._probe(host, port))
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _probe(self, host: str, port: int) -> CertificateInfo:
+        async with self._semaphore:
+            info = await self._handshake(host, port)
+        self.certificates[host] = info
+        return info
+
+    async def _handshake(self, host: str, port: int) -> CertificateInfo:
+        dns = await self.resolver.resolve(host)
+        if dns.error is not None:
+            return CertificateInfo(host, False, None, None, (), dns.error, _time.time(), False)
+
+        writer = None
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(dns.addresses[0], port, ssl=self._context,
+                                        server_hostname=host),
+                self.timeout
+            )
+            cert = writer.get_extra_info('peercert') or {}
+            not_after = cert.get('notAfter')
+            return CertificateInfo(
+                host,
+                True,
+                ssl.cert_time_to_seconds(not_after) if not_after else None,
+                _name(cert.get('issuer')),
+                tuple(value for kind, value in cert.get('subjectAltName', ()) if kind == 'DNS'),
+                None,
+                _time.time()
+            )
+        except ssl.SSLCertVerificationError as e:
+            # Verification fails before the certificate can be read, so an
+            # expired one is told apart by its verify code
+            now = _time.time()
+            expired = e.verify_code == X509_V_ERR_CERT_HAS_EXPIRED
+            return CertificateInfo(host, False, now if expired else None, None, (),
+                                   f"SSL error: {e.verify_message or e.reason}", now)
+        except ssl.SSLError as e:
+            return CertificateInfo(host, False, None, None, (), f"TLS error: {e.reason or e}", _time.time())
+        except asyncio.TimeoutError:
+            error = f"TLS handshake timeout ({self.timeout}s)"
+        except OSError as e:
+            error = f"Connect error: {e.strerror or e}"
+        finally:
+            if writer is not None:
+                writer.close()
+                try:
+                    await asyncio.wait_for(writer.wait_closed(), self.timeout)
+                except (asyncio.TimeoutError, OSError):
+                    pass
+        return CertificateInfo(host, False, None, None, (), error, _time.time(), False)
@@ -1,31 +1,63 @@
 from abc import ABC, abstractmethod
+from typing import Dict, Optional
+import asyncio
 import importlib
 
 class ProviderFactory:
     REGISTRY = {
-        "scrapfly": "providers.scrapfly_provider.ScrapflyProvider",
-        "scraper": "providers.scraper_provider.ScraperProvider", 
-        "hexowatch": "providers.hexowatch_provider.HexowatchProvider"
+        "http": "provider.http_provider.HttpProvider",
+        "scrapfly": "provider.scrapfly_provider.ScrapflyProvider"
     }
 
     def __init__(self):
         self.provider: ProviderSystem = None
+        self.default: Optional[str] = None
+        self.providers: Dict[str, ProviderSystem] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
 
     async def create_provider(self, provider_type: str):
+        """Create and initialize the default provider"""
+        self.provider = await self.get(provider_type)
+        self.default = provider_type
+
+    async def get(self, provider_type: Optional[str] = None) -> 'ProviderSystem':
+        """
+        Get a long-lived provider instance, importing and initializing it on
+        first use. None selects the default provider.
+        """
+        provider_type = provider_type or self.default
+        provider = self.providers.get(provider_type)
+        if provider is not None:
+            return provider
+
         if provider_type not in self.REGISTRY:
             raise ValueError(f"Unsupported provider type: {provider_type}")
 
-        module_path, class_name = self.REGISTRY[provider_type].rsplit('.', 1)
-        module = importlib.import_module(module_path)
-        provider_class = getattr(module, class_name)
+        lock = self._locks.setdefault(provider_type, asyncio.Lock())
+        async with lock:
+            provider = self.providers.get(provider_type)
+            if provider is None:
+                module_path, class_name = self.REGISTRY[provider_type].rsplit('.', 1)
+                module = importlib.import_module(module_path)
+                provider_class = getattr(module, class_name)
 
-        self.provider = provider_class()
+                provider = provider_class()
+                await provider.init()
+                self.providers[provider_type] = provider
+        return provider
 
     def get_provider(self) -> 'ProviderSystem':
         if self.provider is None:
             raise ValueError("Provider not created. Call create_provider() first.")
         return self.provider
 
+    async def close(self) -> None:
+        """Close every provider created so far"""
+        for provider in self.providers.values():
+            await provider.close()
+        self.providers.clear()
+        self.provider = None
+
 class ProviderSystem(ABC):
     @abstractmethod
     async def init(self, **kwargs) -> None:
@@ -33,16 +65,34 @@ class ProviderSystem(ABC):
         pass
 
     @abstractmethod
-    async def check(self, url: str) -> dict:
+    async def check(self, url: str, **options) -> dict:
         """
         Check provided URL and return results
+
+        Options (providers ignore the ones they don't support):
+            watch_content: bool - fetch and hash the body for change detection
+            etag, last_modified: Optional[str] - validators for a conditional request
+            keep_content: bool - return the (size-capped) body as 'content'
         
         Returns:
             dict: {
                 'status': int, 
                 'error': Optional[str],
                 'response_time': int,
-                'ssl_valid': bool
+                'ssl_valid': bool,
+                'dns_ms': Optional[int],
+                'connect_ms': Optional[int],
+                'tls_ms': Optional[int],
+                'ttfb_ms': Optional[int],
+                'transfer_ms': Optional[int],
+                'etag': Optional[str],
+                'last_modified': Optional[str],
+                'content_hash': Optional[str],
+                'not_modified': bool,
+                'truncated': bool - the body hit the provider's size cap (if reported),
+                'provider_error': bool - the provider, not the target, failed,
+                'cost': Optional[int] - credits charged by a metered provider,
+                'remaining_credit': Optional[int] - quota left as reported by the provider
             }
         """
         pass
@@ -1,39 +1,71 @@
 import aiohttp
 import os
+import json
 from typing import Dict, Optional
 from abc import ABC, abstractmethod
 from typing import override
-from provider import ProviderSystem
+from provider.provider import ProviderSystem
+from provider.tracing import PHASES
+from provider.content import ContentHasher
 import logging
 import asyncio
 import datetime
 
 logger = logging.getLogger(__name__)
 
+# API answers that mean Scrapfly itself is failing, not the target
+PROVIDER_ERROR_STATUSES = {401, 429, 500, 502, 503, 504}
+
+CHUNK_SIZE = 64 * 1024
+MAX_BODY_BYTES = 2 * 1024 * 1024
+# Bodies up to this size are read off when only the status is needed, so the
+# connection goes back to the pool; larger ones cost a reconnect instead
+DRAIN_BYTES = 64 * 1024
+
 class ScrapflyProvider(ProviderSystem):
     
     def __init__(self):
         self.api_key = None
         self.session = None
         self.base_url = "https://api.scrapfly.io/scrape"
+        self.stream = True
+        self.max_body_bytes = MAX_BODY_BYTES
 
-    async def initialize(self, api_key: Optional[str] = None, **kwargs) -> None:
+    @override
+    async def init(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                   stream: bool = True, max_body_bytes: int = MAX_BODY_BYTES, **kwargs) -> None:
         """Инициализация Scrapfly провайдера"""
         self.api_key = api_key or os.getenv("SCRAPFLY_KEY")
+        self.base_url = base_url or os.getenv("SCRAPFLY_URL") or self.base_url
         if not self.api_key:
             raise ValueError("SCRAPFLY_KEY not found in environment variables")
+        self.stream = stream
+        self.max_body_bytes = max_body_bytes
         
+        logger.info("Scrapfly provider initialized successfully")
+
+    def _open_session(self) -> aiohttp.ClientSession:
         timeout = aiohttp.ClientTimeout(total=30, connect=10)
         self.session = aiohttp.ClientSession(
             timeout=timeout,
             headers={'Accept': 'application/json'}
         )
-        
-        logger.info("Scrapfly provider initialized successfully")
+        return self.session
 
-    async def check(self, url: str) -> Dict:
-        if not self.session:
-            raise RuntimeError("Provider not initialized. Call initialize() first.")
+    @override
+    async def check(self, url: str, watch_content: bool = False, keep_content: bool = False,
+                    **options) -> Dict:
+        """
+        With `stream` the page comes back raw (proxified_response) and is read
+        in chunks up to `max_body_bytes`, only as far as hashing or
+        `keep_content` need it; otherwise the JSON envelope is parsed, still
+        under the same cap. The body is returned only with `keep_content`.
+        The session is opened by the first check.
+        """
+        if not self.api_key:
+            raise RuntimeError("Provider not initialized. Call init() first.")
+        if self.session is None:
+            self._open_session()
 
         try:
             params = {
@@ -43,6 +75,8 @@ class ScrapflyProvider(ProviderSystem):
                 'render_js': 'false',
                 'country': 'us'
             }
+            if self.stream:
+                params['proxified_response'] = 'true'
 
             start_time = asyncio.get_event_loop().time()
             
@@ -53,26 +87,47 @@ class ScrapflyProvider(ProviderSystem):
             ) as response:
                 
                 response_time_ms = int((asyncio.get_event_loop().time() - start_time) * 1000)
+                usage = self._read_usage(response.headers)
+
+                if self.stream:
+                    return {**await self._read_proxified(
+                        url, response, response_time_ms, watch_content, keep_content
+                    ), **usage}
                 
                 if response.status != 200:
-                    return self._create_error_result(
+                    return {**self._create_error_result(
                         f"Scrapfly API error: HTTP {response.status}",
-                        response_time_ms
-                    )
-                
-                response_data = await response.json()
+                        response_time_ms,
+                        provider_error=response.status in PROVIDER_ERROR_STATUSES
+                    ), **usage}
+
+                body = await self._read_capped(response)
+                if body is None:
+                    # The cap is ours, not the site's fault
+                    return {**self._create_error_result(
+                        f"Scrapfly response exceeds {self.max_body_bytes} bytes",
+                        response_time_ms,
+                        provider_error=True
+                    ), **usage}
+                response_data = json.loads(body)
+                del body
                 
                 success = response_data.get('success', False)
                 if not success:
                     error_msg = response_data.get('message', 'Unknown Scrapfly error')
-                    return self._create_error_result(
+                    return {**self._create_error_result(
                         f"Scrapfly error: {error_msg}",
                         response_time_ms
-                    )
+                    ), **usage}
                 
                 result = response_data.get('result', {})
                 http_status = result.get('status_code', 0)
-                content = result.get('content', '')
+                content = result.get('content') or ''
+                content_state = self._empty_content_state()
+                if watch_content:
+                    hasher = ContentHasher()
+                    hasher.update(content.encode())
+                    content_state['content_hash'] = hasher.hexdigest()
                 
                 ssl_info = result.get('ssl', {})
                 ssl_valid = ssl_info.get('valid', True)
@@ -84,44 +139,141 @@ class ScrapflyProvider(ProviderSystem):
                     'response_time_ms': response_time_ms,
                     'ssl_valid': ssl_valid,
                     'ssl_days_left': ssl_days_left,
-                    'content': content,
-                    'success': True
+                    'content': content if keep_content else None,
+                    'success': True,
+                    **dict.fromkeys(PHASES),
+                    **content_state,
+                    **usage
                 }
 
         except aiohttp.ClientError as e:
             logger.error(f"Network error during Scrapfly check: {str(e)}")
-            return self._create_error_result(f"Network error: {str(e)}", 0)
+            return self._create_error_result(f"Network error: {str(e)}", 0, provider_error=True)
             
         except asyncio.TimeoutError:
             logger.warning(f"Timeout during Scrapfly check for {url}")
-            return self._create_error_result("Request timeout (30s)", 0)
+            return self._create_error_result("Request timeout (30s)", 0, provider_error=True)
             
         except Exception as e:
             logger.exception(f"Unexpected error during Scrapfly check: {str(e)}")
             return self._create_error_result(f"Unexpected error: {str(e)}", 0)
 
+    async def _read_capped(self, response: aiohttp.ClientResponse) -> Optional[bytes]:
+        """The whole body, or None as soon as it exceeds `max_body_bytes`"""
+        if (response.content_length or 0) > self.max_body_bytes:
+            return None
+        body = bytearray()
+        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+            body += chunk
+            if len(body) > self.max_body_bytes:
+                return None
+        return bytes(body)
+
+    async def _read_proxified(self, url: str, response: aiohttp.ClientResponse,
+                              response_time_ms: int, watch_content: bool,
+                              keep_content: bool) -> Dict:
+        """Upstream status from the headers; the body is streamed only when needed, or drained if small"""
+        reject_code = response.headers.get('X-Scrapfly-Reject-Code')
+        if reject_code is not None:
+            description = response.headers.get('X-Scrapfly-Reject-Description', reject_code)
+            return self._create_error_result(
+                f"Scrapfly error: {description}",
+                response_time_ms,
+                provider_error=response.status in PROVIDER_ERROR_STATUSES
+            )
+
+        upstream = response.headers.get('X-Scrapfly-Upstream-Http-Code', '')
+        if not upstream.isdigit() and response.status >= 400:
+            # No upstream answer to relay: Scrapfly itself failed
+            return self._create_error_result(
+                f"Scrapfly API error: HTTP {response.status}",
+                response_time_ms,
+                provider_error=True
+            )
+        content_state = self._empty_content_state()
+        content = None
+
+        if watch_content or keep_content:
+            hasher = ContentHasher() if watch_content else None
+            kept = bytearray() if keep_content else None
+            read = 0
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                truncated = read + len(chunk) > self.max_body_bytes
+                if truncated:
+                    chunk = chunk[:self.max_body_bytes - read]
+                read += len(chunk)
+                if hasher is not None:
+                    hasher.update(chunk)
+                if kept is not None:
+                    kept += chunk
+                if truncated:
+                    # The rest of the body is never read, so memory stays capped
+                    content_state['truncated'] = True
+                    break
+            if hasher is not None:
+                content_state['etag'] = response.headers.get('ETag')
+                content_state['last_modified'] = response.headers.get('Last-Modified')
+                content_state['content_hash'] = hasher.hexdigest()
+            if kept is not None:
+                content = kept.decode(response.charset or 'utf-8', errors='replace')
+        elif response.content_length is not None and response.content_length <= DRAIN_BYTES:
+            await response.read()
+
+        return {
+            'status_code': int(upstream) if upstream.isdigit() else response.status,
+            'error': None,
+            'response_time_ms': response_time_ms,
+            'ssl_valid': url.lower().startswith('https://'),
+            'ssl_days_left': None,
+            'content': content,
+            'success': True,
+            **dict.fromkeys(PHASES),
+            **content_state
+        }
+
+    @staticmethod
+    def _read_usage(headers) -> Dict:
+        """Credits charged for the call and quota left, as reported by the API"""
+        usage = {'cost': None, 'remaining_credit': None}
+        for key, header in (('cost', 'X-Scrapfly-Api-Cost'),
+                            ('remaining_credit', 'X-Scrapfly-Remaining-Api-Credit')):
+            value = headers.get(header)
+            if value is not None and value.isdigit():
+                usage[key] = int(value)
+        return usage
+
     def _calculate_ssl_days_left(self, ssl_info: Dict) -> Optional[int]:
         not_after = ssl_info.get('not_after')
         if not not_after:
             return None
             
         try:
-            expiry_date = datetime.fromisoformat(not_after.replace('Z', '+00:00'))
-            days_left = (expiry_date - datetime.utcnow()).days
+            expiry_date = datetime.datetime.fromisoformat(not_after.replace('Z', '+00:00'))
+            if expiry_date.tzinfo is None:
+                expiry_date = expiry_date.replace(tzinfo=datetime.timezone.utc)
+            days_left = (expiry_date - datetime.datetime.now(datetime.timezone.utc)).days
             return max(0, days_left)
         except (ValueError, TypeError):
             return None
 
-    def _create_error_result(self, error_message: str, response_time_ms: int) -> Dict:
+    @staticmethod
+    def _empty_content_state() -> Dict:
+        return {'etag': None, 'last_modified': None, 'content_hash': None, 'not_modified': False}
+
+    def _create_error_result(self, error_message: str, response_time_ms: int,
+                             provider_error: bool = False) -> Dict:
         """Создает результат с ошибкой"""
         return {
+            'provider_error': provider_error,
             'status_code': 0,
             'error': error_message,
             'response_time_ms': response_time_ms,
             'ssl_valid': False,
             'ssl_days_left': None,
             'content': None,
-            'success': False
+            'success': False,
+            **dict.fromkeys(PHASES),
+            **self._empty_content_state()
         }
 
     async def close(self) -> None:
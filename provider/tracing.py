@@ -0,0 +1,98 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+import aiohttp
+
+PHASES = ('dns_ms', 'connect_ms', 'tls_ms', 'ttfb_ms', 'transfer_ms')
+
+
+class PhaseTimings:
+    """
+    Per-request phase timings filled in by the trace hooks.
+
+    Phases are additive: ttfb_ms excludes DNS and connect time. aiohttp has
+    no hook between the TCP connect and the TLS handshake, so for HTTPS the
+    handshake is part of connect_ms and tls_ms stays None.
+    Reused keep-alive connections report no dns_ms/connect_ms at all.
+    """
+
+    __slots__ = ('request_start', 'setup', 'dns_start', 'connect_start', 'headers_at') + PHASES
+
+    def __init__(self):
+        self.request_start: Optional[float] = None
+        self.setup = 0.0
+        self.dns_start: Optional[float] = None
+        self.connect_start: Optional[float] = None
+        self.headers_at: Optional[float] = None
+        for phase in PHASES:
+            setattr(self, phase, None)
+
+    def finish(self) -> None:
+        """Mark the end of the body transfer"""
+        if self.headers_at is not None:
+            self.transfer_ms = _ms(self.headers_at, asyncio.get_running_loop().time())
+
+    def as_dict(self) -> Dict[str, Optional[int]]:
+        return {phase: getattr(self, phase) for phase in PHASES}
+
+
+def _ms(start: float, end: float) -> int:
+    return int((end - start) * 1000)
+
+
+def _now() -> float:
+    return asyncio.get_running_loop().time()
+
+
+async def _on_request_start(session, ctx: SimpleNamespace, params) -> None:
+    timings = ctx.trace_request_ctx
+    if isinstance(timings, PhaseTimings):
+        timings.request_start = _now()
+        timings.setup = 0.0
+
+
+async def _on_dns_start(session, ctx: SimpleNamespace, params) -> None:
+    timings = ctx.trace_request_ctx
+    if isinstance(timings, PhaseTimings):
+        timings.dns_start = _now()
+
+
+async def _on_dns_end(session, ctx: SimpleNamespace, params) -> None:
+    timings = ctx.trace_request_ctx
+    if isinstance(timings, PhaseTimings) and timings.dns_start is not None:
+        timings.dns_ms = _ms(timings.dns_start, _now())
+
+
+async def _on_connect_start(session, ctx: SimpleNamespace, params) -> None:
+    timings = ctx.trace_request_ctx
+    if isinstance(timings, PhaseTimings):
+        timings.connect_start = _now()
+
+
+async def _on_connect_end(session, ctx: SimpleNamespace, params) -> None:
+    timings = ctx.trace_request_ctx
+    if isinstance(timings, PhaseTimings) and timings.connect_start is not None:
+        # DNS resolution happens inside connection creation
+        elapsed = _now() - timings.connect_start
+        timings.setup += elapsed
+        timings.connect_ms = max(0, int(elapsed * 1000) - (timings.dns_ms or 0))
+
+
+async def _on_request_end(session, ctx: SimpleNamespace, params) -> None:
+    timings = ctx.trace_request_ctx
+    if isinstance(timings, PhaseTimings) and timings.request_start is not None:
+        timings.headers_at = _now()
+        timings.ttfb_ms = _ms(timings.request_start + timings.setup, timings.headers_at)
+
+
+def create_trace_config() -> aiohttp.TraceConfig:
+    """Trace config recording phases into the PhaseTimings passed as trace_request_ctx"""
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(_on_request_start)
+    trace_config.on_dns_resolvehost_start.append(_on_dns_start)
+    trace_config.on_dns_resolvehost_end.append(_on_dns_end)
+    trace_config.on_connection_create_start.append(_on_connect_start)
+    trace_config.on_connection_create_end.append(_on_connect_end)
+    trace_config.on_request_end.append(_on_request_end)
+    return trace_config
@@ -0,0 +1,73 @@
+import time as _time
+from typing import Dict, List, Optional, Tuple
+
+from alert.state import is_success
+
+HOURS = 24
+
+
+class RunningAggregates:
+    """
+    Rolling 24-hour per-site counters, updated from the check pipeline.
+
+    Each site has one slot per hour of the day ([hour, count, failures,
+    latency_sum, latency_max]); a slot is reset when its hour comes round
+    again, so updates are O(1) and a digest never reads raw checks.
+    """
+
+    def __init__(self):
+        self.sites: Dict[str, List[List[int]]] = {}
+
+    def update(self, alias: str, result: dict, now: Optional[float] = None) -> None:
+        hour = int((now if now is not None else _time.time()) // 3600)
+        slots = self.sites.get(alias)
+        if slots is None:
+            slots = self.sites[alias] = [[-1, 0, 0, 0, 0] for _ in range(HOURS)]
+
+        slot = slots[hour % HOURS]
+        if slot[0] != hour:
+            slot[:] = [hour, 0, 0, 0, 0]
+
+        slot[1] += 1
+        if is_success(result):
+            latency = result.get('response_time_ms') or 0
+            slot[3] += latency
+            slot[4] = max(slot[4], latency)
+        else:
+            slot[2] += 1
+
+    def remove(self, alias: str) -> None:
+        self.sites.pop(alias, None)
+
+    def summary(self, now: Optional[float] = None) -> List[Tuple[str, int, int, float, int]]:
+        """(alias, checks, failures, avg latency ms, max latency ms) over the last 24 hours"""
+        first_hour = int((now if now is not None else _time.time()) // 3600) - HOURS + 1
+        rows = []
+        for alias, slots in self.sites.items():
+            count = failures = latency_sum = latency_max = 0
+            for hour, slot_count, slot_failures, slot_sum, slot_max in slots:
+                if hour >= first_hour:
+                    count += slot_count
+                    failures += slot_failures
+                    latency_sum += slot_sum
+                    latency_max = max(latency_max, slot_max)
+            if count:
+                successes = count - failures
+                rows.append((alias, count, failures,
+                             latency_sum / successes if successes else 0.0, latency_max))
+        return rows
+
+    def format_digest(self, now: Optional[float] = None) -> str:
+        rows = self.summary(now)
+        if not rows:
+            return "Daily digest: no checks in the last 24 hours"
+
+        rows.sort(key=lambda row: row[2] / row[1], reverse=True)
+        total = sum(row[1] for row in rows)
+        failed = sum(row[2] for row in rows)
+        lines = [f"Daily digest: {len(rows)} sites, {total} checks, "
+                 f"{100.0 * (1 - failed / total):.2f}% up"]
+        for alias, count, failures, latency_avg, latency_max in rows:
+            lines.append(f"{alias}: {100.0 * (1 - failures / count):.2f}% up, "
+                         f"avg {latency_avg:.0f} ms, max {latency_max} ms")
+        return "\n".join(lines)
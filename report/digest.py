@@ -0,0 +1,125 @@
+import asyncio
+import heapq
+import logging
+import time as _time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from alert.dispatcher import AlertDispatcher, split_message
+from repository.repository import RepositorySystem
+from report.aggregates import RunningAggregates
+
+logger = logging.getLogger(__name__)
+
+
+def parse_digest_time(value: str) -> Tuple[int, int]:
+    """Parse 'HH:MM' into (hour, minute)"""
+    hour, _, minute = value.partition(":")
+    hour, minute = int(hour), int(minute or 0)
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"Invalid digest time: {value}")
+    return hour, minute
+
+
+def next_send_time(tz: str, digest_time: str, now: Optional[float] = None) -> float:
+    """Unix time of the next `digest_time` wall-clock moment in `tz`"""
+    zone = ZoneInfo(tz)
+    hour, minute = parse_digest_time(digest_time)
+    local_now = datetime.fromtimestamp(now if now is not None else _time.time(), zone)
+
+    local = local_now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if local <= local_now:
+        local = (local + timedelta(days=1)).replace(hour=hour, minute=minute)
+    return local.timestamp()
+
+
+class DigestScheduler:
+    """
+    Sends each subscriber a daily digest at their local digest time.
+
+    Send times live in a heap and one task sleeps until the earliest; the
+    digest text comes from RunningAggregates, split into messages under
+    Telegram's length limit, and is shared by chats due within the same
+    minute.
+    """
+
+    def __init__(self, dispatcher: AlertDispatcher, repository: RepositorySystem,
+                 aggregates: RunningAggregates, default_tz: str = "UTC",
+                 default_time: str = "09:00"):
+        self.dispatcher = dispatcher
+        self.repository = repository
+        self.aggregates = aggregates
+        self.default_tz = default_tz
+        self.default_time = default_time
+
+        self.settings: Dict[int, Tuple[Optional[str], Optional[str]]] = {}
+        self._generations: Dict[int, int] = {}
+        self._heap: List[Tuple[float, int, int]] = []
+        self._wakeup = asyncio.Event()
+        self._cached: Tuple[float, List[str]] = (0.0, [])
+
+    async def load(self) -> None:
+        for chat_id, tz, digest_time in await self.repository.get_digest_settings():
+            self.settings[chat_id] = (tz, digest_time)
+            self._schedule(chat_id)
+
+    def add_chat(self, chat_id: int) -> None:
+        """Schedule a new subscriber with its current (or default) settings"""
+        self.settings.setdefault(chat_id, (None, None))
+        self._schedule(chat_id)
+
+    async def configure(self, chat_id: int, tz: Optional[str] = None,
+                        digest_time: Optional[str] = None) -> bool:
+        """Change a subscriber's timezone and/or digest time and reschedule it; False if not subscribed"""
+        current_tz, current_time = self.settings.get(chat_id, (None, None))
+        tz = tz or current_tz
+        digest_time = digest_time or current_time
+        if not await self.repository.set_digest_settings(chat_id, tz, digest_time):
+            return False
+        self.settings[chat_id] = (tz, digest_time)
+        self._schedule(chat_id)
+        return True
+
+    def _schedule(self, chat_id: int) -> None:
+        tz, digest_time = self.settings.get(chat_id, (None, None))
+        try:
+            send_at = next_send_time(tz or self.default_tz, digest_time or self.default_time)
+        except (ValueError, KeyError) as e:
+            logger.warning(f"Bad digest settings for {chat_id}: {e}")
+            return
+
+        # Older entries for the same chat are discarded lazily when popped
+        generation = self._generations.get(chat_id, 0) + 1
+        self._generations[chat_id] = generation
+        heapq.heappush(self._heap, (send_at, generation, chat_id))
+        if self._heap[0][2] == chat_id and self._heap[0][1] == generation:
+            self._wakeup.set()
+
+    def _digest_messages(self, now: float) -> List[str]:
+        cached_at, messages = self._cached
+        if now - cached_at >= 60:
+            messages = split_message(self.aggregates.format_digest(now))
+            self._cached = (now, messages)
+        return messages
+
+    async def run(self) -> None:
+        while True:
+            now = _time.time()
+            while self._heap and self._heap[0][0] <= now:
+                _, generation, chat_id = heapq.heappop(self._heap)
+                if self._generations.get(chat_id) != generation:
+                    continue
+                if chat_id not in self.dispatcher.subscribers:
+                    del self._generations[chat_id]
+                    continue
+                for text in self._digest_messages(now):
+                    self.dispatcher.send(chat_id, text)
+                self._schedule(chat_id)
+
+            self._wakeup.clear()
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,177 @@
+import time as _time
+from typing import Dict, Optional
+
+import numpy as np
+
+from repository.repository import RepositorySystem
+
+PERCENTILES = (0.5, 0.95, 0.99)
+PERIODS = {"h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+def parse_period(period: str) -> int:
+    """Parse '24h', '7d', '2w' into seconds"""
+    unit = period[-1:].lower()
+    if unit not in PERIODS or not period[:-1].isdigit():
+        raise ValueError(f"Unsupported period: {period}")
+    return int(period[:-1]) * PERIODS[unit]
+
+
+class CheckHistory:
+    """
+    Check history for many sites as parallel NumPy columns.
+
+    Rolled-up hours only keep counts and p50/p95, so each enters as weighted
+    samples: its failures and errors at no latency, and half its successful
+    checks at each of p50 and p95. Percentiles spanning such hours are
+    approximate; counts, uptime and error rates stay exact.
+    """
+
+    def __init__(self, aliases: Dict[int, str], columns: Dict[str, np.ndarray],
+                 hourly: Optional[Dict[str, np.ndarray]] = None):
+        self.aliases = aliases
+        self.site_id = columns['site_id']
+        # Absent when loaded without timestamps
+        self.ts: Optional[np.ndarray] = columns.get('ts')
+        self.time = columns['time']
+        self.failed = columns['failed'].astype(bool)
+        self.errored = columns['errored'].astype(bool)
+        # None while every row is one check
+        self.weight: Optional[np.ndarray] = None
+
+        if hourly is not None and len(hourly['hour']):
+            ok = hourly['count'] - hourly['failures']
+            samples = (
+                # (weight, time, failed, errored)
+                ((ok + 1) // 2, hourly['p50'], False, False),
+                (ok // 2, hourly['p95'], False, False),
+                (hourly['failures'] - hourly['errors'], 0, True, False),
+                (hourly['errors'], 0, True, True),
+            )
+            hours = len(hourly['hour'])
+            weight = np.concatenate([np.ones(len(self.site_id), dtype=np.int64)]
+                                    + [sample[0] for sample in samples])
+            keep = weight > 0
+
+            def extend(column: np.ndarray, values) -> np.ndarray:
+                return np.concatenate([column] + [np.broadcast_to(value, hours)
+                                                  for value in values])[keep]
+
+            self.site_id = extend(self.site_id, [hourly['site_id']] * len(samples))
+            if self.ts is not None:
+                self.ts = extend(self.ts, [hourly['hour']] * len(samples))
+            self.time = extend(self.time, [sample[1] for sample in samples])
+            self.failed = extend(self.failed, [sample[2] for sample in samples])
+            self.errored = extend(self.errored, [sample[3] for sample in samples])
+            self.weight = weight[keep]
+
+    @classmethod
+    async def load(cls, repository: RepositorySystem, since: int, until: Optional[int] = None,
+                   timestamps: bool = True) -> 'CheckHistory':
+        """Load a period; without `timestamps` it can only be summarized per site"""
+        aliases, columns, hourly = await repository.get_check_history(since, until, timestamps)
+        return cls(aliases, columns, hourly)
+
+    def __len__(self) -> int:
+        return len(self.site_id)
+
+
+def _group_percentiles(keys: np.ndarray, values: np.ndarray, groups: int,
+                       weights: Optional[np.ndarray] = None) -> np.ndarray:
+    """Nearest-rank percentiles of `values` per key in [0, groups), optionally weighted; NaN for empty groups"""
+    result = np.full((groups, len(PERCENTILES)), np.nan)
+    if not len(keys):
+        return result
+
+    # One int64 sort over (key, value) instead of a two-key lexsort
+    combined = (keys.astype(np.int64) << 32) | values.astype(np.int64)
+    if weights is None:
+        values = np.sort(combined) & 0xFFFFFFFF
+        cumulative = np.arange(1, len(keys) + 1)
+    else:
+        order = np.argsort(combined)
+        values = combined[order] & 0xFFFFFFFF
+        cumulative = np.cumsum(weights[order])
+    # Samples of group g hold cumulative weights (before[g], before[g] + totals[g]]
+    totals = np.bincount(keys, weights=weights, minlength=groups).astype(np.int64)
+    before = np.cumsum(totals) - totals
+    present = totals > 0
+
+    for column, q in enumerate(PERCENTILES):
+        ranks = np.maximum(np.ceil(q * totals[present]).astype(np.int64), 1)
+        result[present, column] = values[np.searchsorted(cumulative, before[present] + ranks)]
+    return result
+
+
+def summarize(history: CheckHistory, bucket: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """
+    Per-site (and optionally per time bucket) uptime, error rate and latency percentiles.
+
+    Rows of the result follow `sites`, or sites x buckets when `bucket`
+    seconds is given. Latency percentiles only consider successful checks.
+    """
+    # Dense site index without sorting: ids are small positive integers
+    seen = np.zeros(int(history.site_id.max()) + 1 if len(history) else 0, dtype=bool)
+    seen[history.site_id] = True
+    site_ids = np.flatnonzero(seen)
+    site_index = (np.cumsum(seen) - 1)[history.site_id]
+    keys = site_index
+    groups = len(site_ids)
+
+    buckets = None
+    if bucket and history.ts is None:
+        raise ValueError("Bucketed summaries need a history loaded with timestamps")
+    if bucket and len(history):
+        start = history.ts.min() // bucket * bucket
+        bucket_index = (history.ts - start) // bucket
+        buckets = int(bucket_index.max()) + 1
+        keys = site_index * buckets + bucket_index
+        groups *= buckets
+
+    weight = history.weight
+    counts = np.bincount(keys, weights=weight, minlength=groups).astype(np.int64)
+    failures = np.bincount(keys, weights=history.failed if weight is None else history.failed * weight,
+                           minlength=groups)
+    errors = np.bincount(keys, weights=history.errored if weight is None else history.errored * weight,
+                         minlength=groups)
+    ok = ~history.failed
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        summary = {
+            'sites': np.array([history.aliases.get(int(i), str(i)) for i in site_ids], dtype=object),
+            'count': counts,
+            'uptime': 100.0 * (1 - failures / counts),
+            'error_rate': 100.0 * errors / counts,
+            'latency': _group_percentiles(keys[ok], history.time[ok], groups,
+                                          None if weight is None else weight[ok]),
+        }
+
+    if buckets is not None:
+        for key in ('count', 'uptime', 'error_rate'):
+            summary[key] = summary[key].reshape(len(site_ids), buckets)
+        summary['latency'] = summary['latency'].reshape(len(site_ids), buckets, len(PERCENTILES))
+        summary['bucket_start'] = start + bucket * np.arange(buckets)
+    return summary
+
+
+async def build_report(repository: RepositorySystem, period: int,
+                       alias: Optional[str] = None) -> str:
+    """Human-readable report over the last `period` seconds, worst uptime first"""
+    history = await CheckHistory.load(repository, int(_time.time()) - period, timestamps=False)
+    summary = summarize(history)
+    return format_summary(summary, alias)
+
+
+def format_summary(summary: Dict[str, np.ndarray], alias: Optional[str] = None) -> str:
+    lines = []
+    for index in np.argsort(summary['uptime'], kind='stable'):
+        site = summary['sites'][index]
+        if alias is not None and site != alias:
+            continue
+        p50, p95, p99 = summary['latency'][index]
+        latency = "n/a" if np.isnan(p50) else f"p50 {p50:.0f} / p95 {p95:.0f} / p99 {p99:.0f} ms"
+        lines.append(
+            f"{site}: {summary['uptime'][index]:.2f}% up, "
+            f"{summary['error_rate'][index]:.2f}% errors, {latency}"
+        )
+    return "\n".join(lines) if lines else "No checks in this period"
@@ -0,0 +1,201 @@
+import asyncio
+from typing import override, Any, Optional, Tuple, List, Iterable, Dict
+from .repository import RepositorySystem
+
+class CachedRepository(RepositorySystem):
+    """
+    Write-through site cache around any repository.
+
+    Sites are indexed by alias and by URL once, on the first site lookup or
+    write, so later lookups and listings never touch the backend. Check
+    methods are passed through.
+    """
+
+    def __init__(self, inner: RepositorySystem):
+        self.inner = inner
+        self._by_alias: Dict[str, Tuple[str, str, Optional[str], bool]] = {}
+        self._by_url: Dict[str, str] = {}
+        self._warmed: Optional[asyncio.Future] = None
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    @override
+    async def init(self, path) -> None:
+        await self.inner.init(path)
+
+    async def _ready(self) -> None:
+        """Warm the index on first use; concurrent callers share one load"""
+        if self._warmed is None:
+            self._warmed = asyncio.ensure_future(self.warm())
+        try:
+            await asyncio.shield(self._warmed)
+        except Exception:
+            self._warmed = None
+            raise
+
+    async def warm(self) -> None:
+        """(Re)load the site index from the backend"""
+        sites = await self.inner.get_all_sites()
+        # Swapped in whole, so lookups during the load still see the old index
+        self._by_alias = {alias: (url, alias, provider, critical) for url, alias, provider, critical in sites}
+        self._by_url = {url: alias for url, alias, _, _ in sites}
+
+    def _index(self, url: str, alias: str, provider: Optional[str], critical: bool) -> None:
+        self._by_alias[alias] = (url, alias, provider, critical)
+        self._by_url[url] = alias
+
+    @override
+    async def add_site(self, url: str, alias: str, provider: Optional[str] = None,
+                       critical: bool = False) -> None:
+        await self._ready()
+        await self.inner.add_site(url, alias, provider, critical)
+        self._index(url, alias if alias is not None else "", provider, critical)
+
+    @override
+    async def upsert_sites(self, sites: Iterable[Tuple[str, str, Optional[str], bool]]) -> int:
+        await self._ready()
+        written = await self.inner.upsert_sites(sites)
+        if written:
+            # Upserts may move URLs between aliases; one reload beats patching
+            await self.warm()
+        return written
+
+    @override
+    async def add_check(self, alias: str, status: int,
+                      error: Optional[str], time: int, ssl_warn: bool,
+                      ts: Optional[int] = None, **timings) -> None:
+        await self.inner.add_check(alias, status, error, time, ssl_warn, ts, **timings)
+
+    @override
+    async def add_checks_bulk(self, checks: Iterable[Tuple]) -> None:
+        await self.inner.add_checks_bulk(checks)
+
+    @override
+    async def delete_site(self, url: str) -> None:
+        await self._ready()
+        await self.inner.delete_site(url)
+        alias = self._by_url.pop(url, None)
+        if alias is not None:
+            self._by_alias.pop(alias, None)
+
+    @override
+    async def delete_checks(self) -> None:
+        await self.inner.delete_checks()
+
+    @override
+    async def get_url(self, alias: str) -> Optional[str]:
+        await self._ready()
+        site = self._by_alias.get(alias)
+        return site[0] if site else None
+
+    async def get_alias(self, url: str) -> Optional[str]:
+        await self._ready()
+        return self._by_url.get(url)
+
+    @override
+    async def get_check(self, check_id: int) -> Optional[Tuple]:
+        return await self.inner.get_check(check_id)
+
+    @override
+    async def set_site(self, alias: str, new_url: str) -> None:
+        await self._ready()
+        await self.inner.set_site(alias, new_url)
+        site = self._by_alias.get(alias)
+        if site is not None:
+            self._by_url.pop(site[0], None)
+            self._index(new_url, alias, site[2], site[3])
+
+    @override
+    async def get_all_sites(self) -> List[Tuple[str, str, Optional[str], bool]]:
+        await self._ready()
+        return list(self._by_alias.values())
+
+    @override
+    async def get_sites_page(self, after_id: int = 0, limit: int = 20,
+                             before_id: Optional[int] = None) -> List[Tuple]:
+        return await self.inner.get_sites_page(after_id, limit, before_id)
+
+    @override
+    async def get_checks_page(self, alias: str, before: Optional[Tuple[int, int]] = None,
+                              limit: int = 20, after: Optional[Tuple[int, int]] = None) -> List[Tuple]:
+        return await self.inner.get_checks_page(alias, before, limit, after)
+
+    @override
+    async def get_all_checks(self, alias: str) -> List[Tuple]:
+        return await self.inner.get_all_checks(alias)
+
+    @override
+    async def get_checks(self, alias: str, since: int,
+                         until: Optional[int] = None) -> List[Tuple]:
+        return await self.inner.get_checks(alias, since, until)
+
+    @override
+    async def get_check_history(self, since: int, until: Optional[int] = None, timestamps: bool = True
+                                ) -> Tuple[Dict[int, str], Dict[str, Any], Dict[str, Any]]:
+        return await self.inner.get_check_history(since, until, timestamps)
+
+    @override
+    async def get_hourly_checks(self, alias: str, since: int,
+                                until: Optional[int] = None) -> List[Tuple]:
+        return await self.inner.get_hourly_checks(alias, since, until)
+
+    @override
+    async def rollup_checks(self, older_than_days: int, chunk_size: int = 5000) -> int:
+        return await self.inner.rollup_checks(older_than_days, chunk_size)
+
+    @override
+    async def watch_content(self, alias: str) -> None:
+        await self.inner.watch_content(alias)
+
+    @override
+    async def get_content_states(self) -> List[Tuple]:
+        return await self.inner.get_content_states()
+
+    @override
+    async def set_content_state(self, alias: str, etag: Optional[str],
+                                last_modified: Optional[str], content_hash: Optional[str]) -> None:
+        await self.inner.set_content_state(alias, etag, last_modified, content_hash)
+
+    @override
+    async def get_assertions(self) -> List[Tuple]:
+        return await self.inner.get_assertions()
+
+    @override
+    async def set_assertions(self, alias: str, contains: Optional[str], absent: Optional[str],
+                             selector: Optional[str], max_size: Optional[int]) -> None:
+        await self.inner.set_assertions(alias, contains, absent, selector, max_size)
+
+    @override
+    async def add_subscriber(self, chat_id: int) -> None:
+        await self.inner.add_subscriber(chat_id)
+
+    @override
+    async def delete_subscriber(self, chat_id: int) -> None:
+        await self.inner.delete_subscriber(chat_id)
+
+    @override
+    async def get_subscribers(self) -> List[int]:
+        return await self.inner.get_subscribers()
+
+    @override
+    async def get_digest_settings(self) -> List[Tuple[int, Optional[str], Optional[str]]]:
+        return await self.inner.get_digest_settings()
+
+    @override
+    async def set_digest_settings(self, chat_id: int, tz: Optional[str],
+                                  digest_time: Optional[str]) -> bool:
+        return await self.inner.set_digest_settings(chat_id, tz, digest_time)
+
+    @override
+    async def get_provider_budgets(self) -> List[Tuple[str, str, int, Optional[int]]]:
+        return await self.inner.get_provider_budgets()
+
+    @override
+    async def set_provider_budget(self, provider: str, month: str, used: int,
+                                  credit_limit: Optional[int]) -> None:
+        await self.inner.set_provider_budget(provider, month, used, credit_limit)
+
+    @override
+    async def close(self) -> None:
+        await self.inner.close()
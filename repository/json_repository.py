@@ -0,0 +1,799 @@
+import asyncio
+import bisect
+import contextlib
+import glob
+import json
+import logging
+import os
+import sys
+import time as _time
+from array import array
+from typing import override, Any, BinaryIO, Callable, Dict, List, Optional, Tuple, Iterable
+from .repository import RepositorySystem, percentile
+from metrics.metrics import REPOSITORY_BATCH_SIZE, REPOSITORY_WRITE_LATENCY
+
+logger = logging.getLogger(__name__)
+
+# Check rows, as stored in the log:
+# (id, site_id, alias, status, error, time, ssl_term, ts, dns_ms, connect_ms, tls_ms, ttfb_ms, transfer_ms)
+ID, SITE, ALIAS, STATUS, ERROR, TIME, SSL, TS = range(8)
+
+# Bits of a check's flags in the index
+FAILED, ERRORED = 1, 2
+
+
+def _failed(row: tuple) -> bool:
+    return row[ERROR] is not None or (row[STATUS] or 0) >= 400
+
+
+def _encode(row: tuple) -> bytes:
+    return json.dumps(row, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+
+
+def _write_file(path: str, data: bytes, mode: str = "wb") -> None:
+    with open(path, mode) as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def _append(file: BinaryIO, data: bytes) -> None:
+    file.write(data)
+    file.flush()
+    os.fsync(file.fileno())
+
+
+def _scan_log(path: str, visit: Callable[[tuple, int], None]) -> Tuple[int, int]:
+    """
+    Stream the log, calling `visit(row, offset)` per record; returns (size,
+    skipped). A torn last line from a crash mid-append is cut off so new
+    appends start on a clean line.
+    """
+    skipped, offset = 0, 0
+    try:
+        with open(path, "rb") as file:
+            for line in file:
+                if not line.endswith(b"\n"):
+                    logger.warning(f"Dropping torn record at the end of {path}")
+                    break
+                try:
+                    row = tuple(json.loads(line))
+                except ValueError:
+                    skipped += 1
+                else:
+                    visit(row, offset)
+                offset += len(line)
+    except FileNotFoundError:
+        return 0, 0
+    if offset != os.path.getsize(path):
+        os.truncate(path, offset)
+    return offset, skipped
+
+
+def _read_rows(path: str, offsets: Iterable[int]) -> Dict[int, tuple]:
+    """Records at the given log offsets, read in file order"""
+    rows = {}
+    with open(path, "rb") as file:
+        for offset in sorted(offsets):
+            file.seek(offset)
+            rows[offset] = tuple(json.loads(file.readline()))
+    return rows
+
+
+def _copy_live(source: str, target: str, log_ids: array, log_offsets: array,
+               live: array) -> Tuple[array, array, int]:
+    """
+    Stream `source` into `target`, keeping the records whose id is in the
+    sorted `live`; returns the new log's ids, offsets and size.
+    """
+    ids, offsets = array("q"), array("q")
+    known = iter(zip(log_ids, log_offsets))
+    check_id, start = next(known, (None, None))
+    offset = size = found = 0
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        for line in src:
+            if start is None:
+                break
+            if offset == start:
+                found = bisect.bisect_left(live, check_id, found)
+                if found < len(live) and live[found] == check_id:
+                    dst.write(line)
+                    ids.append(check_id)
+                    offsets.append(size)
+                    size += len(line)
+                check_id, start = next(known, (None, None))
+            offset += len(line)
+        dst.flush()
+        os.fsync(dst.fileno())
+    return ids, offsets, size
+
+
+class _SiteChecks:
+    """
+    Index of one site's checks in (ts, id) order: the columns history,
+    rollups and paging need, not the rows themselves.
+    """
+
+    __slots__ = ("ts", "ids", "times", "flags")
+
+    def __init__(self):
+        self.ts, self.ids, self.times = array("q"), array("q"), array("q")
+        self.flags = array("b")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def position(self, key: Tuple[int, int], right: bool = False) -> int:
+        find = bisect.bisect_right if right else bisect.bisect_left
+        return find(range(len(self.ids)), tuple(key), key=lambda i: (self.ts[i], self.ids[i]))
+
+    def span(self, since: Optional[int], until: Optional[int]) -> Tuple[int, int]:
+        start = bisect.bisect_left(self.ts, since) if since is not None else 0
+        end = bisect.bisect_left(self.ts, until) if until is not None else len(self.ts)
+        return start, end
+
+    def contains(self, ts: int, check_id: int) -> bool:
+        at = self.position((ts, check_id))
+        return at < len(self.ids) and self.ts[at] == ts and self.ids[at] == check_id
+
+    def add(self, row: tuple) -> None:
+        key = (row[TS], row[ID])
+        at = len(self.ids)
+        if at and key < (self.ts[-1], self.ids[-1]):
+            at = self.position(key)
+        flags = FAILED * _failed(row) | ERRORED * (row[ERROR] is not None)
+        for column, value in ((self.ts, row[TS]), (self.ids, row[ID]),
+                              (self.times, int(row[TIME] or 0)), (self.flags, flags)):
+            column.insert(at, value)
+
+    def drop(self, end: int) -> None:
+        """Forget the first `end` checks"""
+        for column in (self.ts, self.ids, self.times, self.flags):
+            del column[:end]
+
+
+class JsonRepository(RepositorySystem):
+    """
+    JSON-file implementation for small deployments.
+
+    Sites and all other small state live in a JSON snapshot at `path`; checks
+    go to an append-only JSON-lines log next to it. Memory holds a compact
+    index per site plus its `recent_rows` newest rows; older rows are read
+    back from the log by offset. The index is rebuilt by streaming the log
+    at init(). Appends are buffered and written with one fsync per batch.
+
+    Rollups and deletions only mark what they dropped in the snapshot; the
+    log is rewritten by compaction alone, once dead records outnumber live
+    ones. Compaction writes the live checks to the next generation's log and
+    then commits by replacing the snapshot, so a crash at any point leaves
+    one consistent pair.
+    """
+
+    def __init__(self, batch_size: int = 500, flush_interval: float = 1.0,
+                 snapshot_delay: float = 0.5, compact_interval: float = 600,
+                 compact_min: int = 10000, recent_rows: int = 100):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.snapshot_delay = snapshot_delay
+        self.compact_interval = compact_interval
+        self.compact_min = compact_min
+        self.recent_rows = recent_rows
+
+        self.path: Optional[str] = None
+        self._root: Optional[str] = None
+        self._log: Optional[BinaryIO] = None
+        self._generation = 0
+        self._next_site_id = 1
+        self._next_check_id = 1
+
+        # id -> [id, url, alias, provider, critical]
+        self._sites: Dict[int, list] = {}
+        self._site_ids: List[int] = []
+        self._by_alias: Dict[str, int] = {}
+        self._by_url: Dict[str, int] = {}
+        self._content: Dict[int, list] = {}
+        self._assertions: Dict[int, list] = {}
+        self._last_check: Dict[int, tuple] = {}
+        self._hourly: Dict[int, Dict[int, list]] = {}
+        self._subscribers: Dict[int, list] = {}
+        self._budgets: Dict[Tuple[str, str], list] = {}
+
+        # Per site (None for unknown aliases): the check index, and the newest rows by id
+        self._checks: Dict[Optional[int], _SiteChecks] = {}
+        self._recent: Dict[Optional[int], Dict[int, tuple]] = {}
+        # Id and offset of every record in the current log, in id order
+        self._log_ids, self._log_offsets = array("q"), array("q")
+        self._log_size = 0
+        # (cutoff, last id) per rollup or deletion since the last compaction:
+        # records up to that id and older than the cutoff are no longer live
+        self._rolled: List[Tuple[int, int]] = []
+        # Records still in the log but no longer live, reclaimed by compaction
+        self._dead = 0
+
+        self._pending: List[tuple] = []
+        self._flush_lock = asyncio.Lock()
+        self._flush_timer: Optional[asyncio.Task] = None
+        self._snapshot_lock = asyncio.Lock()
+        self._snapshot_timer: Optional[asyncio.Task] = None
+        self._compact_task: Optional[asyncio.Task] = None
+
+    def _log_path(self, generation: int) -> str:
+        return f"{self._root}.checks.{generation}.jsonl"
+
+    @override
+    async def init(self, path) -> None:
+        self.path = path
+        self._root = os.path.splitext(path)[0]
+        try:
+            with open(path, encoding="utf-8") as file:
+                snapshot = json.load(file)
+        except FileNotFoundError:
+            snapshot = None
+        except json.JSONDecodeError:
+            raise Exception(f"Invalid JSON in {path}")
+
+        if snapshot is not None:
+            self._restore(snapshot)
+        self._log_size, skipped = await asyncio.to_thread(
+            _scan_log, self._log_path(self._generation), self._load_check
+        )
+        self._dead += skipped
+        if self._log_ids:
+            self._next_check_id = max(self._next_check_id, self._log_ids[-1] + 1)
+
+        for stale in glob.glob(f"{glob.escape(self._root)}.checks.*.jsonl"):
+            if stale != self._log_path(self._generation):
+                os.remove(stale)
+        if snapshot is None:
+            await self._save()
+        self._log = open(self._log_path(self._generation), "ab")
+        self._compact_task = asyncio.create_task(self._compact_periodically())
+
+    def _load_check(self, row: tuple, offset: int) -> None:
+        self._log_ids.append(row[ID])
+        self._log_offsets.append(offset)
+        if self._dropped(row):
+            self._dead += 1
+        else:
+            self._index_check(row)
+
+    def _dropped(self, row: tuple) -> bool:
+        if row[SITE] is not None and row[SITE] not in self._sites:
+            # Checks of a deleted site
+            return True
+        return any(row[TS] < cutoff and row[ID] <= last for cutoff, last in self._rolled)
+
+    def _restore(self, snapshot: Dict[str, Any]) -> None:
+        self._generation = snapshot["generation"]
+        self._next_site_id = snapshot["next_site_id"]
+        self._next_check_id = snapshot["next_check_id"]
+        for site in snapshot["sites"]:
+            self._index_site(site)
+        self._content = {site_id: state for site_id, *state in snapshot["content_state"]}
+        self._assertions = {site_id: spec for site_id, *spec in snapshot["assertions"]}
+        self._last_check = {site_id: tuple(check) for site_id, *check in snapshot["last_check"]}
+        for site_id, hour, *aggregate in snapshot["hourly"]:
+            # [count, failures, p50, p95, errors]; snapshots older than the
+            # errors count have four fields
+            self._hourly.setdefault(site_id, {})[hour] = aggregate + [0] * (5 - len(aggregate))
+        self._subscribers = {chat_id: [tz, digest_time]
+                             for chat_id, tz, digest_time in snapshot["subscribers"]}
+        self._budgets = {(provider, month): [used, credit_limit]
+                         for provider, month, used, credit_limit in snapshot["provider_budget"]}
+        self._rolled = [(cutoff, last) for cutoff, last in snapshot.get("rolled", [])]
+
+    def _snapshot(self, generation: Optional[int] = None,
+                  rolled: Optional[List[Tuple[int, int]]] = None) -> Dict[str, Any]:
+        return {
+            "generation": self._generation if generation is None else generation,
+            "next_site_id": self._next_site_id,
+            "next_check_id": self._next_check_id,
+            "sites": [self._sites[site_id] for site_id in self._site_ids],
+            "content_state": [[site_id, *state] for site_id, state in self._content.items()],
+            "assertions": [[site_id, *spec] for site_id, spec in self._assertions.items()],
+            "last_check": [[site_id, *check] for site_id, check in self._last_check.items()],
+            "hourly": [[site_id, hour, *aggregate] for site_id, hours in self._hourly.items()
+                       for hour, aggregate in sorted(hours.items())],
+            "subscribers": [[chat_id, *settings] for chat_id, settings in self._subscribers.items()],
+            "provider_budget": [[*key, *budget] for key, budget in self._budgets.items()],
+            "rolled": [list(mark) for mark in (self._rolled if rolled is None else rolled)],
+        }
+
+    async def _save(self) -> None:
+        """Atomically replace the snapshot with the current state"""
+        async with self._snapshot_lock:
+            await self._write_snapshot()
+
+    async def _write_snapshot(self, **overrides) -> None:
+        # Serialized on the loop so no mutation can interleave with the copy
+        data = json.dumps(self._snapshot(**overrides), ensure_ascii=False).encode()
+        tmp_path = f"{self.path}.tmp"
+        await asyncio.to_thread(_write_file, tmp_path, data)
+        await asyncio.to_thread(os.replace, tmp_path, self.path)
+
+    def _save_soon(self) -> None:
+        if self._snapshot_timer is None:
+            self._snapshot_timer = asyncio.create_task(self._save_later())
+
+    async def _save_later(self) -> None:
+        await asyncio.sleep(self.snapshot_delay)
+        self._snapshot_timer = None
+        await self._save()
+
+    def _index_site(self, site: list) -> None:
+        site_id, url, alias = site[0], site[1], site[2]
+        self._sites[site_id] = site
+        bisect.insort(self._site_ids, site_id)
+        self._by_alias[alias] = site_id
+        self._by_url[url] = site_id
+
+    def _index_check(self, row: tuple) -> None:
+        site_id = row[SITE]
+        checks = self._checks.get(site_id)
+        if checks is None:
+            checks = self._checks[site_id] = _SiteChecks()
+        checks.add(row)
+        recent = self._recent.setdefault(site_id, {})
+        recent[row[ID]] = row
+        if len(recent) > self.recent_rows:
+            del recent[next(iter(recent))]
+
+        if site_id is not None:
+            last = self._last_check.get(site_id)
+            if last is None or last[-1] is None or row[TS] >= last[-1]:
+                self._last_check[site_id] = (row[ID], row[STATUS], row[ERROR], row[TIME], row[TS])
+
+    def _pending_row(self, check_id: int) -> Optional[tuple]:
+        pending = self._pending
+        at = bisect.bisect_left(pending, check_id, key=lambda row: row[ID])
+        return pending[at] if at < len(pending) and pending[at][ID] == check_id else None
+
+    async def _rows(self, site_id: Optional[int], ids: Iterable[int]) -> List[tuple]:
+        """Rows of a site by id: recent and unflushed ones from memory, the rest from the log"""
+        recent = self._recent.get(site_id, {})
+        rows, missing = {}, {}
+        for check_id in ids:
+            row = recent.get(check_id) or self._pending_row(check_id)
+            if row is None:
+                missing[check_id] = self._log_offsets[bisect.bisect_left(self._log_ids, check_id)]
+            rows[check_id] = row
+        if missing:
+            found = await asyncio.to_thread(_read_rows, self._log_path(self._generation),
+                                            missing.values())
+            for check_id, offset in missing.items():
+                rows[check_id] = found[offset]
+        return list(rows.values())
+
+    @override
+    async def add_site(self, url: str, alias: str, provider: Optional[str] = None,
+                       critical: bool = False) -> None:
+        if alias == None: alias = ""
+        if alias in self._by_alias or url in self._by_url:
+            raise ValueError(f"Site already exists: {url} ({alias})")
+        self._index_site([self._next_site_id, url, alias, provider, bool(critical)])
+        self._next_site_id += 1
+        await self._save()
+
+    @override
+    async def upsert_sites(self, sites: Iterable[Tuple[str, str, Optional[str], bool]]) -> int:
+        written = 0
+        for url, alias, provider, critical in sites:
+            owner = self._by_url.get(url)
+            site_id = self._by_alias.get(alias)
+            if owner is not None and owner != site_id:
+                continue
+            if site_id is None:
+                self._index_site([self._next_site_id, url, alias, provider, bool(critical)])
+                self._next_site_id += 1
+            else:
+                site = self._sites[site_id]
+                del self._by_url[site[1]]
+                site[1], site[3], site[4] = url, provider, bool(critical)
+                self._by_url[url] = site_id
+            written += 1
+        if written:
+            await self._save()
+        return written
+
+    @override
+    async def add_check(self, alias: str, status: int,
+                      error: Optional[str], time: int, ssl_term: bool,
+                      ts: Optional[int] = None, dns_ms: Optional[int] = None,
+                      connect_ms: Optional[int] = None, tls_ms: Optional[int] = None,
+                      ttfb_ms: Optional[int] = None, transfer_ms: Optional[int] = None) -> None:
+        self._append_check(alias, status, error, time, ssl_term, ts,
+                           dns_ms, connect_ms, tls_ms, ttfb_ms, transfer_ms)
+        await self._schedule_flush()
+
+    @override
+    async def add_checks_bulk(self, checks: Iterable[Tuple]) -> None:
+        for check in checks:
+            self._append_check(*check)
+        await self._schedule_flush()
+
+    def _append_check(self, alias: str, status: int, error: Optional[str], time: int,
+                      ssl_term: bool, ts: Optional[int] = None, dns_ms: Optional[int] = None,
+                      connect_ms: Optional[int] = None, tls_ms: Optional[int] = None,
+                      ttfb_ms: Optional[int] = None, transfer_ms: Optional[int] = None) -> None:
+        row = (self._next_check_id, self._by_alias.get(alias), alias, status, error, time,
+               ssl_term, int(_time.time()) if ts is None else ts,
+               dns_ms, connect_ms, tls_ms, ttfb_ms, transfer_ms)
+        self._next_check_id += 1
+        # Readable at once; only durability waits for the flush
+        self._index_check(row)
+        self._pending.append(row)
+
+    async def _schedule_flush(self) -> None:
+        # A compaction holds the lock for its whole copy: the batch then
+        # waits for the timer rather than stalling the caller
+        if len(self._pending) >= self.batch_size and not self._flush_lock.locked():
+            await self.flush()
+        elif self._flush_timer is None:
+            self._flush_timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        self._flush_timer = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Append buffered checks to the log with a single fsync"""
+        async with self._flush_lock:
+            await self._flush()
+
+    async def _flush(self) -> None:
+        if not self._pending:
+            return
+        rows = self._pending[:]
+        lines = [_encode(row) for row in rows]
+        started = _time.perf_counter()
+        try:
+            await asyncio.to_thread(_append, self._log, b"".join(lines))
+        except Exception:
+            # Cut off a partial append so the recorded offsets stay true
+            with contextlib.suppress(OSError):
+                self._log.close()
+            path = self._log_path(self._generation)
+            os.truncate(path, self._log_size)
+            self._log = open(path, "ab")
+            raise
+        for row, line in zip(rows, lines):
+            self._log_ids.append(row[ID])
+            self._log_offsets.append(self._log_size)
+            self._log_size += len(line)
+        # Rows stay pending until their offsets are known, so reads never miss them
+        del self._pending[:len(rows)]
+        REPOSITORY_WRITE_LATENCY.observe(_time.perf_counter() - started)
+        REPOSITORY_BATCH_SIZE.observe(len(rows))
+
+    def _drop_checks(self, site_id: Optional[int]) -> int:
+        self._recent.pop(site_id, None)
+        checks = self._checks.pop(site_id, None)
+        return len(checks) if checks is not None else 0
+
+    @override
+    async def delete_site(self, url: str) -> None:
+        site_id = self._by_url.pop(url, None)
+        if site_id is None:
+            return
+        site = self._sites.pop(site_id)
+        del self._by_alias[site[2]]
+        self._site_ids.remove(site_id)
+        for table in (self._content, self._assertions, self._last_check, self._hourly):
+            table.pop(site_id, None)
+        self._dead += self._drop_checks(site_id)
+        await self._save()
+
+    @override
+    async def delete_checks(self) -> None:
+        for site_id in list(self._checks):
+            self._dead += self._drop_checks(site_id)
+        self._last_check.clear()
+        self._rolled.append((sys.maxsize, self._next_check_id - 1))
+        await self._save()
+
+    @override
+    async def get_url(self, alias: str) -> Optional[str]:
+        site_id = self._by_alias.get(alias)
+        return self._sites[site_id][1] if site_id is not None else None
+
+    @override
+    async def get_check(self, check_id: int) -> Optional[Tuple]:
+        row = self._pending_row(check_id)
+        if row is None:
+            at = bisect.bisect_left(self._log_ids, check_id)
+            if at == len(self._log_ids) or self._log_ids[at] != check_id:
+                return None
+            offset = self._log_offsets[at]
+            row = (await asyncio.to_thread(_read_rows, self._log_path(self._generation), [offset]))[offset]
+        checks = self._checks.get(row[SITE])
+        if checks is None or not checks.contains(row[TS], row[ID]):
+            return None
+        return row[ALIAS:SSL + 1]
+
+    @override
+    async def set_site(self, alias: str, new_url: str) -> None:
+        site_id = self._by_alias.get(alias)
+        if site_id is None:
+            return
+        if self._by_url.get(new_url, site_id) != site_id:
+            raise ValueError(f"URL already monitored: {new_url}")
+        site = self._sites[site_id]
+        del self._by_url[site[1]]
+        site[1] = new_url
+        self._by_url[new_url] = site_id
+        await self._save()
+
+    @override
+    async def get_all_sites(self) -> List[Tuple[str, str, Optional[str], bool]]:
+        return [tuple(self._sites[site_id][1:]) for site_id in self._site_ids]
+
+    @override
+    async def get_sites_page(self, after_id: int = 0, limit: int = 20,
+                             before_id: Optional[int] = None) -> List[Tuple]:
+        if before_id is not None:
+            end = bisect.bisect_left(self._site_ids, before_id)
+            site_ids = self._site_ids[max(0, end - limit):end]
+        else:
+            start = bisect.bisect_right(self._site_ids, after_id)
+            site_ids = self._site_ids[start:start + limit]
+        return [(*self._sites[site_id], *self._last_check.get(site_id, (None,) * 5)[1:])
+                for site_id in site_ids]
+
+    def _site_checks(self, alias: str) -> Tuple[Optional[int], _SiteChecks]:
+        site_id = self._by_alias.get(alias)
+        checks = self._checks.get(site_id) if site_id is not None else None
+        return site_id, checks if checks is not None else _SiteChecks()
+
+    @override
+    async def get_checks_page(self, alias: str, before: Optional[Tuple[int, int]] = None,
+                              limit: int = 20, after: Optional[Tuple[int, int]] = None) -> List[Tuple]:
+        site_id, checks = self._site_checks(alias)
+        if after is not None:
+            start = checks.position(after, right=True)
+            end = min(start + limit, len(checks))
+        else:
+            end = checks.position(before) if before is not None else len(checks)
+            start = max(0, end - limit)
+        rows = await self._rows(site_id, checks.ids[start:end])
+        return [(row[ID], *row[STATUS:TS + 1]) for row in reversed(rows)]
+
+    @override
+    async def get_all_checks(self, alias: str) -> List[Tuple]:
+        site_id, checks = self._site_checks(alias)
+        return [(row[ID], *row[STATUS:SSL + 1]) for row in await self._rows(site_id, checks.ids)]
+
+    @override
+    async def get_checks(self, alias: str, since: int,
+                         until: Optional[int] = None) -> List[Tuple]:
+        site_id, checks = self._site_checks(alias)
+        start, end = checks.span(since, until)
+        return [(row[ID], *row[STATUS:]) for row in await self._rows(site_id, checks.ids[start:end])]
+
+    @override
+    async def get_check_history(self, since: int, until: Optional[int] = None, timestamps: bool = True
+                                ) -> Tuple[Dict[int, str], Dict[str, Any], Dict[str, Any]]:
+        # Imported here so startup doesn't pay for NumPy until a report is built
+        import numpy as np
+
+        aliases = {site_id: site[2] for site_id, site in self._sites.items()}
+        spans = [(site_id, checks, start, end) for site_id, checks in self._checks.items()
+                 if site_id is not None for start, end in [checks.span(since, until)] if start < end]
+
+        def column(name: str, dtype) -> np.ndarray:
+            # Straight off the index arrays, no row is read
+            parts = [np.frombuffer(getattr(checks, name)[start:end], dtype=dtype)
+                     for _, checks, start, end in spans]
+            return np.concatenate([np.empty(0, dtype), *parts]).astype(np.int64)
+
+        flags = column('flags', np.int8)
+        columns = {
+            'site_id': np.repeat(np.array([site_id for site_id, *_ in spans], dtype=np.int64),
+                                 [end - start for _, _, start, end in spans]),
+            'ts': column('ts', np.int64),
+            'time': column('times', np.int64),
+            'failed': flags & FAILED,
+            'errored': (flags & ERRORED) >> 1,
+        }
+        if not timestamps:
+            del columns['ts']
+        hours = np.array([(site_id, hour, count, failures, errors, p50 or 0, p95 or 0)
+                          for site_id, aggregates in self._hourly.items()
+                          for hour, (count, failures, p50, p95, errors) in aggregates.items()
+                          if hour >= since and (until is None or hour < until)],
+                         dtype=np.int64).reshape(-1, 7)
+        hourly = dict(zip(('site_id', 'hour', 'count', 'failures', 'errors', 'p50', 'p95'), hours.T))
+        return aliases, columns, hourly
+
+    @override
+    async def get_hourly_checks(self, alias: str, since: int,
+                                until: Optional[int] = None) -> List[Tuple]:
+        hours = self._hourly.get(self._by_alias.get(alias), {})
+        return [(hour, *hours[hour][:4]) for hour in sorted(hours)
+                if hour >= since and (until is None or hour < until)]
+
+    @override
+    async def rollup_checks(self, older_than_days: int, chunk_size: int = 5000) -> int:
+        """
+        Aggregate raw checks older than the cutoff into hourly rows and drop them.
+
+        Runs on the index alone. The snapshot commits the aggregates with a
+        mark that retires the rolled records; the log keeps them until the
+        next compaction.
+        """
+        cutoff = (int(_time.time()) - older_than_days * 86400) // 3600 * 3600
+        ends = {site_id: bisect.bisect_left(checks.ts, cutoff) for site_id, checks in self._checks.items()}
+        if not any(ends.values()):
+            return 0
+
+        rolled = 0
+        for site_id, end in ends.items():
+            if not end:
+                continue
+            checks = self._checks[site_id]
+            recent = self._recent.get(site_id, {})
+            for check_id in checks.ids[:end]:
+                recent.pop(check_id, None)
+            rolled += end
+            if site_id is None:
+                checks.drop(end)
+                continue
+
+            hours = {}
+            for ts, time, flags in zip(checks.ts[:end], checks.times[:end], checks.flags[:end]):
+                bucket = hours.setdefault(ts // 3600 * 3600, [[], 0, 0])
+                bucket[0].append(time)
+                bucket[1] += bool(flags & FAILED)
+                bucket[2] += bool(flags & ERRORED)
+            checks.drop(end)
+
+            aggregates = self._hourly.setdefault(site_id, {})
+            for hour, (times, failures, errors) in hours.items():
+                times.sort()
+                count, p50, p95 = len(times), percentile(times, 0.5), percentile(times, 0.95)
+                previous = aggregates.get(hour)
+                if previous is not None:
+                    # Late rows for an hour already rolled up: weight by count
+                    total = previous[0] + count
+                    p50 = (previous[2] * previous[0] + p50 * count) // total
+                    p95 = (previous[3] * previous[0] + p95 * count) // total
+                    count, failures, errors = total, previous[1] + failures, previous[4] + errors
+                aggregates[hour] = [count, failures, p50, p95, errors]
+
+        self._rolled.append((cutoff, self._next_check_id - 1))
+        self._dead += rolled
+        await self._save()
+        return rolled
+
+    async def compact(self) -> None:
+        """
+        Rewrite the log with live checks only under the next generation.
+        Flushes wait for it; checks added meanwhile stay buffered.
+        """
+        async with self._snapshot_lock, self._flush_lock:
+            await self._flush()
+            live = array("q", sorted(check_id for checks in self._checks.values()
+                                     for check_id in checks.ids))
+            rolled, dead = len(self._rolled), self._dead
+
+            generation = self._generation + 1
+            path = self._log_path(generation)
+            try:
+                ids, offsets, size = await asyncio.to_thread(
+                    _copy_live, self._log_path(self._generation), path, self._log_ids, self._log_offsets, live
+                )
+                # Marks made during the copy still apply to the new log
+                await self._write_snapshot(generation=generation, rolled=self._rolled[rolled:])
+            except Exception:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+                raise
+            finally:
+                del live
+
+            # Swapped in one step, so a read sees one log with its own offsets
+            self._generation = generation
+            self._log_ids, self._log_offsets, self._log_size = ids, offsets, size
+            del self._rolled[:rolled]
+            self._dead -= dead
+            old, self._log = self._log, open(path, "ab")
+            old.close()
+            # The previous log is kept for reads still under way
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._log_path(generation - 2))
+
+    async def _compact_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.compact_interval)
+            live = sum(len(checks) for checks in self._checks.values())
+            if self._dead < max(self.compact_min, live):
+                continue
+            try:
+                await self.compact()
+            except Exception:
+                logger.exception(f"Compaction of {self.path} failed")
+
+    @override
+    async def watch_content(self, alias: str) -> None:
+        site_id = self._by_alias.get(alias)
+        if site_id is not None and site_id not in self._content:
+            self._content[site_id] = [None, None, None]
+            self._save_soon()
+
+    @override
+    async def get_content_states(self) -> List[Tuple]:
+        return [(self._sites[site_id][2], *state) for site_id, state in self._content.items()]
+
+    @override
+    async def set_content_state(self, alias: str, etag: Optional[str],
+                                last_modified: Optional[str], content_hash: Optional[str]) -> None:
+        state = self._content.get(self._by_alias.get(alias))
+        if state is not None:
+            state[:] = [etag, last_modified, content_hash]
+            self._save_soon()
+
+    @override
+    async def get_assertions(self) -> List[Tuple]:
+        return [(self._sites[site_id][2], *spec) for site_id, spec in self._assertions.items()]
+
+    @override
+    async def set_assertions(self, alias: str, contains: Optional[str], absent: Optional[str],
+                             selector: Optional[str], max_size: Optional[int]) -> None:
+        site_id = self._by_alias.get(alias)
+        if site_id is None:
+            return
+        if contains is None and absent is None and selector is None and max_size is None:
+            self._assertions.pop(site_id, None)
+        else:
+            self._assertions[site_id] = [contains, absent, selector, max_size]
+        self._save_soon()
+
+    @override
+    async def add_subscriber(self, chat_id: int) -> None:
+        if chat_id not in self._subscribers:
+            self._subscribers[chat_id] = [None, None]
+            self._save_soon()
+
+    @override
+    async def delete_subscriber(self, chat_id: int) -> None:
+        if self._subscribers.pop(chat_id, None) is not None:
+            self._save_soon()
+
+    @override
+    async def get_subscribers(self) -> List[int]:
+        return list(self._subscribers)
+
+    @override
+    async def get_digest_settings(self) -> List[Tuple[int, Optional[str], Optional[str]]]:
+        return [(chat_id, tz, digest_time) for chat_id, (tz, digest_time) in self._subscribers.items()]
+
+    @override
+    async def set_digest_settings(self, chat_id: int, tz: Optional[str],
+                                  digest_time: Optional[str]) -> bool:
+        if chat_id not in self._subscribers:
+            return False
+        self._subscribers[chat_id] = [tz, digest_time]
+        self._save_soon()
+        return True
+
+    @override
+    async def get_provider_budgets(self) -> List[Tuple[str, str, int, Optional[int]]]:
+        return [(*key, *budget) for key, budget in self._budgets.items()]
+
+    @override
+    async def set_provider_budget(self, provider: str, month: str, used: int,
+                                  credit_limit: Optional[int]) -> None:
+        self._budgets[(provider, month)] = [used, credit_limit]
+        self._save_soon()
+
+    @override
+    async def close(self) -> None:
+        # Holding the snapshot lock waits out a running compaction
+        async with self._snapshot_lock:
+            for task in (self._flush_timer, self._snapshot_timer, self._compact_task):
+                if task is not None:
+                    task.cancel()
+            self._flush_timer = self._snapshot_timer = self._compact_task = None
+            await self.flush()
+            await self._write_snapshot()
+        self._log.close()
@@ -1,17 +1,23 @@
 from abc import ABC, abstractmethod
-from typing import List, Tuple, Optional
+from typing import Any, AsyncIterator, List, Tuple, Optional, Iterable, Dict
 import importlib
+import math
+
+def percentile(values: List[int], q: float) -> int:
+    """Nearest-rank percentile of an already sorted list"""
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
 
 class RepositoryFactory:
     REGISTRY = {
         "db": "repository.sqlite_repository.SqliteRepository",
-        "json": "repository.json_repository.Json"
+        "json": "repository.json_repository.JsonRepository"
     }
 
     def __init__(self):
         self.repository: RepositorySystem = None
 
-    async def create_repository(self, repo_path: str = None):
+    async def create_repository(self, repo_path: str = None, cached: bool = False):
         repo_ext = repo_path.split(".")[-1].lower()
 
         if repo_ext not in self.REGISTRY:
@@ -22,6 +28,9 @@ class RepositoryFactory:
         repository_class = getattr(module, class_name)
 
         self.repository = repository_class()
+        if cached:
+            from .cached_repository import CachedRepository
+            self.repository = CachedRepository(self.repository)
         await self.repository.init(repo_path)
 
     def get_repository(self) -> 'RepositorySystem':
@@ -37,16 +46,39 @@ class RepositorySystem(ABC):
         pass
 
     @abstractmethod
-    async def add_site(self, url: str, alias: str) -> None:
-        """Add a new site to monitor"""
+    async def add_site(self, url: str, alias: str, provider: Optional[str] = None,
+                       critical: bool = False) -> None:
+        """Add a new site to monitor; provider None means the default provider"""
         pass
 
     @abstractmethod
     async def add_check(self, alias: str, status: int, 
-                      error: Optional[str], time: int, ssl_warn: bool) -> None:
-        """Add a new check result"""
+                      error: Optional[str], time: int, ssl_warn: bool,
+                      ts: Optional[int] = None, dns_ms: Optional[int] = None,
+                      connect_ms: Optional[int] = None, tls_ms: Optional[int] = None,
+                      ttfb_ms: Optional[int] = None, transfer_ms: Optional[int] = None) -> None:
+        """Add a new check result; ts defaults to the current unix time"""
+        pass
+
+    async def add_checks_bulk(self, checks: Iterable[Tuple]) -> None:
+        """Add several check results, each in add_check() argument order"""
+        for check in checks:
+            await self.add_check(*check)
+
+    @abstractmethod
+    async def upsert_sites(self, sites: Iterable[Tuple[str, str, Optional[str], bool]]) -> int:
+        """
+        Insert (url, alias, provider, critical) rows in one transaction,
+        updating sites with the same alias and skipping rows whose URL is
+        taken by another alias; return the number of rows written
+        """
         pass
 
+    async def iter_sites(self, batch_size: int = 500) -> AsyncIterator[Tuple[str, str, Optional[str], bool]]:
+        """Stream (url, alias, provider, critical) for every site"""
+        for site in await self.get_all_sites():
+            yield site
+
     @abstractmethod
     async def delete_site(self, url: str) -> None:
         """Delete a site"""
@@ -73,8 +105,29 @@ class RepositorySystem(ABC):
         pass
 
     @abstractmethod
-    async def get_all_sites(self) -> List[Tuple[str, str]]:
-        """Get all sites"""
+    async def get_all_sites(self) -> List[Tuple[str, str, Optional[str], bool]]:
+        """Get all sites as (url, alias, provider, critical)"""
+        pass
+
+    @abstractmethod
+    async def get_sites_page(self, after_id: int = 0, limit: int = 20,
+                             before_id: Optional[int] = None) -> List[Tuple]:
+        """
+        Get up to `limit` sites with id > after_id (or the last ones with
+        id < before_id), ordered by id, as (id, url, alias, provider,
+        critical, status, error, time, ts) with the site's latest check
+        fields, None if it was never checked
+        """
+        pass
+
+    @abstractmethod
+    async def get_checks_page(self, alias: str, before: Optional[Tuple[int, int]] = None,
+                              limit: int = 20, after: Optional[Tuple[int, int]] = None) -> List[Tuple]:
+        """
+        Get up to `limit` checks of a site, newest first, older than the
+        (ts, id) key `before` or the closest ones newer than `after`, as
+        (id, status, error, time, ssl_term, ts)
+        """
         pass
 
     @abstractmethod
@@ -82,6 +135,99 @@ class RepositorySystem(ABC):
         """Get all checks for a site"""
         pass
 
+    @abstractmethod
+    async def get_checks(self, alias: str, since: int,
+                         until: Optional[int] = None) -> List[Tuple]:
+        """Get checks with phase timings for a site with since <= ts < until, ordered by ts"""
+        pass
+
+    @abstractmethod
+    async def get_check_history(self, since: int, until: Optional[int] = None, timestamps: bool = True
+                                ) -> Tuple[Dict[int, str], Dict[str, Any], Dict[str, Any]]:
+        """
+        Get checks of all sites in one columnar pass as ({site_id: alias},
+        raw checks, rolled-up hours), both as dicts of NumPy int64 arrays:
+        'site_id', 'ts' (unless not `timestamps`), 'time', 'failed', 'errored'
+        for checks and 'site_id', 'hour', 'count', 'failures', 'errors', 'p50',
+        'p95' for hours
+        """
+        pass
+
+    @abstractmethod
+    async def get_hourly_checks(self, alias: str, since: int,
+                                until: Optional[int] = None) -> List[Tuple]:
+        """Get rolled-up hourly aggregates (hour, count, failures, p50, p95) for a site"""
+        pass
+
+    @abstractmethod
+    async def rollup_checks(self, older_than_days: int, chunk_size: int = 5000) -> int:
+        """Roll raw checks older than N days into hourly aggregates, return rows rolled"""
+        pass
+
+    @abstractmethod
+    async def watch_content(self, alias: str) -> None:
+        """Enable content-change monitoring for a site"""
+        pass
+
+    @abstractmethod
+    async def get_content_states(self) -> List[Tuple]:
+        """Get (alias, etag, last_modified, content_hash) for every content-watched site"""
+        pass
+
+    @abstractmethod
+    async def set_content_state(self, alias: str, etag: Optional[str],
+                                last_modified: Optional[str], content_hash: Optional[str]) -> None:
+        """Store the validators and body hash of the last fetch"""
+        pass
+
+    @abstractmethod
+    async def get_assertions(self) -> List[Tuple]:
+        """Get (alias, contains, absent, selector, max_size) for every site with assertions"""
+        pass
+
+    @abstractmethod
+    async def set_assertions(self, alias: str, contains: Optional[str], absent: Optional[str],
+                             selector: Optional[str], max_size: Optional[int]) -> None:
+        """Store a site's content assertions; all None removes them"""
+        pass
+
+    @abstractmethod
+    async def add_subscriber(self, chat_id: int) -> None:
+        """Subscribe a chat to alerts"""
+        pass
+
+    @abstractmethod
+    async def delete_subscriber(self, chat_id: int) -> None:
+        """Unsubscribe a chat from alerts"""
+        pass
+
+    @abstractmethod
+    async def get_subscribers(self) -> List[int]:
+        """Get chat ids of all subscribers"""
+        pass
+
+    @abstractmethod
+    async def get_digest_settings(self) -> List[Tuple[int, Optional[str], Optional[str]]]:
+        """Get (chat_id, tz, digest_time) for every subscriber"""
+        pass
+
+    @abstractmethod
+    async def set_digest_settings(self, chat_id: int, tz: Optional[str],
+                                  digest_time: Optional[str]) -> bool:
+        """Store a subscriber's timezone and digest time; False if the chat isn't subscribed"""
+        pass
+
+    @abstractmethod
+    async def get_provider_budgets(self) -> List[Tuple[str, str, int, Optional[int]]]:
+        """Get (provider, month, used, credit_limit) for every stored budget"""
+        pass
+
+    @abstractmethod
+    async def set_provider_budget(self, provider: str, month: str, used: int,
+                                  credit_limit: Optional[int]) -> None:
+        """Store a provider's credit usage and limit for a month (YYYY-MM)"""
+        pass
+
     @abstractmethod
     async def close(self) -> None:
         """Close repository"""
@@ -1,14 +1,131 @@
+import asyncio
+from contextlib import asynccontextmanager
+import time as _time
 from aiosqlite import connect
-from typing import override, Optional, Tuple, List
-from .repository import RepositorySystem
+from typing import override, Any, AsyncIterator, Optional, Tuple, List, Iterable, Dict
+from .repository import RepositorySystem, percentile
+from metrics.metrics import REPOSITORY_BATCH_SIZE, REPOSITORY_WRITE_LATENCY
+
+FAILED = "(error IS NOT NULL OR status >= 400)"
+# Rowid range read per history query, bounding the size of each concatenated column
+HISTORY_CHUNK = 1_000_000
+
+# Schema migrations; entry N upgrades PRAGMA user_version from N to N + 1
+MIGRATIONS: List[List[str]] = [
+    [
+        "ALTER TABLE checks ADD COLUMN site_id INTEGER REFERENCES sites(id) ON DELETE CASCADE",
+        "ALTER TABLE checks ADD COLUMN ts INTEGER",
+        """UPDATE checks SET
+            site_id = (SELECT id FROM sites WHERE sites.alias = checks.alias),
+            ts = CAST(strftime('%s', 'now') AS INTEGER)""",
+        "CREATE INDEX IF NOT EXISTS idx_checks_site_ts ON checks(site_id, ts)",
+        """CREATE TABLE IF NOT EXISTS checks_hourly(
+            site_id INTEGER REFERENCES sites(id) ON DELETE CASCADE,
+            hour INTEGER,
+            count INTEGER,
+            failures INTEGER,
+            p50 INTEGER,
+            p95 INTEGER,
+            PRIMARY KEY (site_id, hour)
+        )""",
+    ],
+    [
+        "ALTER TABLE checks ADD COLUMN dns_ms INTEGER",
+        "ALTER TABLE checks ADD COLUMN connect_ms INTEGER",
+        "ALTER TABLE checks ADD COLUMN tls_ms INTEGER",
+        "ALTER TABLE checks ADD COLUMN ttfb_ms INTEGER",
+        "ALTER TABLE checks ADD COLUMN transfer_ms INTEGER",
+    ],
+    [
+        """CREATE TABLE IF NOT EXISTS content_state(
+            site_id INTEGER PRIMARY KEY REFERENCES sites(id) ON DELETE CASCADE,
+            etag TEXT,
+            last_modified TEXT,
+            content_hash TEXT
+        )""",
+    ],
+    [
+        """CREATE TABLE IF NOT EXISTS subscribers(
+            chat_id INTEGER PRIMARY KEY
+        )""",
+    ],
+    [
+        "ALTER TABLE subscribers ADD COLUMN tz TEXT",
+        "ALTER TABLE subscribers ADD COLUMN digest_time TEXT",
+    ],
+    [
+        "ALTER TABLE sites ADD COLUMN provider TEXT",
+    ],
+    [
+        "ALTER TABLE sites ADD COLUMN critical BOOLEAN NOT NULL DEFAULT 0",
+        """CREATE TABLE IF NOT EXISTS provider_budget(
+            provider TEXT,
+            month TEXT,
+            used INTEGER,
+            credit_limit INTEGER,
+            PRIMARY KEY (provider, month)
+        )""",
+    ],
+    [
+        """CREATE TABLE IF NOT EXISTS site_assertions(
+            site_id INTEGER PRIMARY KEY REFERENCES sites(id) ON DELETE CASCADE,
+            contains TEXT,
+            absent TEXT,
+            selector TEXT,
+            max_size INTEGER
+        )""",
+    ],
+    [
+        # Latest check per site, kept current by a trigger so listings never aggregate checks
+        """CREATE TABLE IF NOT EXISTS last_check(
+            site_id INTEGER PRIMARY KEY REFERENCES sites(id) ON DELETE CASCADE,
+            check_id INTEGER,
+            status INTEGER,
+            error TEXT,
+            time INTEGER,
+            ts INTEGER
+        )""",
+        """INSERT OR REPLACE INTO last_check (site_id, check_id, status, error, time, ts)
+        SELECT site_id, id, status, error, time, MAX(ts) FROM checks
+        WHERE site_id IS NOT NULL GROUP BY site_id""",
+        """CREATE TRIGGER IF NOT EXISTS checks_last_check AFTER INSERT ON checks
+        WHEN NEW.site_id IS NOT NULL
+        BEGIN
+            INSERT INTO last_check (site_id, check_id, status, error, time, ts)
+            VALUES (NEW.site_id, NEW.id, NEW.status, NEW.error, NEW.time, NEW.ts)
+            ON CONFLICT (site_id) DO UPDATE SET
+                check_id = excluded.check_id, status = excluded.status, error = excluded.error,
+                time = excluded.time, ts = excluded.ts
+            WHERE last_check.ts IS NULL OR excluded.ts >= last_check.ts;
+        END""",
+    ],
+    [
+        "ALTER TABLE checks_hourly ADD COLUMN errors INTEGER NOT NULL DEFAULT 0",
+    ],
+]
+
 
 class SqliteRepository(RepositorySystem):
     """SQLite implementation"""
 
+    def __init__(self, batch_size: int = 500, flush_interval: float = 1.0):
+        self.conn = None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: List[Tuple] = []
+        # One writer at a time on the shared connection, so a rollback never
+        # discards another coroutine's uncommitted statements
+        self._write_lock = asyncio.Lock()
+        self._flush_timer: Optional[asyncio.Task] = None
+
     @override
     async def init(self, path) -> None:
         self.conn = await connect(path)
         cursor = await self.conn.cursor()
+
+        await cursor.execute("PRAGMA journal_mode=WAL")
+        await cursor.execute("PRAGMA synchronous=NORMAL")
+        await cursor.execute("PRAGMA foreign_keys=ON")
         
         await cursor.execute("""
             CREATE TABLE IF NOT EXISTS sites(
@@ -30,40 +147,140 @@ class SqliteRepository(RepositorySystem):
         """)
         
         await self.conn.commit()
+        await self._migrate()
+
+    async def _migrate(self) -> None:
+        cursor = await self.conn.execute("PRAGMA user_version")
+        version = (await cursor.fetchone())[0]
+
+        for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+            for statement in statements:
+                await self.conn.execute(statement)
+            await self.conn.execute(f"PRAGMA user_version = {number}")
+            await self.conn.commit()
+
+    @asynccontextmanager
+    async def _transaction(self):
+        """Run a write transaction under the write lock; commit, or roll back on error"""
+        async with self._write_lock:
+            try:
+                yield self.conn
+                await self.conn.commit()
+            except BaseException:
+                await self.conn.rollback()
+                raise
 
     @override
-    async def add_site(self, url: str, alias: str) -> None:
-        cursor = await self.conn.cursor()
+    async def add_site(self, url: str, alias: str, provider: Optional[str] = None,
+                       critical: bool = False) -> None:
         if alias == None: alias = ""
-        await cursor.execute(
-            "INSERT INTO sites (url, alias) VALUES (?, ?)",
-    (url, alias)
-        )
-        await self.conn.commit()
+        async with self._transaction() as conn:
+            await conn.execute(
+                "INSERT INTO sites (url, alias, provider, critical) VALUES (?, ?, ?, ?)",
+                (url, alias, provider, critical)
+            )
+
+    @override
+    async def upsert_sites(self, sites: Iterable[Tuple[str, str, Optional[str], bool]]) -> int:
+        async with self._transaction() as conn:
+            before = conn.total_changes
+            await conn.executemany(
+                """INSERT INTO sites (url, alias, provider, critical) VALUES (?, ?, ?, ?)
+                ON CONFLICT (alias) DO UPDATE SET
+                    url = excluded.url, provider = excluded.provider, critical = excluded.critical
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM sites AS other WHERE other.url = excluded.url AND other.alias != excluded.alias
+                )
+                ON CONFLICT (url) DO NOTHING""",
+                sites
+            )
+            return conn.total_changes - before
+
+    @override
+    async def iter_sites(self, batch_size: int = 500) -> AsyncIterator[Tuple[str, str, Optional[str], bool]]:
+        async with self.conn.execute(
+            "SELECT url, alias, provider, critical FROM sites ORDER BY id"
+        ) as cursor:
+            while rows := await cursor.fetchmany(batch_size):
+                for url, alias, provider, critical in rows:
+                    yield url, alias, provider, bool(critical)
 
     @override
     async def add_check(self, alias: str, status: int, 
-                      error: Optional[str], time: int, ssl_term: bool) -> None:
-        cursor = await self.conn.cursor()
-        await cursor.execute(
-            "INSERT INTO checks (alias, status, error, time, ssl_term) VALUES (?, ?, ?, ?, ?)",
-            (alias, status, error, time, ssl_term)
-        )
-        await self.conn.commit()
+                      error: Optional[str], time: int, ssl_term: bool,
+                      ts: Optional[int] = None, dns_ms: Optional[int] = None,
+                      connect_ms: Optional[int] = None, tls_ms: Optional[int] = None,
+                      ttfb_ms: Optional[int] = None, transfer_ms: Optional[int] = None) -> None:
+        self._pending.append(self._check_row(
+            alias, status, error, time, ssl_term, ts,
+            dns_ms, connect_ms, tls_ms, ttfb_ms, transfer_ms
+        ))
+        await self._schedule_flush()
+
+    @override
+    async def add_checks_bulk(self, checks: Iterable[Tuple]) -> None:
+        self._pending.extend(self._check_row(*check) for check in checks)
+        await self._schedule_flush()
+
+    @staticmethod
+    def _check_row(alias: str, status: int, error: Optional[str], time: int,
+                   ssl_term: bool, ts: Optional[int] = None, dns_ms: Optional[int] = None,
+                   connect_ms: Optional[int] = None, tls_ms: Optional[int] = None,
+                   ttfb_ms: Optional[int] = None, transfer_ms: Optional[int] = None) -> Tuple:
+        return (alias, status, error, time, ssl_term, int(_time.time()) if ts is None else ts,
+                dns_ms, connect_ms, tls_ms, ttfb_ms, transfer_ms)
+
+    async def _schedule_flush(self) -> None:
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+        elif self._flush_timer is None:
+            self._flush_timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        self._flush_timer = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Write buffered checks in a single transaction"""
+        if not self._pending:
+            return
+        rows = None
+        try:
+            async with self._transaction() as conn:
+                rows, self._pending = self._pending, []
+                if not rows:
+                    return
+                started = _time.perf_counter()
+                await conn.executemany(
+                    """INSERT INTO checks (site_id, alias, status, error, time, ssl_term, ts,
+                        dns_ms, connect_ms, tls_ms, ttfb_ms, transfer_ms)
+                    VALUES ((SELECT id FROM sites WHERE alias = ?1), ?1, ?2, ?3, ?4, ?5, ?6,
+                        ?7, ?8, ?9, ?10, ?11)""",
+                    rows
+                )
+        except Exception:
+            # Rolled back as a whole, so the retry can't write any row twice
+            if rows:
+                self._pending[:0] = rows
+            raise
+        REPOSITORY_WRITE_LATENCY.observe(_time.perf_counter() - started)
+        REPOSITORY_BATCH_SIZE.observe(len(rows))
 
     @override
     async def delete_site(self, url: str) -> None:
-        cursor = await self.conn.cursor()
-        await cursor.execute("DELETE FROM sites WHERE url = ?", (url,))
-        await self.conn.commit()
+        # Buffered checks must land first, or they would outlive the cascade
+        # and attach to a site re-added under the same alias
+        await self.flush()
+        async with self._transaction() as conn:
+            await conn.execute("DELETE FROM sites WHERE url = ?", (url,))
 
     @override
     async def delete_checks(self) -> None:
-        cursor = await self.conn.cursor()
-        await cursor.execute(
-            "DELETE FROM checks",
-        )
-        await self.conn.commit()
+        await self.flush()
+        async with self._transaction() as conn:
+            await conn.execute("DELETE FROM checks")
+            await conn.execute("DELETE FROM last_check")
 
     @override
     async def get_url(self, alias: str) -> str:
@@ -77,6 +294,7 @@ class SqliteRepository(RepositorySystem):
 
     @override
     async def get_check(self, check_id: int) -> Optional[Tuple]:
+        await self.flush()
         cursor = await self.conn.cursor()
         await cursor.execute(
             "SELECT alias, status, error, time, ssl_term FROM checks WHERE id = ?",
@@ -86,28 +304,356 @@ class SqliteRepository(RepositorySystem):
 
     @override
     async def set_site(self, alias: str, new_url: str) -> None:
+        async with self._transaction() as conn:
+            await conn.execute(
+                "UPDATE sites SET url = ? WHERE alias = ?",
+                (new_url, alias)
+            )
+
+    @override
+    async def get_all_sites(self) -> List[Tuple[str, str, Optional[str], bool]]:
+        cursor = await self.conn.cursor()
+        await cursor.execute("SELECT url, alias, provider, critical FROM sites")
+        return [(url, alias, provider, bool(critical))
+                for url, alias, provider, critical in await cursor.fetchall()]
+
+    @override
+    async def get_sites_page(self, after_id: int = 0, limit: int = 20,
+                             before_id: Optional[int] = None) -> List[Tuple]:
+        await self.flush()
+        query = """SELECT sites.id, url, alias, provider, critical,
+            last_check.status, last_check.error, last_check.time, last_check.ts
+            FROM sites LEFT JOIN last_check ON last_check.site_id = sites.id"""
+        if before_id is not None:
+            cursor = await self.conn.execute(
+                query + " WHERE sites.id < ? ORDER BY sites.id DESC LIMIT ?", (before_id, limit)
+            )
+            rows = (await cursor.fetchall())[::-1]
+        else:
+            cursor = await self.conn.execute(
+                query + " WHERE sites.id > ? ORDER BY sites.id LIMIT ?", (after_id, limit)
+            )
+            rows = await cursor.fetchall()
+        return [(site_id, url, alias, provider, bool(critical), *last)
+                for site_id, url, alias, provider, critical, *last in rows]
+
+    @override
+    async def get_checks_page(self, alias: str, before: Optional[Tuple[int, int]] = None,
+                              limit: int = 20, after: Optional[Tuple[int, int]] = None) -> List[Tuple]:
+        await self.flush()
+        # (ts, id) keys walk idx_checks_site_ts, which already ends in the rowid
+        query = """SELECT id, status, error, time, ssl_term, ts FROM checks
+            WHERE site_id = (SELECT id FROM sites WHERE alias = ?)"""
+        if after is not None:
+            cursor = await self.conn.execute(
+                query + " AND (ts, id) > (?, ?) ORDER BY ts, id LIMIT ?", (alias, *after, limit)
+            )
+            return (await cursor.fetchall())[::-1]
+        if before is not None:
+            query += " AND (ts, id) < (?, ?)"
+        cursor = await self.conn.execute(
+            query + " ORDER BY ts DESC, id DESC LIMIT ?", (alias, *(before or ()), limit)
+        )
+        return await cursor.fetchall()
+
+    @override
+    async def get_all_checks(self, alias: str) -> List[Tuple]:
+        await self.flush()
         cursor = await self.conn.cursor()
         await cursor.execute(
-            "UPDATE sites SET url = ? WHERE alias = ?",
-            (new_url, alias)
+            """SELECT id, status, error, time, ssl_term FROM checks
+            WHERE site_id = (SELECT id FROM sites WHERE alias = ?)""",
+            (alias,)
         )
-        await self.conn.commit()
+        return await cursor.fetchall()
 
     @override
-    async def get_all_sites(self) -> List[Tuple[str, str]]:
+    async def get_checks(self, alias: str, since: int,
+                         until: Optional[int] = None) -> List[Tuple]:
+        await self.flush()
         cursor = await self.conn.cursor()
-        await cursor.execute("SELECT url, alias FROM sites")
+        await cursor.execute(
+            """SELECT id, status, error, time, ssl_term, ts,
+                dns_ms, connect_ms, tls_ms, ttfb_ms, transfer_ms FROM checks
+            WHERE site_id = (SELECT id FROM sites WHERE alias = ?) AND ts >= ? AND ts < ?
+            ORDER BY ts""",
+            (alias, since, until if until is not None else 2 ** 62)
+        )
         return await cursor.fetchall()
 
     @override
-    async def get_all_checks(self, alias: str) -> List[Tuple]:
+    async def get_check_history(self, since: int, until: Optional[int] = None, timestamps: bool = True
+                                ) -> Tuple[Dict[int, str], Dict[str, Any], Dict[str, Any]]:
+        await self.flush()
+        cursor = await self.conn.execute("SELECT id, alias FROM sites")
+        aliases = dict(await cursor.fetchall())
+        until = until if until is not None else 2 ** 62
+
+        # site_id, time and both flags in one integer: every extra column
+        # costs SQLite another conversion per row
+        expressions = {
+            'packed': """(IFNULL(site_id, 0) << 32) + (IFNULL(time, 0) << 2) + CASE
+                WHEN error IS NOT NULL THEN 3 WHEN status >= 400 THEN 1 ELSE 0 END""",
+        }
+        if timestamps:
+            expressions['ts'] = "ts"
+        checks = await self._read_columns("checks", expressions, "ts >= ? AND ts < ?", (since, until))
+        packed = checks.pop('packed')
+        known = packed >> 32 != 0
+        packed = packed[known]
+        columns = {name: column[known] for name, column in checks.items()}
+        columns.update({
+            'site_id': packed >> 32,
+            'time': (packed >> 2) & 0x3FFFFFFF,
+            'failed': packed & 1,
+            'errored': (packed >> 1) & 1,
+        })
+
+        hourly = await self._read_columns(
+            "checks_hourly",
+            {column: f"IFNULL({column}, 0)"
+             for column in ('site_id', 'hour', 'count', 'failures', 'errors', 'p50', 'p95')},
+            "hour >= ? AND hour < ?", (since, until)
+        )
+        return aliases, columns, hourly
+
+    async def _read_columns(self, table: str, columns: Dict[str, str], where: str,
+                            params: Tuple) -> Dict[str, Any]:
+        """
+        Read integer `columns` (name -> SQL expression) of the rows matching
+        `where` as NumPy int64 arrays.
+
+        A tuple per row costs several times the scan itself, so each rowid
+        chunk comes back as one comma-joined string per column for NumPy to
+        parse. Every expression must be non-NULL to keep the columns aligned.
+        """
+        # Imported here so startup doesn't pay for NumPy until a report is built
+        import numpy as np
+
+        cursor = await self.conn.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {table}")
+        first, last = await cursor.fetchone()
+        chunks = {name: [] for name in columns}
+        select = ", ".join(f"group_concat({expression})" for expression in columns.values())
+        for start in range((first or 1) - 1, last or 0, HISTORY_CHUNK):
+            cursor = await self.conn.execute(
+                f"SELECT {select} FROM {table} WHERE rowid > ? AND rowid <= ? AND {where}",
+                (start, start + HISTORY_CHUNK, *params)
+            )
+            for name, text in zip(columns, await cursor.fetchone()):
+                if text:
+                    chunks[name].append(np.fromstring(text, dtype=np.int64, sep=","))
+        return {name: np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+                for name, parts in chunks.items()}
+
+    @override
+    async def get_hourly_checks(self, alias: str, since: int,
+                                until: Optional[int] = None) -> List[Tuple]:
         cursor = await self.conn.cursor()
         await cursor.execute(
-            "SELECT id, status, error, time, ssl_term FROM checks WHERE alias = ?",
-            (alias,)
+            """SELECT hour, count, failures, p50, p95 FROM checks_hourly
+            WHERE site_id = (SELECT id FROM sites WHERE alias = ?) AND hour >= ? AND hour < ?
+            ORDER BY hour""",
+            (alias, since, until if until is not None else 2 ** 62)
+        )
+        return await cursor.fetchall()
+
+    @override
+    async def rollup_checks(self, older_than_days: int, chunk_size: int = 5000) -> int:
+        """
+        Aggregate raw checks older than the cutoff into checks_hourly and delete them.
+
+        Work is done per site in chunks of whole hours, each chunk in its own
+        transaction, so the writer is never held for long. An hour that is
+        rolled up twice (late rows) gets its percentiles count-weighted.
+        """
+        await self.flush()
+        cutoff = (int(_time.time()) - older_than_days * 86400) // 3600 * 3600
+        rolled = 0
+
+        cursor = await self.conn.execute(
+            "SELECT DISTINCT site_id FROM checks WHERE site_id IS NOT NULL"
+        )
+        site_ids = [row[0] for row in await cursor.fetchall()]
+
+        for site_id in site_ids:
+            while rows := await self._rollup_chunk(site_id, cutoff, chunk_size):
+                rolled += rows
+
+        while True:
+            async with self._transaction() as conn:
+                cursor = await conn.execute(
+                    """DELETE FROM checks WHERE id IN (
+                        SELECT id FROM checks WHERE site_id IS NULL AND ts < ? LIMIT ?
+                    )""",
+                    (cutoff, chunk_size)
+                )
+            if cursor.rowcount < chunk_size:
+                break
+
+        return rolled
+
+    async def _rollup_chunk(self, site_id: int, cutoff: int, chunk_size: int) -> int:
+        """Roll up the oldest whole hours of one site in one transaction; return rows rolled"""
+        async with self._transaction() as conn:
+            cursor = await conn.execute(
+                f"""SELECT ts / 3600 * 3600, time, {FAILED}, error IS NOT NULL FROM checks
+                WHERE site_id = ? AND ts < ? ORDER BY ts LIMIT ?""",
+                (site_id, cutoff, chunk_size)
+            )
+            rows = await cursor.fetchall()
+            if not rows:
+                return 0
+
+            boundary = cutoff
+            if len(rows) == chunk_size:
+                boundary = rows[-1][0]
+                if boundary == rows[0][0]:
+                    # A single hour larger than the chunk; take it whole
+                    boundary += 3600
+                    cursor = await conn.execute(
+                        f"""SELECT ts / 3600 * 3600, time, {FAILED}, error IS NOT NULL FROM checks
+                        WHERE site_id = ? AND ts >= ? AND ts < ?""",
+                        (site_id, rows[0][0], boundary)
+                    )
+                    rows = await cursor.fetchall()
+                else:
+                    rows = [row for row in rows if row[0] < boundary]
+
+            hours = {}
+            for hour, time, failed, errored in rows:
+                bucket = hours.setdefault(hour, [[], 0, 0])
+                bucket[0].append(time or 0)
+                bucket[1] += failed
+                bucket[2] += errored
+
+            aggregates = []
+            for hour, (times, failures, errors) in hours.items():
+                times.sort()
+                aggregates.append((site_id, hour, len(times), failures, errors,
+                                   percentile(times, 0.5), percentile(times, 0.95)))
+
+            await conn.executemany(
+                """INSERT INTO checks_hourly (site_id, hour, count, failures, errors, p50, p95)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (site_id, hour) DO UPDATE SET
+                    p50 = (p50 * count + excluded.p50 * excluded.count) / (count + excluded.count),
+                    p95 = (p95 * count + excluded.p95 * excluded.count) / (count + excluded.count),
+                    count = count + excluded.count,
+                    failures = failures + excluded.failures,
+                    errors = errors + excluded.errors""",
+                aggregates
+            )
+            await conn.execute(
+                "DELETE FROM checks WHERE site_id = ? AND ts < ?",
+                (site_id, boundary)
+            )
+            return len(rows)
+
+    @override
+    async def watch_content(self, alias: str) -> None:
+        async with self._transaction() as conn:
+            await conn.execute(
+                """INSERT OR IGNORE INTO content_state (site_id)
+                SELECT id FROM sites WHERE alias = ?""",
+                (alias,)
+            )
+
+    @override
+    async def get_content_states(self) -> List[Tuple]:
+        cursor = await self.conn.execute(
+            """SELECT sites.alias, etag, last_modified, content_hash
+            FROM content_state JOIN sites ON sites.id = content_state.site_id"""
         )
         return await cursor.fetchall()
 
+    @override
+    async def set_content_state(self, alias: str, etag: Optional[str],
+                                last_modified: Optional[str], content_hash: Optional[str]) -> None:
+        async with self._transaction() as conn:
+            await conn.execute(
+                """UPDATE content_state SET etag = ?, last_modified = ?, content_hash = ?
+                WHERE site_id = (SELECT id FROM sites WHERE alias = ?)""",
+                (etag, last_modified, content_hash, alias)
+            )
+
+    @override
+    async def get_assertions(self) -> List[Tuple]:
+        cursor = await self.conn.execute(
+            """SELECT sites.alias, contains, absent, selector, max_size
+            FROM site_assertions JOIN sites ON sites.id = site_assertions.site_id"""
+        )
+        return await cursor.fetchall()
+
+    @override
+    async def set_assertions(self, alias: str, contains: Optional[str], absent: Optional[str],
+                             selector: Optional[str], max_size: Optional[int]) -> None:
+        async with self._transaction() as conn:
+            if contains is None and absent is None and selector is None and max_size is None:
+                await conn.execute(
+                    "DELETE FROM site_assertions WHERE site_id = (SELECT id FROM sites WHERE alias = ?)",
+                    (alias,)
+                )
+            else:
+                await conn.execute(
+                    """INSERT OR REPLACE INTO site_assertions (site_id, contains, absent, selector, max_size)
+                    SELECT id, ?, ?, ?, ? FROM sites WHERE alias = ?""",
+                    (contains, absent, selector, max_size, alias)
+                )
+
+    @override
+    async def add_subscriber(self, chat_id: int) -> None:
+        async with self._transaction() as conn:
+            await conn.execute(
+                "INSERT OR IGNORE INTO subscribers (chat_id) VALUES (?)",
+                (chat_id,)
+            )
+
+    @override
+    async def delete_subscriber(self, chat_id: int) -> None:
+        async with self._transaction() as conn:
+            await conn.execute("DELETE FROM subscribers WHERE chat_id = ?", (chat_id,))
+
+    @override
+    async def get_subscribers(self) -> List[int]:
+        cursor = await self.conn.execute("SELECT chat_id FROM subscribers")
+        return [row[0] for row in await cursor.fetchall()]
+
+    @override
+    async def get_digest_settings(self) -> List[Tuple[int, Optional[str], Optional[str]]]:
+        cursor = await self.conn.execute("SELECT chat_id, tz, digest_time FROM subscribers")
+        return await cursor.fetchall()
+
+    @override
+    async def set_digest_settings(self, chat_id: int, tz: Optional[str],
+                                  digest_time: Optional[str]) -> bool:
+        async with self._transaction() as conn:
+            cursor = await conn.execute(
+                "UPDATE subscribers SET tz = ?, digest_time = ? WHERE chat_id = ?",
+                (tz, digest_time, chat_id)
+            )
+            return cursor.rowcount > 0
+
+    @override
+    async def get_provider_budgets(self) -> List[Tuple[str, str, int, Optional[int]]]:
+        cursor = await self.conn.execute(
+            "SELECT provider, month, used, credit_limit FROM provider_budget"
+        )
+        return await cursor.fetchall()
+
+    @override
+    async def set_provider_budget(self, provider: str, month: str, used: int,
+                                  credit_limit: Optional[int]) -> None:
+        async with self._transaction() as conn:
+            await conn.execute(
+                """INSERT OR REPLACE INTO provider_budget (provider, month, used, credit_limit)
+                VALUES (?, ?, ?, ?)""",
+                (provider, month, used, credit_limit)
+            )
+
     @override
     async def close(self) -> None:
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        await self.flush()
         await self.conn.close()
\ No newline at end of file
@@ -0,0 +1,55 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+from provider.probes import CertificateCache, CertificateInfo
+
+logger = logging.getLogger(__name__)
+
+
+class CertificateMonitor:
+    """
+    Keeps the certificate of every monitored https host probed, on its own
+    slow schedule: a host is re-probed once its cache entry is older than
+    the cache TTL (a day by default), however often the site is checked.
+    """
+
+    def __init__(self, scheduler, certificates: CertificateCache, period: float = 600,
+                 warn_days: int = 14,
+                 on_expiry: Optional[Callable[[CertificateInfo], Awaitable[None]]] = None):
+        self.scheduler = scheduler
+        self.certificates = certificates
+        self.period = period
+        self.warn_days = warn_days
+        self.on_expiry = on_expiry
+
+    def hosts(self) -> Dict[str, int]:
+        hosts = {}
+        for entry in self.scheduler.sites.values():
+            parts = urlsplit(entry.url)
+            if parts.scheme == 'https' and parts.hostname:
+                hosts[parts.hostname] = parts.port or 443
+        return hosts
+
+    async def run_once(self) -> int:
+        stale = [(host, port) for host, port in self.hosts().items() if self.certificates.stale(host)]
+        infos = await asyncio.gather(*(self.certificates.probe(host, port) for host, port in stale))
+        for info in infos:
+            if not info.reachable:
+                # Retried soon; a network blip says nothing about the certificate
+                logger.info(f"Certificate of {info.host} not probed: {info.error}")
+                continue
+            if not info.valid or (info.days_left is not None and info.days_left <= self.warn_days):
+                logger.warning(f"Certificate of {info.host}: {info.error or f'{info.days_left} days left'}")
+                if self.on_expiry is not None:
+                    await self.on_expiry(info)
+        return len(stale)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Certificate probe failed")
+            await asyncio.sleep(self.period)
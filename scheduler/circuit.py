@@ -0,0 +1,72 @@
+import random
+from enum import Enum
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open breaker with exponential, jittered open periods.
+
+    After `failure_threshold` consecutive failures the circuit opens for
+    base_delay * 2^(n-1) seconds (capped at max_delay, jittered); then a
+    single probe is let through and its outcome closes or re-opens it.
+    """
+
+    __slots__ = ("state", "failures", "opens", "open_until", "probing",
+                 "failure_threshold", "base_delay", "max_delay", "jitter")
+
+    def __init__(self, failure_threshold: int = 3, base_delay: float = 30,
+                 max_delay: float = 1800, jitter: float = 0.2):
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+        self.opens = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    def allow(self, now: float) -> bool:
+        """Whether a request may go through now"""
+        if self.state is CircuitState.CLOSED:
+            return True
+        if self.state is CircuitState.OPEN:
+            if now < self.open_until:
+                return False
+            self.state = CircuitState.HALF_OPEN
+            self.probing = False
+        if self.probing:
+            return False
+        self.probing = True
+        return True
+
+    def release(self) -> None:
+        """Give back a half-open probe slot that ended without an outcome"""
+        self.probing = False
+
+    def record(self, success: bool, now: float) -> None:
+        if success:
+            self.state = CircuitState.CLOSED
+            self.failures = 0
+            self.opens = 0
+            self.probing = False
+            return
+
+        self.failures += 1
+        if self.state is CircuitState.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opens += 1
+            delay = min(self.max_delay, self.base_delay * 2 ** (self.opens - 1))
+            delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+            self.state = CircuitState.OPEN
+            self.open_until = now + delay
+            self.probing = False
+
+    @property
+    def healthy(self) -> bool:
+        return self.state is CircuitState.CLOSED and not self.failures
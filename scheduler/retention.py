@@ -0,0 +1,31 @@
+import asyncio
+import logging
+
+from repository.repository import RepositorySystem
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionJob:
+    """Periodically rolls old raw checks into hourly aggregates"""
+
+    def __init__(self, repository: RepositorySystem, keep_days: int = 30,
+                 period: float = 3600, chunk_size: int = 5000):
+        self.repository = repository
+        self.keep_days = keep_days
+        self.period = period
+        self.chunk_size = chunk_size
+
+    async def run_once(self) -> int:
+        rolled = await self.repository.rollup_checks(self.keep_days, self.chunk_size)
+        if rolled:
+            logger.info(f"Rolled up {rolled} checks older than {self.keep_days} days")
+        return rolled
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Retention job failed")
+            await asyncio.sleep(self.period)
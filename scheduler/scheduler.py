@@ -0,0 +1,378 @@
+import asyncio
+import heapq
+import logging
+import random
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from repository.repository import RepositorySystem
+from alert.state import is_success
+from provider.provider import ProviderFactory, ProviderSystem
+from provider.budget import BudgetManager
+from provider.assertions import AssertionEngine, AssertionSpec
+from provider.probes import CertificateCache
+from scheduler.circuit import CircuitBreaker
+from metrics.metrics import CHECKS, CHECK_LATENCY, SCHEDULER_LAG
+
+logger = logging.getLogger(__name__)
+
+
+async def store_check(repository: RepositorySystem, alias: str, result: dict) -> None:
+    """Persist a provider result as a check row"""
+    await repository.add_check(
+        alias,
+        result.get('status_code', 0),
+        result.get('error'),
+        result.get('response_time_ms', 0),
+        result.get('ssl_valid', False),
+        dns_ms=result.get('dns_ms'),
+        connect_ms=result.get('connect_ms'),
+        tls_ms=result.get('tls_ms'),
+        ttfb_ms=result.get('ttfb_ms'),
+        transfer_ms=result.get('transfer_ms')
+    )
+
+
+class SiteEntry:
+    """Scheduling state of a single monitored site"""
+
+    __slots__ = ("alias", "url", "host", "provider", "critical", "interval", "generation", "content",
+                 "assertions")
+
+    def __init__(self, alias: str, url: str, interval: float, provider: Optional[str] = None,
+                 critical: bool = False):
+        self.alias = alias
+        self.url = url
+        self.host = urlsplit(url).hostname or url
+        self.provider = provider
+        self.critical = critical
+        self.interval = interval
+        self.generation = 0
+        # [etag, last_modified, content_hash] when content changes are watched
+        self.content: Optional[List[Optional[str]]] = None
+        self.assertions: Optional[AssertionSpec] = None
+
+    def check_options(self) -> dict:
+        options = {'keep_content': True} if self.assertions is not None else {}
+        if self.content is not None:
+            etag, last_modified, _ = self.content
+            options.update(watch_content=True, etag=etag, last_modified=last_modified)
+        return options
+
+
+class CheckScheduler:
+    """
+    Drives periodic checks for all monitored sites.
+
+    Next-due times are kept in a heap, so dispatching a check costs O(log n)
+    regardless of fleet size. Checks run concurrently, bounded by a global
+    semaphore and a per-host semaphore. Due checks are grouped by provider
+    so each provider instance is resolved once per dispatch.
+
+    Unreachable hosts and failing providers trip circuit breakers: while a
+    circuit is open its checks are skipped instead of waiting on timeouts,
+    until the breaker's (exponentially growing) retry time.
+
+    With a BudgetManager, calls to metered providers are rate limited and
+    non-critical sites are checked less often as the monthly quota runs low.
+
+    A check skipped for an open host circuit is still stored and reported
+    as a failed one on its normal schedule, so uptime accounts for the time
+    nothing was checked. Skips for an open provider circuit or an exhausted
+    budget say nothing about the site and are only counted.
+
+    Sites with content assertions get their body fetched and checked by the
+    AssertionEngine; a failed assertion fails the check.
+    """
+
+    def __init__(self, repository: RepositorySystem, providers: ProviderFactory,
+                 interval: float = 60, concurrency: int = 100, per_host: int = 4,
+                 jitter: float = 0.1,
+                 on_result: Optional[Callable[[str, dict], Awaitable[None]]] = None,
+                 breaker_options: Optional[dict] = None,
+                 budgets: Optional[BudgetManager] = None,
+                 assertions: Optional[AssertionEngine] = None,
+                 certificates: Optional[CertificateCache] = None):
+        self.repository = repository
+        self.providers = providers
+        self.interval = interval
+        self.jitter = jitter
+        self.per_host = per_host
+        self.on_result = on_result
+
+        self.sites: Dict[str, SiteEntry] = {}
+        self._heap: List[Tuple[float, int, int, str]] = []
+        self._seq = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._host_users: Dict[str, int] = {}
+        self.breaker_options = breaker_options or {}
+        # Breakers exist only while something is failing
+        self.host_breakers: Dict[str, CircuitBreaker] = {}
+        self.provider_breakers: Dict[str, CircuitBreaker] = {}
+        self.budgets = budgets
+        self.assertions = assertions
+        self.certificates = certificates
+        self._tasks = set()
+        self._wakeup = asyncio.Event()
+        self._running = False
+
+    async def load(self) -> None:
+        """Schedule every site known to the repository"""
+        for url, alias, provider, critical in await self.repository.get_all_sites():
+            self.add_site(url, alias, provider=provider, critical=critical)
+        for alias, etag, last_modified, content_hash in await self.repository.get_content_states():
+            entry = self.sites.get(alias)
+            if entry is not None:
+                entry.content = [etag, last_modified, content_hash]
+        for alias, *spec in await self.repository.get_assertions():
+            self.set_assertions(alias, AssertionSpec(*spec))
+
+    def add_site(self, url: str, alias: str, interval: Optional[float] = None,
+                 provider: Optional[str] = None, critical: bool = False) -> None:
+        """Start (or restart) monitoring a site; the first check is spread over one interval"""
+        entry = self.sites.get(alias)
+        if entry is None:
+            entry = SiteEntry(alias, url, interval or self.interval, provider, critical)
+            self.sites[alias] = entry
+        else:
+            entry.url = url
+            entry.host = urlsplit(url).hostname or url
+            entry.provider = provider
+            entry.critical = critical
+            entry.interval = interval or entry.interval
+            entry.generation += 1
+
+        loop = asyncio.get_running_loop()
+        self._push(entry, loop.time() + random.uniform(0, entry.interval))
+
+    def watch_content(self, alias: str) -> None:
+        """Fetch and hash the site's body on each check to detect changes"""
+        entry = self.sites.get(alias)
+        if entry is not None and entry.content is None:
+            entry.content = [None, None, None]
+
+    def set_assertions(self, alias: str, spec: Optional[AssertionSpec]) -> None:
+        """Check the site's body against `spec` on each check; None or empty disables"""
+        entry = self.sites.get(alias)
+        if entry is not None:
+            entry.assertions = spec if spec is not None and not spec.empty else None
+            if entry.assertions is not None and self.assertions is None:
+                self.assertions = AssertionEngine()
+
+    def remove_site(self, alias: str) -> None:
+        """Stop monitoring a site; its pending heap slot is discarded lazily"""
+        self.sites.pop(alias, None)
+
+    def set_interval(self, alias: str, interval: float) -> None:
+        entry = self.sites.get(alias)
+        if entry is not None:
+            entry.interval = interval
+
+    def _push(self, entry: SiteEntry, due: float) -> None:
+        self._seq += 1
+        heapq.heappush(self._heap, (due, self._seq, entry.generation, entry.alias))
+        if self._heap[0][1] == self._seq:
+            self._wakeup.set()
+
+    def _next_due(self, entry: SiteEntry, due: float, now: float) -> float:
+        interval = entry.interval
+        if self.budgets is not None and not entry.critical:
+            budget = self.budgets.get(entry.provider or self.providers.default)
+            if budget is not None:
+                interval *= budget.slowdown()
+
+        spread = interval * self.jitter
+        next_due = due + interval + random.uniform(-spread, spread)
+        return next_due if next_due > now else now + random.uniform(0, spread)
+
+    async def run(self) -> None:
+        """Dispatch loop; runs until stop() is called"""
+        self._running = True
+        loop = asyncio.get_running_loop()
+
+        while self._running:
+            now = loop.time()
+            groups: Dict[Optional[str], List[Tuple[SiteEntry, float]]] = {}
+            while self._heap and self._heap[0][0] <= now:
+                due, _, generation, alias = heapq.heappop(self._heap)
+                entry = self.sites.get(alias)
+                if entry is None or entry.generation != generation:
+                    continue
+                groups.setdefault(entry.provider, []).append((entry, due))
+
+            for provider_type, batch in groups.items():
+                task = asyncio.create_task(self._run_group(provider_type, batch))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+            self._wakeup.clear()
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_group(self, provider_type: Optional[str],
+                         batch: List[Tuple[SiteEntry, float]]) -> None:
+        try:
+            provider = await self.providers.get(provider_type)
+        except Exception:
+            logger.exception(f"Provider {provider_type or 'default'} unavailable")
+            loop = asyncio.get_running_loop()
+            for entry, due in batch:
+                self._reschedule(entry, entry.generation, due, loop.time())
+            return
+
+        await asyncio.gather(*(self._run_check(entry, due, provider) for entry, due in batch))
+
+    def _reschedule(self, entry: SiteEntry, generation: int, due: float, now: float) -> None:
+        if self._running and self.sites.get(entry.alias) is entry and entry.generation == generation:
+            self._push(entry, self._next_due(entry, due, now))
+
+    def _allowed(self, entry: SiteEntry, provider_type: str, now: float) -> Optional[str]:
+        """None if the check may run, otherwise why it is skipped"""
+        allowed = []
+        for breaker, reason in ((self.provider_breakers.get(provider_type), "provider circuit open"),
+                                (self.host_breakers.get(entry.host), "circuit open")):
+            if breaker is None:
+                continue
+            if not breaker.allow(now):
+                for taken in allowed:
+                    taken.release()
+                return reason
+            allowed.append(breaker)
+        return None
+
+    def _release(self, provider_type: str, host: str) -> None:
+        for breaker in (self.provider_breakers.get(provider_type), self.host_breakers.get(host)):
+            if breaker is not None:
+                breaker.release()
+
+    def _record(self, breakers: Dict[str, CircuitBreaker], key: str,
+                success: bool, now: float) -> None:
+        breaker = breakers.get(key)
+        if breaker is None:
+            if success:
+                return
+            breaker = breakers[key] = CircuitBreaker(**self.breaker_options)
+        breaker.record(success, now)
+        if breaker.healthy:
+            del breakers[key]
+
+    async def _run_check(self, entry: SiteEntry, due: float, provider: ProviderSystem) -> None:
+        generation = entry.generation
+        loop = asyncio.get_running_loop()
+        provider_type = entry.provider or self.providers.default
+
+        budget = self.budgets.get(provider_type) if self.budgets is not None else None
+        if budget is not None and budget.exhausted and not entry.critical:
+            skipped = "check budget exhausted"
+        else:
+            skipped = self._allowed(entry, provider_type, loop.time())
+        if skipped is not None:
+            if self.sites.get(entry.alias) is entry and entry.generation == generation:
+                # Kept on its interval rather than pushed to the breaker's retry
+                # time, so every interval without a check is accounted for
+                self._push(entry, self._next_due(entry, due, loop.time()))
+                await self._skip(entry, provider_type, skipped)
+            return
+
+        host = entry.host
+        host_semaphore = self._host_semaphores.get(host)
+        if host_semaphore is None:
+            host_semaphore = self._host_semaphores[host] = asyncio.Semaphore(self.per_host)
+        self._host_users[host] = self._host_users.get(host, 0) + 1
+        recorded = False
+
+        try:
+            if budget is not None:
+                await budget.acquire()
+            # Host first: checks queued behind a slow host must not hold global slots
+            async with host_semaphore, self._semaphore:
+                started = loop.time()
+                SCHEDULER_LAG.observe(max(0.0, started - due))
+                result = await provider.check(entry.url, **entry.check_options())
+                CHECK_LATENCY.labels(provider_type).observe(loop.time() - started)
+
+            recorded = True
+            if budget is not None:
+                budget.charge(result.get('cost'), result.get('remaining_credit'))
+            now = loop.time()
+            provider_error = bool(result.get('provider_error'))
+            CHECKS.labels(provider_type, 'provider_error' if provider_error
+                          else 'ok' if is_success(result)
+                          # Answered, but with a 4xx/5xx status
+                          else 'http_error' if result.get('success') else 'failed').inc()
+            self._record(self.provider_breakers, provider_type, not provider_error, now)
+            if not provider_error:
+                # Only failures to reach the host count; HTTP errors are still answers
+                self._record(self.host_breakers, host, not result.get('error'), now)
+
+            if self.certificates is not None:
+                self.certificates.annotate(entry.url, result)
+            if entry.content is not None and result.get('success'):
+                result['content_changed'] = await self._update_content(entry, result)
+            if entry.assertions is not None and result.get('success'):
+                failure = await self.assertions.evaluate(entry.assertions, result.get('content'))
+                if failure is not None:
+                    result['success'] = False
+                    result['error'] = f"Assertion failed: {failure}"
+            await store_check(self.repository, entry.alias, result)
+            if self.on_result is not None:
+                await self.on_result(entry.alias, result)
+        except Exception:
+            logger.exception(f"Check failed for {entry.alias} ({entry.url})")
+        finally:
+            if not recorded:
+                self._release(provider_type, host)
+            self._host_users[host] -= 1
+            if not self._host_users[host]:
+                del self._host_users[host]
+                del self._host_semaphores[host]
+
+            self._reschedule(entry, generation, due, asyncio.get_running_loop().time())
+
+    async def _skip(self, entry: SiteEntry, provider_type: str, reason: str) -> None:
+        """Store and report a check skipped for its host as failed, without touching the breakers"""
+        CHECKS.labels(provider_type, 'skipped').inc()
+        # Only an open host circuit says anything about the site itself
+        if reason != "circuit open":
+            return
+        result = {
+            'success': False,
+            'status_code': 0,
+            'error': reason,
+            'response_time_ms': 0,
+            'provider_error': False,
+        }
+        try:
+            await store_check(self.repository, entry.alias, result)
+            if self.on_result is not None:
+                await self.on_result(entry.alias, result)
+        except Exception:
+            logger.exception(f"Recording skipped check failed for {entry.alias} ({entry.url})")
+
+    async def _update_content(self, entry: SiteEntry, result: dict) -> bool:
+        """Remember the new validators and hash; True if the body changed"""
+        previous_hash = entry.content[2]
+        content_hash = previous_hash if result.get('not_modified') else result.get('content_hash')
+        state = [result.get('etag'), result.get('last_modified'), content_hash]
+
+        if state != entry.content:
+            entry.content = state
+            await self.repository.set_content_state(entry.alias, *state)
+
+        changed = previous_hash is not None and content_hash != previous_hash
+        if changed:
+            logger.info(f"Content changed for {entry.alias} ({entry.url})")
+        return changed
+
+    async def stop(self) -> None:
+        """Stop dispatching and wait for in-flight checks"""
+        self._running = False
+        self._wakeup.set()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.assertions is not None:
+            self.assertions.close()
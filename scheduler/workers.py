@@ -0,0 +1,363 @@
+import asyncio
+import bisect
+import hashlib
+import logging
+import multiprocessing
+import os
+import queue
+from typing import Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from repository.repository import RepositorySystem
+from provider.provider import ProviderFactory
+from provider.budget import BudgetManager, ProviderBudget
+from provider.assertions import AssertionSpec
+from provider.probes import CertificateCache
+from scheduler.scheduler import CheckScheduler, SiteEntry, store_check
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(key: str) -> int:
+    # Stable across processes, unlike hash()
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hashing of keys onto `nodes` shards, with virtual nodes for balance"""
+
+    def __init__(self, nodes: int, replicas: int = 64):
+        points = sorted((_hash(f"{node}:{replica}"), node)
+                        for node in range(nodes) for replica in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node(self, key: str) -> int:
+        index = bisect.bisect(self._hashes, _hash(key))
+        return self._nodes[index % len(self._nodes)]
+
+
+class _ResultChannel:
+    """
+    Stands in for the repository inside a worker. Results are batched onto
+    the shared queue and persisted by the writer, so add_check is a no-op.
+    """
+
+    def __init__(self, results: multiprocessing.Queue, batch_size: int = 200, linger: float = 0.05):
+        self.results = results
+        self.batch_size = batch_size
+        self.linger = linger
+        self._buffer: List[tuple] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def add_check(self, *args, **kwargs) -> None:
+        pass
+
+    async def set_content_state(self, alias: str, etag: Optional[str], last_modified: Optional[str],
+                                content_hash: Optional[str]) -> None:
+        self._put(('content', alias, etag, last_modified, content_hash))
+
+    async def send_result(self, alias: str, result: dict) -> None:
+        # The body is never needed by the writer and is the bulk of the pickle
+        result.pop('content', None)
+        self._put(('result', alias, result))
+
+    def _put(self, message: tuple) -> None:
+        self._buffer.append(message)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.linger, self.flush)
+
+    def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._buffer:
+            self.results.put(self._buffer)
+            self._buffer = []
+
+
+async def _run_worker(options: dict, commands: multiprocessing.Queue,
+                      results: multiprocessing.Queue) -> None:
+    channel = _ResultChannel(results)
+    providers = ProviderFactory()
+    await providers.create_provider(options['provider'])
+
+    budgets = None
+    if options['budgets']:
+        budgets = BudgetManager(None)
+        for provider, (credit_limit, rate, month, used) in options['budgets'].items():
+            budgets.budgets[provider] = ProviderBudget(provider, credit_limit, rate, month, used)
+
+    scheduler = CheckScheduler(channel, providers, on_result=channel.send_result, budgets=budgets,
+                               **options['scheduler'])
+    task = asyncio.create_task(scheduler.run())
+    loop = asyncio.get_running_loop()
+
+    try:
+        while True:
+            command = await loop.run_in_executor(None, commands.get)
+            kind = command[0]
+            if kind == 'stop':
+                break
+            elif kind == 'add':
+                _, url, alias, interval, provider, critical, content, assertions = command
+                scheduler.add_site(url, alias, interval, provider, critical)
+                if content is not None:
+                    scheduler.sites[alias].content = content
+                scheduler.set_assertions(alias, assertions)
+            elif kind == 'assert':
+                scheduler.set_assertions(command[1], command[2])
+            elif kind == 'watch':
+                scheduler.watch_content(command[1])
+            elif kind == 'remove':
+                scheduler.remove_site(command[1])
+            elif kind == 'interval':
+                scheduler.set_interval(command[1], command[2])
+            elif kind == 'budget':
+                _, provider, month, used, remaining = command
+                budget = budgets.get(provider) if budgets is not None else None
+                if budget is not None:
+                    budget.month, budget.used, budget.remaining = month, used, remaining
+    finally:
+        await scheduler.stop()
+        await task
+        await providers.close()
+        channel.flush()
+
+
+def _worker_main(options: dict, commands: multiprocessing.Queue,
+                 results: multiprocessing.Queue) -> None:
+    try:
+        asyncio.run(_run_worker(options, commands, results))
+    finally:
+        # Lets the writer finish even if the worker died on startup
+        results.put(os.getpid())
+
+
+class WorkerPool:
+    """
+    Runs checks in `workers` processes, each with its own event loop and
+    provider sessions, so TLS, parsing and hashing scale across cores.
+
+    Sites are sharded by host on a consistent-hash ring, which keeps every
+    host's semaphore and circuit breaker inside a single worker. Workers
+    stream batched results back over one queue; this process is the only
+    writer and also runs `on_result`. The public interface mirrors
+    CheckScheduler, so the bot drives either one.
+
+    Budgets are charged here from the streamed results and pushed to the
+    workers every `sync_interval` seconds; each worker gets an equal share
+    of the provider's request rate.
+
+    Workers are looked at every `poll_interval` seconds, however busy the
+    result queue is. One killed by a signal (or crashed in native code) is
+    restarted with its shard's sites; during stop() it is just logged and
+    skipped.
+    """
+
+    def __init__(self, repository: RepositorySystem, provider: str, workers: int = 2,
+                 budgets: Optional[BudgetManager] = None,
+                 on_result: Optional[Callable[[str, dict], Awaitable[None]]] = None,
+                 certificates: Optional[CertificateCache] = None,
+                 sync_interval: float = 5, interval: float = 60, poll_interval: float = 1,
+                 **scheduler_options):
+        self.repository = repository
+        self.provider = provider
+        self.workers = workers
+        self.budgets = budgets
+        self.on_result = on_result
+        self.certificates = certificates
+        self.sync_interval = sync_interval
+        self.interval = interval
+        self.poll_interval = poll_interval
+        self.scheduler_options = {'interval': interval, **scheduler_options}
+
+        self.sites: Dict[str, SiteEntry] = {}
+        self.ring = HashRing(workers)
+        self._context = multiprocessing.get_context("spawn")
+        self._commands = [self._context.Queue() for _ in range(workers)]
+        self._results = self._context.Queue()
+        self._processes: List[multiprocessing.Process] = []
+        self._stopping = False
+        self._done = asyncio.Event()
+
+    async def load(self) -> None:
+        """Assign every site known to the repository to its worker"""
+        content = {alias: [etag, last_modified, content_hash] for alias, etag, last_modified, content_hash
+                   in await self.repository.get_content_states()}
+        assertions = {alias: AssertionSpec(*spec) for alias, *spec in await self.repository.get_assertions()}
+        for url, alias, provider, critical in await self.repository.get_all_sites():
+            entry = self.sites[alias] = SiteEntry(alias, url, self.interval, provider, critical)
+            entry.content = content.get(alias)
+            entry.assertions = assertions.get(alias)
+            self._send(entry, self._add_command(entry))
+
+    def _shard(self, entry: SiteEntry) -> int:
+        return self.ring.node(entry.host)
+
+    def _send(self, entry: SiteEntry, command: tuple) -> None:
+        self._commands[self._shard(entry)].put(command)
+
+    @staticmethod
+    def _add_command(entry: SiteEntry) -> tuple:
+        return ('add', entry.url, entry.alias, entry.interval, entry.provider, entry.critical,
+                entry.content, entry.assertions)
+
+    def add_site(self, url: str, alias: str, interval: Optional[float] = None,
+                 provider: Optional[str] = None, critical: bool = False) -> None:
+        entry = self.sites.get(alias)
+        if entry is None:
+            entry = self.sites[alias] = SiteEntry(alias, url, interval or self.interval, provider, critical)
+        else:
+            previous = self._shard(entry)
+            entry.url = url
+            entry.host = urlsplit(url).hostname or url
+            entry.provider = provider
+            entry.critical = critical
+            entry.interval = interval or entry.interval
+            if self._shard(entry) != previous:
+                self._commands[previous].put(('remove', alias))
+
+        self._send(entry, self._add_command(entry))
+
+    def watch_content(self, alias: str) -> None:
+        entry = self.sites.get(alias)
+        if entry is not None and entry.content is None:
+            entry.content = [None, None, None]
+            self._send(entry, ('watch', alias))
+
+    def set_assertions(self, alias: str, spec: Optional[AssertionSpec]) -> None:
+        entry = self.sites.get(alias)
+        if entry is not None:
+            entry.assertions = spec if spec is not None and not spec.empty else None
+            self._send(entry, ('assert', alias, entry.assertions))
+
+    def remove_site(self, alias: str) -> None:
+        entry = self.sites.pop(alias, None)
+        if entry is not None:
+            self._send(entry, ('remove', alias))
+
+    def set_interval(self, alias: str, interval: float) -> None:
+        entry = self.sites.get(alias)
+        if entry is not None:
+            entry.interval = interval
+            self._send(entry, ('interval', alias, interval))
+
+    def _worker_options(self) -> dict:
+        budgets = {}
+        if self.budgets is not None:
+            for name, budget in self.budgets.budgets.items():
+                rate = budget.bucket.rate / self.workers if budget.bucket is not None else None
+                budgets[name] = (budget.credit_limit, rate, budget.month, budget.used)
+        return {'provider': self.provider, 'budgets': budgets, 'scheduler': self.scheduler_options}
+
+    def _spawn(self, index: int, options: dict) -> multiprocessing.Process:
+        process = self._context.Process(
+            target=_worker_main, args=(options, self._commands[index], self._results), daemon=True
+        )
+        process.start()
+        return process
+
+    def start(self) -> None:
+        options = self._worker_options()
+        self._processes = [self._spawn(index, options) for index in range(self.workers)]
+        logger.info(f"Started {self.workers} check workers")
+
+    def _restart(self, index: int) -> None:
+        # The dead worker may have left a half-read command queue behind
+        self._commands[index] = self._context.Queue()
+        self._processes[index] = self._spawn(index, self._worker_options())
+        for entry in self.sites.values():
+            if self._shard(entry) == index:
+                self._send(entry, self._add_command(entry))
+
+    def _reap(self, running: set) -> None:
+        """Handle workers (by pid in `running`) that were killed by a signal"""
+        for index, process in enumerate(self._processes):
+            # Any other exit runs the worker's finally, whose pid is on its way
+            if process.pid not in running or process.exitcode is None or process.exitcode >= 0:
+                continue
+            running.discard(process.pid)
+            if self._stopping:
+                logger.warning(f"Check worker {index} exited with code {process.exitcode} before stopping")
+            else:
+                logger.error(f"Check worker {index} died with code {process.exitcode}, restarting it")
+                self._restart(index)
+                running.add(self._processes[index].pid)
+
+    async def run(self) -> None:
+        """Single writer; runs until every worker has stopped"""
+        if not self._processes:
+            self.start()
+        loop = asyncio.get_running_loop()
+        sync_task = asyncio.create_task(self._sync_budgets()) if self.budgets is not None else None
+
+        running = {process.pid for process in self._processes}
+        reaped = loop.time()
+        try:
+            while running:
+                # Checked on a clock, as a busy queue never times out
+                if loop.time() - reaped >= self.poll_interval:
+                    self._reap(running)
+                    reaped = loop.time()
+                try:
+                    batch = await loop.run_in_executor(None, self._results.get, True, self.poll_interval)
+                except queue.Empty:
+                    continue
+                if isinstance(batch, int):
+                    running.discard(batch)
+                    continue
+                for message in batch:
+                    try:
+                        await self._handle(message)
+                    except Exception:
+                        logger.exception(f"Failed to store worker result for {message[1]}")
+        finally:
+            if sync_task is not None:
+                sync_task.cancel()
+            self._done.set()
+
+    async def _handle(self, message: tuple) -> None:
+        kind, alias = message[0], message[1]
+        entry = self.sites.get(alias)
+        if entry is None:
+            return
+
+        if kind == 'content':
+            entry.content = list(message[2:])
+            await self.repository.set_content_state(alias, *message[2:])
+            return
+
+        result = message[2]
+        if self.budgets is not None:
+            budget = self.budgets.get(entry.provider or self.provider)
+            if budget is not None:
+                budget.charge(result.get('cost'), result.get('remaining_credit'))
+        if self.certificates is not None:
+            self.certificates.annotate(entry.url, result)
+        await store_check(self.repository, alias, result)
+        if self.on_result is not None:
+            await self.on_result(alias, result)
+
+    async def _sync_budgets(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            for budget in self.budgets.budgets.values():
+                command = ('budget', budget.provider, budget.month, budget.used, budget.remaining)
+                for commands in self._commands:
+                    commands.put(command)
+
+    async def stop(self) -> None:
+        """Stop the workers and wait until their last results are written"""
+        if not self._processes:
+            return
+        self._stopping = True
+        for commands in self._commands:
+            commands.put(('stop',))
+        await self._done.wait()
+        loop = asyncio.get_running_loop()
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join)
+        self._processes.clear()
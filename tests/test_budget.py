@@ -0,0 +1,27 @@
+from datetime import datetime, timezone
+
+from provider import budget as budget_module
+from provider.budget import MAX_SLOWDOWN, ProviderBudget
+
+
+def timestamp(*args) -> float:
+    return datetime(*args, tzinfo=timezone.utc).timestamp()
+
+
+def test_exhausted_budget_resets_in_the_next_month(monkeypatch):
+    monkeypatch.setattr(budget_module._time, "time", lambda: timestamp(2026, 10, 31, 23))
+    budget = ProviderBudget("scrapfly", credit_limit=100, month="2026-10", used=100)
+    assert budget.exhausted
+    assert budget.slowdown() == MAX_SLOWDOWN
+
+    # No charge() in between: skipped checks never call it
+    monkeypatch.setattr(budget_module._time, "time", lambda: timestamp(2026, 11, 1, 1))
+    assert not budget.exhausted
+    assert (budget.month, budget.used) == ("2026-11", 0)
+    assert budget.dirty
+
+
+def test_slowdown_rolls_over_on_its_own_clock():
+    budget = ProviderBudget("scrapfly", credit_limit=100, month="2026-10", used=100)
+    assert budget.slowdown(timestamp(2026, 11, 15)) == 1.0
+    assert budget.month == "2026-11"
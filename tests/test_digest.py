@@ -0,0 +1,21 @@
+from alert.dispatcher import MESSAGE_LIMIT, AlertDispatcher
+from report.aggregates import RunningAggregates
+from report.digest import DigestScheduler
+
+NOW = 1_790_000_000
+
+
+def test_long_digest_is_split_at_line_boundaries():
+    aggregates = RunningAggregates()
+    for number in range(300):
+        aggregates.update(f"site-with-a-long-alias-{number:03}", {'success': True, 'status_code': 200,
+                                                                 'response_time_ms': 120}, now=NOW)
+    digest = DigestScheduler(None, None, aggregates)
+
+    messages = digest._digest_messages(NOW)
+    assert len(messages) > 1
+    assert all(len(message) <= MESSAGE_LIMIT for message in messages)
+    # Nothing is lost or cut mid-line
+    assert "\n".join(messages) == aggregates.format_digest(NOW)
+    # and the dispatcher keeps the parts apart
+    assert AlertDispatcher._batch(messages) == messages
@@ -0,0 +1,90 @@
+import asyncio
+import os
+import time
+
+from repository.json_repository import JsonRepository
+
+HOUR = 3600
+
+
+def run(path: str, scenario, **options):
+    async def main():
+        repository = JsonRepository(**options)
+        await repository.init(path)
+        try:
+            return await scenario(repository)
+        finally:
+            await repository.close()
+    return asyncio.run(main())
+
+
+def test_old_rows_are_read_back_from_the_log(tmp_path):
+    path = str(tmp_path / "monitor.json")
+
+    async def scenario(repository):
+        await repository.add_site("https://a.example", "a")
+        await repository.add_checks_bulk([("a", 200, None, ts, False, ts) for ts in range(1, 11)])
+        await repository.flush()
+        oldest = await repository.get_checks_page("a", after=(0, 0), limit=3)
+        return len(repository._recent[1]), oldest, await repository.get_check(1)
+
+    cached, oldest, check = run(path, scenario, recent_rows=4)
+    assert cached == 4
+    assert [row[5] for row in oldest] == [3, 2, 1]
+    assert check == ("a", 200, None, 1, False)
+
+
+def test_rollup_survives_reopening_without_compaction(tmp_path):
+    path = str(tmp_path / "monitor.json")
+    old = (int(time.time()) - 3 * 86400) // HOUR * HOUR
+    recent = int(time.time()) - 60
+
+    async def write(repository):
+        await repository.add_site("https://a.example", "a")
+        await repository.add_checks_bulk([
+            ("a", 200, None, 100, False, old + 10),
+            ("a", 500, None, 200, False, old + 20),
+            ("a", 200, None, 50, False, recent),
+        ])
+        await repository.flush()
+        size = os.path.getsize(repository._log_path(repository._generation))
+        await repository.rollup_checks(1)
+        rewritten = repository._generation, os.path.getsize(repository._log_path(repository._generation))
+        # Late row for the rolled hour, arriving after the rollup
+        await repository.add_check("a", 200, None, 300, False, ts=old + 30)
+        return size, rewritten
+
+    async def read(repository):
+        return (await repository.get_all_checks("a"), await repository.get_hourly_checks("a", 0),
+                repository._dead)
+
+    size, rewritten = run(path, write)
+    raw, hours, dead = run(path, read)
+    # The rollup itself left the log alone
+    assert rewritten == (0, size)
+    assert sorted(row[3] for row in raw) == [50, 300]
+    assert [hour[:3] for hour in hours] == [(old, 2, 1)]
+    assert dead == 2
+
+
+def test_compaction_keeps_live_checks_only(tmp_path):
+    path = str(tmp_path / "monitor.json")
+
+    async def write(repository):
+        for alias in ("a", "b"):
+            await repository.add_site(f"https://{alias}.example", alias)
+            await repository.add_checks_bulk([(alias, 200, None, ts, False, ts) for ts in range(1, 6)])
+        await repository.delete_site("https://a.example")
+        await repository.compact()
+        await repository.add_check("b", 503, None, 6, False, ts=6)
+        return repository._dead, len(repository._log_ids)
+
+    async def read(repository):
+        return [row[3] for row in await repository.get_all_checks("b")], await repository.get_check(1)
+
+    dead, records = run(path, write)
+    assert (dead, records) == (0, 5)
+    times, check = run(path, read)
+    assert times == [1, 2, 3, 4, 5, 6]
+    assert check is None
+    assert sorted(os.listdir(tmp_path)) == ["monitor.checks.1.jsonl", "monitor.json"]
@@ -0,0 +1,171 @@
+import asyncio
+import time
+
+import pytest
+
+from repository.repository import RepositoryFactory
+
+HOUR = 3600
+
+
+@pytest.fixture(params=["db", "json"])
+def repo_path(request, tmp_path):
+    return str(tmp_path / f"monitor.{request.param}")
+
+
+async def open_repository(path: str):
+    factory = RepositoryFactory()
+    await factory.create_repository(path)
+    return factory.get_repository()
+
+
+def run(path: str, scenario):
+    """Run `scenario(repository)` against a fresh repository at `path`"""
+    async def main():
+        repository = await open_repository(path)
+        try:
+            return await scenario(repository)
+        finally:
+            await repository.close()
+    return asyncio.run(main())
+
+
+def test_sites_page_walks_forward_and_back(repo_path):
+    async def scenario(repository):
+        for number in range(5):
+            await repository.add_site(f"https://site{number}.example", f"site{number}")
+        await repository.add_check("site1", 200, None, 120, False, ts=1000)
+        await repository.add_check("site1", 503, None, 80, False, ts=2000)
+
+        first = await repository.get_sites_page(limit=2)
+        second = await repository.get_sites_page(after_id=first[-1][0], limit=2)
+        back = await repository.get_sites_page(before_id=second[0][0], limit=2)
+        return first, second, back
+
+    first, second, back = run(repo_path, scenario)
+    assert [row[2] for row in first] == ["site0", "site1"]
+    assert [row[2] for row in second] == ["site2", "site3"]
+    assert back == first
+    # The latest check rides along; unchecked sites get Nones
+    assert first[1][3:] == (None, False, 503, None, 80, 2000)
+    assert first[0][5:] == (None, None, None, None)
+
+
+def test_checks_page_is_keyed_by_ts_and_id(repo_path):
+    async def scenario(repository):
+        await repository.add_site("https://a.example", "a")
+        for ts in (100, 200, 200, 300, 400):
+            await repository.add_check("a", 200, None, ts // 10, False, ts=ts)
+
+        newest = await repository.get_checks_page("a", limit=2)
+        older = await repository.get_checks_page("a", before=(newest[-1][5], newest[-1][0]), limit=2)
+        newer = await repository.get_checks_page("a", after=(older[0][5], older[0][0]), limit=2)
+        return newest, older, newer
+
+    newest, older, newer = run(repo_path, scenario)
+    assert [row[5] for row in newest] == [400, 300]
+    assert [row[5] for row in older] == [200, 200]
+    assert older[0][0] > older[1][0]
+    assert newer == newest
+
+
+def test_upsert_updates_by_alias_and_skips_taken_urls(repo_path):
+    async def scenario(repository):
+        await repository.add_site("https://a.example", "a")
+        await repository.add_site("https://b.example", "b")
+        written = await repository.upsert_sites([
+            ("https://a2.example", "a", "http", True),
+            ("https://b.example", "c", None, False),
+            ("https://d.example", "d", None, False),
+        ])
+        return written, await repository.get_all_sites()
+
+    written, sites = run(repo_path, scenario)
+    assert written == 2
+    assert sorted(sites) == [
+        ("https://a2.example", "a", "http", True),
+        ("https://b.example", "b", None, False),
+        ("https://d.example", "d", None, False),
+    ]
+
+
+def test_rollup_moves_old_checks_into_hours(repo_path):
+    old = (int(time.time()) - 3 * 86400) // HOUR * HOUR
+    recent = int(time.time()) - 60
+
+    async def scenario(repository):
+        await repository.add_site("https://a.example", "a")
+        await repository.add_checks_bulk([
+            ("a", 200, None, 100, False, old + 10),
+            ("a", 200, None, 300, False, old + 20),
+            ("a", 500, None, 200, False, old + 30),
+            ("a", 0, "timeout", 0, False, old + 40),
+            ("a", 200, None, 50, False, recent),
+        ])
+        rolled = await repository.rollup_checks(1)
+        hours = await repository.get_hourly_checks("a", old - HOUR)
+        aliases, columns, hourly = await repository.get_check_history(old - HOUR)
+        return rolled, hours, await repository.get_all_checks("a"), aliases, columns, hourly
+
+    rolled, hours, raw, aliases, columns, hourly = run(repo_path, scenario)
+    assert rolled == 4
+    assert [hour[:3] for hour in hours] == [(old, 4, 2)]
+    assert len(raw) == 1
+    assert list(aliases.values()) == ["a"]
+    assert columns["ts"].tolist() == [recent]
+    assert hourly["hour"].tolist() == [old]
+    assert hourly["errors"].tolist() == [1]
+
+
+def test_delete_site_cascades_to_its_data(repo_path):
+    old = (int(time.time()) - 3 * 86400) // HOUR * HOUR
+
+    async def scenario(repository):
+        await repository.add_site("https://a.example", "a")
+        await repository.add_check("a", 200, None, 100, False, ts=old)
+        await repository.rollup_checks(1)
+        await repository.add_check("a", 200, None, 100, False)
+        await repository.watch_content("a")
+        await repository.set_content_state("a", '"etag"', None, "hash")
+        await repository.set_assertions("a", "ok", None, None, None)
+
+        await repository.delete_site("https://a.example")
+        await repository.add_site("https://a.example", "a")
+        return (await repository.get_all_checks("a"), await repository.get_hourly_checks("a", 0),
+                await repository.get_content_states(), await repository.get_assertions())
+
+    assert run(repo_path, scenario) == ([], [], [], [])
+
+
+def test_digest_settings_need_a_subscription(repo_path):
+    async def scenario(repository):
+        unsubscribed = await repository.set_digest_settings(1, "Europe/Berlin", "09:00")
+        await repository.add_subscriber(2)
+        subscribed = await repository.set_digest_settings(2, "Europe/Berlin", "09:00")
+        return unsubscribed, subscribed, await repository.get_subscribers(), \
+            await repository.get_digest_settings()
+
+    unsubscribed, subscribed, subscribers, settings = run(repo_path, scenario)
+    assert not unsubscribed and subscribed
+    assert list(subscribers) == [2]
+    assert list(settings) == [(2, "Europe/Berlin", "09:00")]
+
+
+def test_state_survives_reopening(repo_path):
+    async def write(repository):
+        await repository.add_site("https://a.example", "a", "scrapfly", True)
+        await repository.add_check("a", 200, None, 100, False, ts=1000)
+        await repository.add_subscriber(7)
+        await repository.set_provider_budget("scrapfly", "2026-10", 120, 1000)
+        await repository.set_provider_budget("scrapfly", "2026-10", 150, 1000)
+
+    async def read(repository):
+        return (await repository.get_all_sites(), len(await repository.get_all_checks("a")),
+                await repository.get_subscribers(), await repository.get_provider_budgets())
+
+    run(repo_path, write)
+    sites, checks, subscribers, budgets = run(repo_path, read)
+    assert list(sites) == [("https://a.example", "a", "scrapfly", True)]
+    assert checks == 1
+    assert list(subscribers) == [7]
+    assert list(budgets) == [("scrapfly", "2026-10", 150, 1000)]
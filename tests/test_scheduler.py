@@ -0,0 +1,75 @@
+import asyncio
+
+import bot
+from alert.state import StateTracker
+from report.aggregates import RunningAggregates
+from scheduler.scheduler import CheckScheduler
+
+
+class Recorder:
+    def __init__(self):
+        self.checks = []
+        self.messages = []
+
+    async def add_check(self, alias, status, error, *args, **kwargs):
+        self.checks.append((alias, error))
+
+    def publish(self, text):
+        self.messages.append(text)
+
+
+class Providers:
+    default = "fake"
+
+    def __init__(self, result: dict):
+        self.result = result
+        self.calls = 0
+
+    async def get(self, provider_type=None):
+        return self
+
+    async def check(self, url, **options):
+        self.calls += 1
+        return dict(self.result)
+
+
+def run_checks(monkeypatch, result: dict, seconds: float = 0.5):
+    recorder = Recorder()
+    monkeypatch.setattr(bot, "DISPATCHER", recorder)
+    monkeypatch.setattr(bot, "TRACKER", StateTracker())
+    monkeypatch.setattr(bot, "AGGREGATES", RunningAggregates())
+    providers = Providers(result)
+
+    async def main():
+        scheduler = CheckScheduler(recorder, providers, interval=0.02, jitter=0,
+                                   on_result=bot.notificate)
+        scheduler.add_site("https://a.example", "a")
+        task = asyncio.create_task(scheduler.run())
+        await asyncio.sleep(seconds)
+        await scheduler.stop()
+        await task
+
+    asyncio.run(main())
+    return recorder, providers
+
+
+def test_open_provider_circuit_sends_no_down_alert(monkeypatch):
+    recorder, providers = run_checks(monkeypatch, {
+        'success': False, 'status_code': 0, 'error': "Scrapfly API error: HTTP 503",
+        'response_time_ms': 5, 'provider_error': True,
+    })
+    # The provider circuit opened after three failures and skipped the rest
+    assert providers.calls == 3
+    assert len(recorder.checks) == 3
+    assert recorder.messages == []
+    assert "a" not in bot.AGGREGATES.sites
+
+
+def test_unreachable_site_still_goes_down(monkeypatch):
+    recorder, providers = run_checks(monkeypatch, {
+        'success': False, 'status_code': 0, 'error': "Connection refused", 'response_time_ms': 5,
+    })
+    # Host circuit skips are stored as failures too
+    assert providers.calls == 3
+    assert len(recorder.checks) > 3
+    assert recorder.messages == ["🔴 a is down: Connection refused"]
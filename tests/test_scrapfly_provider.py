@@ -0,0 +1,117 @@
+import asyncio
+import json
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from provider.scrapfly_provider import CHUNK_SIZE, ScrapflyProvider
+
+
+def envelope(content: str) -> bytes:
+    return json.dumps({'success': True, 'result': {'status_code': 200, 'content': content}}).encode()
+
+
+async def serve(handler):
+    app = web.Application()
+    app.router.add_get('/scrape', handler)
+    server = TestServer(app)
+    await server.start_server()
+    return server
+
+
+async def make_provider(server, **options) -> ScrapflyProvider:
+    provider = ScrapflyProvider()
+    await provider.init(api_key='key', base_url=str(server.make_url('/scrape')), **options)
+    return provider
+
+
+def test_envelope_larger_than_one_chunk_is_read_whole():
+    page = 'x' * (CHUNK_SIZE * 5)
+
+    async def handler(request):
+        # Written in pieces so the body is never buffered in one go
+        response = web.StreamResponse()
+        await response.prepare(request)
+        body = envelope(page)
+        for start in range(0, len(body), CHUNK_SIZE // 2):
+            await response.write(body[start:start + CHUNK_SIZE // 2])
+            await asyncio.sleep(0.001)
+        await response.write_eof()
+        return response
+
+    async def run():
+        server = await serve(handler)
+        provider = await make_provider(server, stream=False)
+        try:
+            return await provider.check('https://example.com', keep_content=True)
+        finally:
+            await provider.close()
+            await server.close()
+
+    result = asyncio.run(run())
+    assert result['success'] and result['error'] is None
+    assert result['content'] == page
+
+
+def test_envelope_over_the_cap_is_rejected():
+    async def handler(request):
+        return web.Response(body=envelope('x' * (CHUNK_SIZE * 3)))
+
+    async def run():
+        server = await serve(handler)
+        provider = await make_provider(server, stream=False, max_body_bytes=CHUNK_SIZE * 2)
+        try:
+            return await provider.check('https://example.com')
+        finally:
+            await provider.close()
+            await server.close()
+
+    result = asyncio.run(run())
+    assert not result['success'] and result['provider_error']
+    assert 'exceeds' in result['error']
+
+
+def test_proxified_error_without_upstream_status_is_a_provider_error():
+    async def handler(request):
+        return web.Response(status=502, text='Bad gateway')
+
+    async def run():
+        server = await serve(handler)
+        provider = await make_provider(server)
+        try:
+            return await provider.check('https://example.com')
+        finally:
+            await provider.close()
+            await server.close()
+
+    result = asyncio.run(run())
+    assert not result['success'] and result['provider_error']
+    assert result['error'] == "Scrapfly API error: HTTP 502"
+
+
+def test_status_only_check_reuses_the_connection():
+    peers = set()
+
+    async def handler(request):
+        peers.add(request.transport.get_extra_info('peername'))
+        # Still arriving when the provider releases the response
+        response = web.StreamResponse(headers={'X-Scrapfly-Upstream-Http-Code': '204'})
+        response.content_length = 4096
+        await response.prepare(request)
+        for _ in range(4):
+            await response.write(b'x' * 1024)
+            await asyncio.sleep(0.01)
+        return response
+
+    async def run():
+        server = await serve(handler)
+        provider = await make_provider(server)
+        try:
+            return [await provider.check('https://example.com') for _ in range(3)]
+        finally:
+            await provider.close()
+            await server.close()
+
+    results = asyncio.run(run())
+    assert [result['status_code'] for result in results] == [204] * 3
+    assert len(peers) == 1
@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `rate` tokens per second.
+
+    acquire() reserves its tokens up front, running the bucket into debt if
+    it must, and sleeps once until the debt is paid off: waiters are served
+    in arrival order without polling. A pause moves every waiting caller back.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "paused_until", "shifted")
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        # Total seconds pauses have pushed the queue back
+        self.shifted = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def delay(self, tokens: float = 1) -> float:
+        """Seconds until `tokens` would be available"""
+        self._refill()
+        return max(0.0, (tokens - self.tokens) / self.rate)
+
+    async def acquire(self, tokens: float = 1) -> None:
+        self._refill()
+        self.tokens -= tokens
+        shifted = self.shifted
+        delay = -self.tokens / self.rate
+        while delay > 0:
+            await asyncio.sleep(delay)
+            # Paused while asleep: wait out the extra time as well
+            delay, shifted = self.shifted - shifted, self.shifted
+
+    def pause(self, seconds: float) -> None:
+        """Grant nothing for `seconds`; overlapping pauses don't add up"""
+        self._refill()
+        extension = self.updated + seconds - max(self.updated, self.paused_until)
+        if extension <= 0:
+            return
+        self.paused_until = self.updated + seconds
+        self.tokens = min(self.tokens, 0) - extension * self.rate
+        self.shifted += extension
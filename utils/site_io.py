@@ -0,0 +1,162 @@
+import csv
+import heapq
+import io
+import itertools
+import json
+import re
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from provider.provider import ProviderFactory
+from repository.repository import RepositorySystem
+
+URL_PATTERN = re.compile(
+    r'^(https?|ftp)://'
+    r'([a-zA-Z0-9-]+\.)+[a-zA-Z]{2,}'
+    r'(:[0-9]{1,5})?'
+    r'(/.*)?$'
+)
+
+FIELDS = ("url", "alias", "provider", "critical")
+TRUE_VALUES = {"1", "true", "yes", "y", "critical"}
+
+Site = Tuple[str, str, Optional[str], bool]
+
+
+def is_valid_url(url: str) -> bool:
+    return URL_PATTERN.match(url) is not None
+
+
+def detect_format(filename: str) -> str:
+    return "json" if filename.lower().endswith((".json", ".jsonl", ".ndjson")) else "csv"
+
+
+def read_records(lines: Iterable[str], fmt: str) -> Iterator[Tuple[int, Optional[dict]]]:
+    """
+    (line number, record) pairs from CSV with a header row, JSON Lines, or a
+    JSON array. Only the array form is parsed whole; a record that can't be
+    parsed comes back as None.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record
+        return
+
+    lines = iter(lines)
+    first = True
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        if first and line.startswith("["):
+            try:
+                records = json.loads(line + "".join(lines))
+            except ValueError:
+                yield number, None
+                return
+            for index, record in enumerate(records if isinstance(records, list) else [records], start=1):
+                yield index, record
+            return
+        first = False
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, None
+
+
+def validate(record: Optional[dict]) -> Tuple[Optional[Site], Optional[str]]:
+    """Turn a raw record into a site row, or explain why it can't be one"""
+    if not isinstance(record, dict):
+        return None, "not a valid record"
+
+    url = str(record.get("url") or "").strip()
+    alias = str(record.get("alias") or "").strip()
+    provider = str(record.get("provider") or "").strip().lower() or None
+    critical = record.get("critical")
+    critical = critical if isinstance(critical, bool) else str(critical or "").strip().lower() in TRUE_VALUES
+
+    if not is_valid_url(url):
+        return None, f"invalid url '{url}'"
+    if not alias or any(char.isspace() for char in alias):
+        return None, f"invalid alias '{alias}'"
+    if provider is not None and provider not in ProviderFactory.REGISTRY:
+        return None, f"unknown provider '{provider}'"
+    return (url, alias, provider, critical), None
+
+
+class ImportResult:
+    def __init__(self):
+        self.sites: Dict[str, Site] = {}
+        self.written = 0
+        self.failed = 0
+        self.errors: List[str] = []
+
+    def summary(self) -> str:
+        text = f"Imported {self.written} of {len(self.sites) + self.failed} sites"
+        if self.failed:
+            text += f", {self.failed} invalid:\n" + "\n".join(self.errors)
+        skipped = len(self.sites) - self.written
+        if skipped > 0:
+            text += f"\n{skipped} skipped (URL already used by another alias)"
+        return text
+
+
+async def import_sites(repository: RepositorySystem, records: Iterable[Tuple[int, Optional[dict]]],
+                       max_errors: int = 20) -> ImportResult:
+    """Validate records one by one, then upsert every valid site in one transaction"""
+    result = ImportResult()
+    rows: Dict[str, Tuple[int, Site]] = {}
+    invalid: List[Tuple[int, str]] = []
+
+    for number, record in records:
+        site, error = validate(record)
+        if error is not None:
+            result.failed += 1
+            if len(invalid) < max_errors:
+                invalid.append((number, error))
+            continue
+        # A repeated alias takes the last row, as the upsert would; re-inserting
+        # keeps the rows in the order of the lines that survive
+        rows.pop(site[1], None)
+        rows[site[1]] = (number, site)
+
+    # URLs are only compared between surviving rows, so a URL an alias dropped
+    # on a later line is free for the other aliases
+    urls: Dict[str, str] = {}
+    repeated: List[Tuple[int, str]] = []
+    for alias, (number, site) in rows.items():
+        owner = urls.setdefault(site[0], alias)
+        if owner != alias:
+            result.failed += 1
+            if len(repeated) < max_errors:
+                repeated.append((number, f"url '{site[0]}' repeated under alias '{owner}'"))
+            continue
+        result.sites[alias] = site
+
+    errors = heapq.merge(invalid, repeated)
+    result.errors = [f"line {number}: {error}" for number, error in itertools.islice(errors, max_errors)]
+
+    if result.sites:
+        result.written = await repository.upsert_sites(result.sites.values())
+    return result
+
+
+async def export_sites(repository: RepositorySystem, fmt: str) -> AsyncIterator[str]:
+    """Stream every site as CSV (with a header) or JSON Lines, one line at a time"""
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def line(row) -> str:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerow(row)
+            return buffer.getvalue()
+
+        yield line(FIELDS)
+        async for url, alias, provider, critical in repository.iter_sites():
+            yield line((url, alias, provider or "", int(critical)))
+        return
+
+    async for site in repository.iter_sites():
+        yield json.dumps(dict(zip(FIELDS, site)), ensure_ascii=False) + "\n"